@@ -0,0 +1,363 @@
+"""Persistent alert dispatch queue with background workers.
+
+The Streamlit script submits alert jobs here and returns immediately; worker
+threads claim jobs from SQLite, run the registered handler and record
+per-recipient progress, which the admin panel polls. A job claimed by a worker
+holds a lease that it renews while it makes progress, so jobs left behind by a
+crash or restart are picked up again once the lease expires, skipping
+recipients that were already delivered. Submitting the same idempotency key
+twice returns the existing job instead of sending again.
+"""
+import hashlib
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+import metrics
+import storage
+
+log = logging.getLogger(__name__)
+
+ANY_LANGUAGE = object()  # pending_recipients filter matching every language
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    total INTEGER NOT NULL DEFAULT 0,
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    lease_until REAL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id);
+CREATE TABLE IF NOT EXISTS job_recipients (
+    job_id INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    error TEXT,
+    PRIMARY KEY (job_id, channel, recipient)
+);
+"""
+
+
+def idempotency_key(kind, payload, recipients, window=60):
+    """Key that is identical for the same job submitted within ``window`` seconds"""
+    body = json.dumps([kind, payload, sorted(recipients)], sort_keys=True, default=str)
+    digest = hashlib.sha256(body.encode("utf-8")).hexdigest()
+    return f"{kind}:{digest}:{int(time.time() // window)}"
+
+
+def add_recipient_language(db):
+    """Migration: per-recipient language, indexed for paging one language group at a time"""
+    db.execute("ALTER TABLE job_recipients ADD COLUMN language TEXT")
+    db.execute("CREATE INDEX idx_job_recipients_language ON job_recipients (job_id, channel, language, recipient)")
+
+
+class AlertQueue:
+    """SQLite-backed job queue"""
+
+    def __init__(self, path, lease_seconds=120):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        db = self._connect()
+        db.executescript(SCHEMA)
+        storage.run_once(db, "jobs.skipped", lambda db: db.execute(
+            "ALTER TABLE jobs ADD COLUMN skipped INTEGER NOT NULL DEFAULT 0"
+        ))
+        storage.run_once(db, "job_recipients.language", add_recipient_language)
+
+    def _connect(self):
+        return storage.connect(self.path)
+
+    def submit(self, kind, payload, recipients, key=None, chunk_size=1000):
+        """Queue a job for ``(channel, recipient)`` pairs; returns (job_id, created).
+
+        A recipient may also be ``(channel, recipient, language)`` to override
+        the job's language for that recipient.
+
+        With an explicit ``key`` the recipients are streamed into the database
+        without being held in memory, so they may be any iterable. The job is
+        created in a 'loading' state that workers don't claim, and recipients
+        are written in short transactions of ``chunk_size``, so a slow source
+        (e.g. a large CSV being validated) never holds the write lock that
+        workers need. If the source raises, the partial job is deleted.
+        """
+        if key is None:
+            recipients = list(dict.fromkeys(recipients))
+            key = idempotency_key(kind, payload, recipients)
+        job_id = self._create(kind, payload, key)
+        if job_id is None:
+            return self._connect().execute(
+                "SELECT id FROM jobs WHERE idempotency_key = ?", (key,)
+            ).fetchone()['id'], False
+
+        try:
+            rows = ((job_id, channel, recipient, language[0] if language else None)
+                    for channel, recipient, *language in recipients)
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+                with self._connect() as db:
+                    db.executemany(
+                        "INSERT OR IGNORE INTO job_recipients (job_id, channel, recipient, language) "
+                        "VALUES (?, ?, ?, ?)", chunk
+                    )
+                    db.execute("UPDATE jobs SET updated = ? WHERE id = ?", (time.time(), job_id))
+        except BaseException:
+            self._delete(job_id)
+            raise
+
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = 'queued', updated = ?, "
+                "total = (SELECT COUNT(*) FROM job_recipients WHERE job_id = ?) WHERE id = ?",
+                (time.time(), job_id, job_id)
+            )
+        return job_id, True
+
+    def _create(self, kind, payload, key):
+        """Insert a 'loading' job row for ``key``; None if the key already has a job.
+
+        A job left 'loading' for longer than the lease (its submitter died)
+        is discarded and replaced.
+        """
+        now = time.time()
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT id, status, updated FROM jobs WHERE idempotency_key = ?", (key,)).fetchone()
+            if row and not (row['status'] == 'loading' and row['updated'] < now - self.lease_seconds):
+                db.rollback()
+                return None
+            if row:
+                db.execute("DELETE FROM job_recipients WHERE job_id = ?", (row['id'],))
+                db.execute("DELETE FROM jobs WHERE id = ?", (row['id'],))
+            job_id = db.execute(
+                "INSERT INTO jobs (idempotency_key, kind, payload, status, total, created, updated) "
+                "VALUES (?, ?, ?, 'loading', 0, ?, ?)",
+                (key, kind, json.dumps(payload), now, now)
+            ).lastrowid
+            db.commit()
+            return job_id
+        except Exception:
+            db.rollback()
+            raise
+
+    def _delete(self, job_id):
+        with self._connect() as db:
+            db.execute("DELETE FROM job_recipients WHERE job_id = ?", (job_id,))
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def claim(self):
+        """Take the oldest queued job (or one whose lease expired); None if idle"""
+        now = time.time()
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' "
+                "OR (status = 'running' AND lease_until < ?) ORDER BY id LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                db.rollback()
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'running', lease_until = ?, updated = ? WHERE id = ?",
+                (now + self.lease_seconds, now, row['id'])
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        return job
+
+    def pending_recipients(self, job_id, channel=None, page_size=1000, language=ANY_LANGUAGE):
+        """Yield the recipients of a job not yet delivered.
+
+        Rows are read in primary-key pages, so a large job is never loaded
+        at once and no read transaction stays open between pages. With
+        ``language`` only recipients with that language (None for the job's
+        default) are yielded.
+        """
+        if channel is None:
+            channels = [row['channel'] for row in self._connect().execute(
+                "SELECT DISTINCT channel FROM job_recipients WHERE job_id = ?", (job_id,)
+            )]
+            for channel in channels:
+                yield from self.pending_recipients(job_id, channel, page_size, language)
+            return
+
+        condition, params = "", ()
+        if language is not ANY_LANGUAGE:
+            condition, params = " AND language IS ?", (language,)
+        last = ''
+        while True:
+            rows = self._connect().execute(
+                "SELECT recipient FROM job_recipients WHERE job_id = ? AND channel = ?" + condition +
+                " AND recipient > ? AND status = 'pending' ORDER BY recipient LIMIT ?",
+                (job_id, channel, *params, last, page_size)
+            ).fetchall()
+            for row in rows:
+                yield row['recipient']
+            if len(rows) < page_size:
+                return
+            last = rows[-1]['recipient']
+
+    def pending_languages(self, job_id, channel):
+        """Distinct languages of a channel's undelivered recipients (None = the job's default)"""
+        return [row['language'] for row in self._connect().execute(
+            "SELECT DISTINCT language FROM job_recipients "
+            "WHERE job_id = ? AND channel = ? AND status = 'pending'", (job_id, channel)
+        )]
+
+    def mark_recipient(self, job_id, channel, recipient, error=None):
+        """Record one delivery result and renew the job's lease"""
+        now = time.time()
+        status = 'sent' if error is None else 'failed'
+        with self._connect() as db:
+            updated = db.execute(
+                "UPDATE job_recipients SET status = ?, error = ? "
+                "WHERE job_id = ? AND channel = ? AND recipient = ? AND status = 'pending'",
+                (status, None if error is None else str(error), job_id, channel, recipient)
+            ).rowcount
+            if updated:
+                db.execute(
+                    f"UPDATE jobs SET {status} = {status} + 1, lease_until = ?, updated = ? WHERE id = ?",
+                    (now + self.lease_seconds, now, job_id)
+                )
+
+    def skip_recipient(self, job_id, channel, recipient, reason):
+        """Record that a recipient was deliberately not sent to (e.g. still in cooldown)"""
+        now = time.time()
+        with self._connect() as db:
+            updated = db.execute(
+                "UPDATE job_recipients SET status = 'skipped', error = ? "
+                "WHERE job_id = ? AND channel = ? AND recipient = ? AND status = 'pending'",
+                (reason, job_id, channel, recipient)
+            ).rowcount
+            if updated:
+                db.execute(
+                    "UPDATE jobs SET skipped = skipped + 1, lease_until = ?, updated = ? WHERE id = ?",
+                    (now + self.lease_seconds, now, job_id)
+                )
+
+    def finish(self, job_id, error=None):
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_until = NULL, updated = ? WHERE id = ?",
+                ('failed' if error else 'done', error, now, job_id)
+            )
+
+    def job(self, job_id):
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def recent(self, limit=10):
+        rows = self._connect().execute(
+            "SELECT id, kind, status, total, sent, failed, skipped, error, created, updated "
+            "FROM jobs ORDER BY id DESC LIMIT ?", (limit,)
+        )
+        return [dict(row) for row in rows]
+
+    def channel_counts(self, job_id):
+        """Per-channel delivery counts, e.g. {'email': {'sent': 3, 'failed': 1, 'skipped': 2}}"""
+        counts = {}
+        rows = self._connect().execute(
+            "SELECT channel, status, COUNT(*) AS n FROM job_recipients "
+            "WHERE job_id = ? GROUP BY channel, status", (job_id,)
+        )
+        for row in rows:
+            counts.setdefault(row['channel'], {})[row['status']] = row['n']
+        return counts
+
+    def failures(self, job_id, limit=20):
+        rows = self._connect().execute(
+            "SELECT channel, recipient, error FROM job_recipients "
+            "WHERE job_id = ? AND status = 'failed' LIMIT ?", (job_id, limit)
+        )
+        return [dict(row) for row in rows]
+
+
+_handlers = {}
+
+
+def register_handler(kind, handler):
+    """Set the function that runs jobs of ``kind`` as ``handler(job, queue)``"""
+    _handlers[kind] = handler
+
+
+def run_worker(queue, handlers, stop, poll_interval=1.0):
+    """Claim and run jobs until ``stop`` is set"""
+    while not stop.is_set():
+        try:
+            job = queue.claim()
+        except Exception:
+            log.exception("Failed to claim a job")
+            job = None
+        if job is None:
+            stop.wait(poll_interval)
+            continue
+
+        handler = handlers.get(job['kind'])
+        if handler is None:
+            queue.finish(job['id'], f"No handler for job kind '{job['kind']}'")
+            continue
+        try:
+            # Every job, whatever its kind, end to end (the handlers time themselves too)
+            with metrics.timer('dispatch_job'):
+                handler(job, queue)
+            queue.finish(job['id'])
+        except Exception as e:
+            log.exception("Job %s failed", job['id'])
+            queue.finish(job['id'], str(e))
+
+
+_queues = {}
+_workers = {}
+_state_lock = threading.Lock()
+
+
+def get_queue(path):
+    """Return the process-wide queue for a database path"""
+    key = os.path.abspath(path)
+    with _state_lock:
+        queue = _queues.get(key)
+        if queue is None:
+            queue = _queues[key] = AlertQueue(key)
+        return queue
+
+
+def start_workers(queue, count=2):
+    """Start ``count`` daemon worker threads for a queue once per process.
+
+    Workers look handlers up at run time, so re-registering a handler (as
+    every Streamlit rerun does) takes effect for the next job.
+    """
+    with _state_lock:
+        if queue.path in _workers:
+            return _workers[queue.path]
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=run_worker, args=(queue, _handlers, stop),
+                             name=f"alert-worker-{i}", daemon=True)
+            for i in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+        _workers[queue.path] = (stop, threads)
+        return stop, threads
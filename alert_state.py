@@ -0,0 +1,201 @@
+"""Per-(city, recipient) alert state for deduplication and cooldowns.
+
+Before a recipient is alerted, ``reserve`` looks up the last status sent to
+them for that city by primary key and decides whether to send:
+
+* nothing sent yet, or the status is more severe than the last one
+  (safe -> forecast -> alert): send
+* same status, sent less than the status's cooldown ago: skip
+* same status, cooldown expired: send a reminder
+* less severe than the last status (alert -> forecast or safe): skip, but remember the
+  new status so the next safe -> alert transition is alerted at once
+
+Sends are reserved atomically, so two workers or sessions racing on the same
+alert send it once; ``release`` undoes a reservation whose delivery failed.
+A reservation carries a ``ref`` (e.g. the dispatch job), and the same ref may
+send again, so a job resumed after a crash is not blocked by its own
+reservations; only the ref holding a reservation can release it.
+"""
+import os
+import threading
+import time
+
+import storage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alert_state (
+    city_key TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    status TEXT NOT NULL,
+    severity INTEGER NOT NULL,
+    sent_at REAL,
+    updated_at REAL NOT NULL,
+    ref TEXT,
+    prev_status TEXT,
+    prev_severity INTEGER,
+    prev_sent_at REAL,
+    PRIMARY KEY (city_key, recipient)
+);
+"""
+
+# Higher means more severe; a rise in severity is an escalation, so a flood
+# alert still goes out to recipients who already had a forecast warning
+SEVERITY = {'safe': 0, 'forecast': 1, 'alert': 2}
+
+SEND_REASONS = ('new', 'escalation', 'cooldown expired', 'forced', 'retry')
+
+MAX_PARAMS = 500  # recipients per IN (...) lookup, well under SQLite's variable limit
+
+
+def city_key(city):
+    return (city or '').strip().lower()
+
+
+def severity(status):
+    return SEVERITY.get(status, 0)
+
+
+def rescore_severity(db):
+    """Migration: recompute stored severities after a status was added to SEVERITY"""
+    for status, level in SEVERITY.items():
+        db.execute("UPDATE alert_state SET severity = ? WHERE status = ?", (level, status))
+        db.execute("UPDATE alert_state SET prev_severity = ? WHERE prev_status = ?", (level, status))
+
+
+class AlertStateStore:
+    """SQLite-backed dedupe state keyed by (city, recipient)"""
+
+    def __init__(self, path, cooldowns=None):
+        self.path = path
+        self.cooldowns = dict(cooldowns or {})
+        db = self._connect()
+        db.executescript(SCHEMA)
+        storage.run_once(db, "alert_state.forecast_severity", rescore_severity)
+
+    def _connect(self):
+        return storage.connect(self.path)
+
+    def decide(self, previous, status, now, force=False, ref=None):
+        """Return (send, reason) for ``status`` given the recipient's previous state row"""
+        if force:
+            return True, 'forced'
+        if previous is None:
+            return True, 'new'
+        if ref is not None and previous['ref'] == ref and previous['status'] == status:
+            return True, 'retry'
+        level = severity(status)
+        if level > previous['severity']:
+            return True, 'escalation'
+        if level < previous['severity']:
+            return False, 'de-escalation'
+        cooldown = self.cooldowns.get(status, 0)
+        if previous['sent_at'] is None or now - previous['sent_at'] >= cooldown:
+            return True, 'cooldown expired'
+        return False, 'cooldown'
+
+    def reserve(self, city, status, recipients, force=False, ref=None, now=None):
+        """Split ``recipients`` into those to alert now and those to skip.
+
+        Returns ``(send, skipped)``: a list of recipients, already recorded as
+        sent, and a dict mapping each skipped recipient to the reason.
+        """
+        now = now if now is not None else time.time()
+        key, level = city_key(city), severity(status)
+        recipients = list(dict.fromkeys(recipients))
+        send, skipped = [], {}
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for start in range(0, len(recipients), MAX_PARAMS):
+                chunk = recipients[start:start + MAX_PARAMS]
+                placeholders = ', '.join('?' * len(chunk))
+                previous = {
+                    row['recipient']: row for row in db.execute(
+                        "SELECT recipient, status, severity, sent_at, ref FROM alert_state "
+                        f"WHERE city_key = ? AND recipient IN ({placeholders})", (key, *chunk)
+                    )
+                }
+                for recipient in chunk:
+                    ok, reason = self.decide(previous.get(recipient), status, now, force, ref)
+                    if ok:
+                        send.append(recipient)
+                        db.execute(
+                            "INSERT INTO alert_state (city_key, recipient, status, severity, sent_at, updated_at, ref) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                            "ON CONFLICT (city_key, recipient) DO UPDATE SET "
+                            "prev_status = status, prev_severity = severity, prev_sent_at = sent_at, "
+                            "status = excluded.status, severity = excluded.severity, "
+                            "sent_at = excluded.sent_at, updated_at = excluded.updated_at, ref = excluded.ref",
+                            (key, recipient, status, level, now, now, ref)
+                        )
+                    else:
+                        skipped[recipient] = reason
+                        if reason == 'de-escalation':
+                            db.execute(
+                                "UPDATE alert_state SET status = ?, severity = ?, updated_at = ? "
+                                "WHERE city_key = ? AND recipient = ?",
+                                (status, level, now, key, recipient)
+                            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return send, skipped
+
+    def release(self, city, recipient, ref):
+        """Undo the reservation ``ref`` made after its delivery failed, so the next attempt isn't skipped.
+
+        Only a reservation still held by ``ref`` is undone, and undoing it
+        clears the ref, so releasing twice (or after a newer reservation)
+        changes nothing.
+        """
+        key = city_key(city)
+        with self._connect() as db:
+            db.execute(
+                "DELETE FROM alert_state WHERE city_key = ? AND recipient = ? AND ref = ? "
+                "AND prev_status IS NULL",
+                (key, recipient, ref)
+            )
+            db.execute(
+                "UPDATE alert_state SET status = prev_status, severity = prev_severity, "
+                "sent_at = prev_sent_at, ref = NULL, prev_status = NULL, prev_severity = NULL, "
+                "prev_sent_at = NULL WHERE city_key = ? AND recipient = ? AND ref = ?",
+                (key, recipient, ref)
+            )
+
+    def observe(self, city, status, now=None):
+        """Record that a city dropped to ``status`` without alerting anyone.
+
+        Only recipients whose last alert was more severe are updated, so a
+        city that stays safe costs one indexed UPDATE touching no rows.
+        """
+        now = now if now is not None else time.time()
+        with self._connect() as db:
+            return db.execute(
+                "UPDATE alert_state SET status = ?, severity = ?, updated_at = ? "
+                "WHERE city_key = ? AND severity > ?",
+                (status, severity(status), now, city_key(city), severity(status))
+            ).rowcount
+
+    def get(self, city, recipient):
+        row = self._connect().execute(
+            "SELECT * FROM alert_state WHERE city_key = ? AND recipient = ?",
+            (city_key(city), recipient)
+        ).fetchone()
+        return dict(row) if row else None
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path, cooldowns=None):
+    """Return the process-wide state store for a database path"""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = AlertStateStore(key, cooldowns)
+        elif cooldowns is not None:
+            store.cooldowns = dict(cooldowns)
+        return store
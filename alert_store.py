@@ -0,0 +1,139 @@
+"""Append-only alert history stored in SQLite (WAL mode).
+
+Each alert is one INSERT, so saving is constant time regardless of history
+size, concurrent sessions no longer overwrite each other's entries, and the
+latest N alerts (optionally per city or status) come straight from an index.
+"""
+import json
+import os
+import threading
+
+import storage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    city TEXT NOT NULL,
+    city_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    type TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    language TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_city ON alerts (city_key, id);
+CREATE INDEX IF NOT EXISTS idx_alerts_status ON alerts (status, id);
+CREATE INDEX IF NOT EXISTS idx_alerts_timestamp ON alerts (timestamp);
+"""
+
+COLUMNS = ('city', 'status', 'type', 'timestamp', 'language')
+
+
+def city_key(city):
+    return (city or '').strip().lower()
+
+
+def _row(entry):
+    return (entry['city'], city_key(entry['city']), entry['status'],
+            entry['type'], entry['timestamp'], entry['language'])
+
+
+class AlertStore:
+    """Alert history with O(1) appends and indexed reads"""
+
+    def __init__(self, path, legacy_json=None):
+        self.path = path
+        self._connect().executescript(SCHEMA)
+        if legacy_json:
+            self.migrate_json(legacy_json)
+
+    def _connect(self):
+        return storage.connect(self.path)
+
+    def append(self, entry):
+        """Append one alert entry; returns its id"""
+        with self._connect() as db:
+            cursor = db.execute(
+                "INSERT INTO alerts (city, city_key, status, type, timestamp, language) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                _row(entry)
+            )
+            return cursor.lastrowid
+
+    def extend(self, entries):
+        """Append many entries in one transaction; returns how many were written"""
+        with self._connect() as db:
+            return db.executemany(
+                "INSERT INTO alerts (city, city_key, status, type, timestamp, language) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (_row(entry) for entry in entries)
+            ).rowcount
+
+    def latest(self, limit=5, city=None, status=None, since=None, until=None):
+        """Most recent entries first, optionally filtered by city, status and time range"""
+        clauses, params = [], []
+        if city is not None:
+            clauses.append("city_key = ?")
+            params.append(city_key(city))
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp <= ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM alerts {where} ORDER BY id DESC LIMIT ?",
+            (*params, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM alerts").fetchone()[0]
+
+    def migrate_json(self, json_path):
+        """Import a legacy status_history.json once, then rename it to *.migrated"""
+        if not os.path.exists(json_path):
+            return 0
+
+        def migrate(db):
+            try:
+                with open(json_path) as f:
+                    history = json.load(f)
+            except json.JSONDecodeError:
+                history = []
+            db.executemany(
+                "INSERT INTO alerts (city, city_key, status, type, timestamp, language) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [_row({
+                    'city': record.get('city', 'Unknown location'),
+                    'status': record.get('status', 'unknown'),
+                    'type': record.get('type', 'unknown'),
+                    'timestamp': record.get('timestamp', ''),
+                    'language': record.get('language', 'en'),
+                }) for record in history]
+            )
+            return len(history)
+
+        imported = storage.run_once(self._connect(), f"json:{os.path.abspath(json_path)}", migrate)
+        if imported is None:
+            return 0
+
+        os.replace(json_path, json_path + ".migrated")
+        return imported
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path, legacy_json=None):
+    """Return the process-wide store for a database path"""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = AlertStore(key, legacy_json)
+        return store
@@ -0,0 +1,97 @@
+"""Render-once cache of encoded alert emails for bulk sends.
+
+Every recipient of a bulk alert gets the same message apart from the To
+header, so instead of building a MIMEMultipart and calling ``as_string()``
+per recipient, ``TemplateCache.render`` formats and MIME-encodes the message
+once per (template, sender, city, language, status, text) and keeps the
+encoded bytes. ``for_recipient`` then only prepends a To header. Callers
+translate once per language group and render each group's text, so a
+broadcast costs one translation and one render per language.
+"""
+import threading
+from collections import OrderedDict
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.policy import compat32
+
+# SMTP wants CRLF line endings; smtplib only fixes them for str payloads
+SMTP_POLICY = compat32.clone(linesep="\r\n")
+
+TEMPLATES = {
+    'alert': {
+        'subject': "🚨 Flood Alert for {city}",
+        'html': """
+<html><body>
+    <h2 style="color:#e74c3c;">Flood Alert Notification</h2>
+    <p><strong>Location:</strong> {city}</p>
+    <div style="background-color:#fdebd0; padding:15px; border-radius:5px;">
+        <h3 style="color:#e67e22;">Alert Message:</h3>
+        <p>{message}</p>
+    </div>
+    <p>Please take necessary precautions.</p>
+    <p style="color:#5d6d7e;"><em>This is an automated alert - do not reply</em></p>
+</body></html>""",
+    },
+}
+
+
+def build_message(template, sender_email, city, message, status=None, to_email=None):
+    """MIME message for a template (without a To header unless ``to_email`` is given)"""
+    fields = {'city': city, 'message': message, 'status': status}
+    mime = MIMEMultipart()
+    mime["From"] = sender_email
+    if to_email is not None:
+        mime["To"] = to_email
+    mime["Subject"] = TEMPLATES[template]['subject'].format(**fields)
+    mime.attach(MIMEText(TEMPLATES[template]['html'].format(**fields), "html"))
+    return mime
+
+
+def for_recipient(encoded, to_email):
+    """Complete SMTP payload for one recipient of a rendered message"""
+    return b"To: " + to_email.encode("ascii") + b"\r\n" + encoded
+
+
+class TemplateCache:
+    """LRU cache of encoded messages keyed by (template, sender, city, language, status, text)"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.renders = 0
+
+    def render(self, template, sender_email, city, language, status, message):
+        """Encoded message (bytes, no To header) for ``message`` already in ``language``"""
+        key = (template, sender_email, city, language, status, message)
+        with self._lock:
+            encoded = self._entries.get(key)
+            if encoded is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return encoded
+        encoded = build_message(template, sender_email, city, message, status).as_bytes(policy=SMTP_POLICY)
+        with self._lock:
+            self.renders += 1
+            self._entries[key] = encoded
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return encoded
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'renders': self.renders}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache(max_entries=256):
+    """Return the process-wide template cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TemplateCache(max_entries)
+        return _cache
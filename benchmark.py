@@ -0,0 +1,364 @@
+"""End-to-end benchmarks of fll.py's core paths against local stand-ins.
+
+Nothing leaves the machine: OpenWeatherMap is served by mock_owm, email goes
+to an aiosmtpd sink, and Twilio and Google Translate are replaced by stubs.
+Every fake takes an injected latency so slow upstreams can be simulated.
+Each scenario reports throughput and p50/p95/p99 latency. The run is saved
+as JSON (benchmarks/results/ by default) so results can be compared over
+time:
+
+    pip install aiosmtpd
+    python benchmark.py
+    python benchmark.py --owm-latency 0.05 --smtp-latency 0.01 --emails 1000 \\
+        --history 10000 --compare benchmarks/results/<earlier run>.json
+
+Scenarios: single-city checks (cold and cached weather), batch prediction,
+bulk email, bulk SMS, translation and alert history append/read.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+import mock_owm
+
+
+def summarize(latencies, wall_seconds=None, items=None):
+    """Throughput and latency percentiles (ms) for a list of per-call seconds"""
+    latencies = np.asarray(latencies, dtype=float)
+    wall_seconds = wall_seconds if wall_seconds is not None else float(latencies.sum())
+    items = items if items is not None else len(latencies)
+    return {
+        'count': int(items),
+        'seconds': round(wall_seconds, 4),
+        'throughput_per_s': round(items / wall_seconds, 1) if wall_seconds else None,
+        'p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 4),
+        'p95_ms': round(float(np.percentile(latencies, 95)) * 1000, 4),
+        'p99_ms': round(float(np.percentile(latencies, 99)) * 1000, 4),
+    }
+
+
+def _round(value, digits=4):
+    return None if value is None else round(value, digits)
+
+
+def timed_calls(fn, args_list):
+    """Call ``fn(*args)`` for each args tuple; returns per-call seconds and wall time"""
+    latencies = []
+    started = time.perf_counter()
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - start)
+    return latencies, time.perf_counter() - started
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_smtp_sink(latency=0.0):
+    """Start an aiosmtpd sink that accepts every message; returns (controller, handler)"""
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        raise SystemExit("The SMTP sink needs aiosmtpd: pip install aiosmtpd")
+
+    class SinkHandler:
+        def __init__(self):
+            self.received = 0
+
+        async def handle_DATA(self, server, session, envelope):
+            if latency:
+                await asyncio.sleep(latency)
+            self.received += 1
+            return "250 Message accepted"
+
+    handler = SinkHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    return controller, handler
+
+
+def stub_twilio_transport(latency=0.0):
+    """Transport for sms.BulkSMSSender that sleeps instead of calling Twilio"""
+    counter = iter(range(1, sys.maxsize))
+
+    def send(to, body):
+        if latency:
+            time.sleep(latency)
+        return f"SMstub{next(counter):08d}"
+    return send
+
+
+def stub_translator(latency=0.0):
+    """Replacement for translation.translate_chunk that tags the text instead of translating"""
+    def translate_chunk(chunk, dest_lang):
+        if latency:
+            time.sleep(latency)
+        return f"[{dest_lang}] {chunk}"
+    return translate_chunk
+
+
+def bench_single_city(fll, count):
+    """The app's city check (fll.assess_city) followed by translating its alert text"""
+    fll.load_model()
+
+    def check(city):
+        risk = fll.assess_city(city)
+        fll.translate_message(risk['base_msg'], 'hi')
+
+    cities = [(f"Benchcity {i}",) for i in range(count)]
+    cold, cold_wall = timed_calls(check, cities)
+    warm, warm_wall = timed_calls(check, cities)
+    return {
+        'cold_cache': summarize(cold, cold_wall),
+        'warm_cache': summarize(warm, warm_wall),
+    }
+
+
+def bench_batch_prediction(fll, sizes, repeats=20):
+    import pandas as pd
+    model = fll.load_model()
+    rng = np.random.default_rng(0)
+    results = {}
+    for size in sizes:
+        frame = pd.DataFrame({
+            'temperature': rng.uniform(15, 40, size),
+            'humidity': rng.uniform(30, 100, size),
+            'pressure': rng.uniform(980, 1030, size),
+            'rainfall': rng.gamma(2, 15, size),
+            'wind_speed': rng.uniform(0, 20, size),
+        })
+        latencies, wall = timed_calls(lambda: fll.predict_flood_batch(frame, model), [()] * repeats)
+        result = summarize(latencies, wall)
+        result['rows_per_s'] = round(size * repeats / wall, 1)
+        results[f"{size}_rows"] = result
+    return results
+
+
+def bench_bulk_email(fll, metrics, sizes, sink):
+    """Bulk send through the pooled mailer; per-message latency comes from the smtp_send histogram"""
+    results = {}
+    for size in sizes:
+        metrics.registry.reset()
+        before = sink.received
+        recipients = ({'email': f"user{i}@bench.example"} for i in range(size))
+        started = time.perf_counter()
+        sent, failed = fll.send_bulk_emails(recipients, "Benchcity", "Benchmark alert")
+        wall = time.perf_counter() - started
+        smtp_send = metrics.registry.snapshot().get('smtp_send', {})
+        results[f"{size}_recipients"] = {
+            'count': size,
+            'sent': sent,
+            'failed': failed,
+            'received_by_sink': sink.received - before,
+            'seconds': round(wall, 4),
+            'throughput_per_s': round(size / wall, 1),
+            'p50_ms': _round(smtp_send.get('p50_ms')),
+            'p95_ms': _round(smtp_send.get('p95_ms')),
+            'p99_ms': _round(smtp_send.get('p99_ms')),
+            'latency_source': 'smtp_send histogram (bucket estimate)',
+        }
+    return results
+
+
+def bench_bulk_sms(sms, count, latency, concurrency):
+    latencies = []
+    transport = stub_twilio_transport(latency)
+
+    def timed_transport(to, body):
+        start = time.perf_counter()
+        try:
+            return transport(to, body)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    sender = sms.BulkSMSSender(timed_transport, segments_per_second=1e6, concurrency=concurrency)
+    started = time.perf_counter()
+    result = sender.send((f"+1555{i:07d}" for i in range(count)), "Flood alert benchmark")
+    summary = summarize(latencies, time.perf_counter() - started)
+    summary.update(sent=result['sent'], failed=result['failed'])
+    return summary
+
+
+def bench_translation(fll, count):
+    texts = [(f"Flood alert {i}: heavy rainfall detected.", 'ta') for i in range(count)]
+    cold, cold_wall = timed_calls(fll.translate_message, texts)
+    warm, warm_wall = timed_calls(fll.translate_message, texts)
+    return {'uncached': summarize(cold, cold_wall), 'cached': summarize(warm, warm_wall)}
+
+
+def bench_history(alert_store, sizes, workdir, samples=1000):
+    """Append and read latency once the history already holds ``size`` entries"""
+    results = {}
+    cities = [f"City {i}" for i in range(500)]
+
+    def entry(i):
+        return {
+            'city': cities[i % len(cities)],
+            'status': 'alert' if i % 7 == 0 else 'safe',
+            'type': 'Email',
+            'timestamp': datetime.fromtimestamp(1_700_000_000 + i).strftime('%Y-%m-%d %H:%M:%S'),
+            'language': 'en',
+        }
+
+    for size in sizes:
+        store = alert_store.AlertStore(os.path.join(workdir, f"history-{size}.db"))
+        prefill = max(size - samples, 0)
+        for start in range(0, prefill, 100_000):
+            store.extend(entry(i) for i in range(start, min(start + 100_000, prefill)))
+
+        appends, append_wall = timed_calls(store.append, [(entry(i),) for i in range(prefill, size)])
+        latest, latest_wall = timed_calls(store.latest, [(5,)] * samples)
+        by_city, by_city_wall = timed_calls(
+            lambda city: store.latest(5, city=city), [(cities[i % len(cities)],) for i in range(samples)]
+        )
+        by_status, by_status_wall = timed_calls(lambda: store.latest(5, status='alert'), [()] * samples)
+        results[f"{size}_entries"] = {
+            'append': summarize(appends, append_wall),
+            'latest': summarize(latest, latest_wall),
+            'latest_by_city': summarize(by_city, by_city_wall),
+            'latest_by_status': summarize(by_status, by_status_wall),
+            'rows': store.count(),
+        }
+    return results
+
+
+def compare(current, previous, path=()):
+    """Print throughput and p50 changes for scenarios present in both runs"""
+    for key, value in current.items():
+        before = previous.get(key) if isinstance(previous, dict) else None
+        if not isinstance(value, dict) or not isinstance(before, dict):
+            continue
+        if 'p50_ms' in value and 'p50_ms' in before:
+            changes = []
+            for metric in ('throughput_per_s', 'p50_ms', 'p99_ms'):
+                if value.get(metric) and before.get(metric):
+                    changes.append(f"{metric} {before[metric]} -> {value[metric]} "
+                                   f"({(value[metric] / before[metric] - 1):+.1%})")
+            print(f"{'/'.join(path + (key,))}: {'; '.join(changes)}")
+        else:
+            compare(value, before, path + (key,))
+
+
+def parse_sizes(text):
+    return [int(value) for value in text.split(',') if value]
+
+
+def run_scenarios(args, workdir):
+    """Start the fakes, point fll at them and ``workdir``, and run the enabled scenarios.
+
+    Returns the results and the model path used.
+    """
+    only = set(args.only.split(',')) if args.only else None
+
+    def enabled(name):
+        return only is None or name in only
+
+    owm_server, owm_url = mock_owm.start(latency=args.owm_latency)
+    controller, sink = start_smtp_sink(args.smtp_latency)
+    # fll reads its configuration at import time
+    os.environ.update({
+        'OWM_BASE_URL': owm_url,
+        'OWM_REQUESTS_PER_MINUTE': '1000000',
+        'SMTP_HOST': controller.hostname,
+        'SMTP_PORT': str(controller.port),
+        'SMTP_STARTTLS': '0',
+        'SENDER_EMAIL': 'bench@floodalert.example',
+        'SENDER_PASSWORD': 'unused',
+        'STATUS_DB': os.path.join(workdir, 'status.db'),
+        'USERS_DB': os.path.join(workdir, 'users.db'),
+        'JOBS_DB': os.path.join(workdir, 'jobs.db'),
+        'CITY_INDEX_DB': os.path.join(workdir, 'city_index.db'),
+        'RAINFALL_DB': os.path.join(workdir, 'rainfall.db'),
+        'TRANSLATION_CACHE_FILE': os.path.join(workdir, 'translations.db'),
+        'WEATHER_CACHE_SIZE': str(max(args.cities * 2, 256)),
+        'PREWARM_TRANSLATIONS': '0',
+    })
+    import alert_store
+    import fll
+    import metrics
+    import sms
+    import translation
+    translation.translate_chunk = stub_translator(args.translate_latency)
+
+    results = {}
+    try:
+        if enabled('single_city'):
+            results['single_city'] = bench_single_city(fll, args.cities)
+        if enabled('batch_prediction'):
+            results['batch_prediction'] = bench_batch_prediction(fll, parse_sizes(args.batch_sizes))
+        if enabled('bulk_email'):
+            results['bulk_email'] = bench_bulk_email(fll, metrics, parse_sizes(args.emails), sink)
+        if enabled('bulk_sms'):
+            results['bulk_sms'] = bench_bulk_sms(sms, args.sms, args.twilio_latency, fll.SMS_CONCURRENCY)
+        if enabled('translation'):
+            results['translation'] = bench_translation(fll, args.cities)
+        if enabled('history'):
+            results['history'] = bench_history(alert_store, parse_sizes(args.history), workdir)
+    finally:
+        owm_server.shutdown()
+        controller.stop()
+
+    return results, fll.model_path()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the flood alert pipeline against local fakes")
+    parser.add_argument("--owm-latency", type=float, default=0.0, help="seconds added to each weather response")
+    parser.add_argument("--smtp-latency", type=float, default=0.0, help="seconds the SMTP sink waits per message")
+    parser.add_argument("--twilio-latency", type=float, default=0.0, help="seconds per stub Twilio call")
+    parser.add_argument("--translate-latency", type=float, default=0.0, help="seconds per stub translation")
+    parser.add_argument("--cities", type=int, default=200, help="single-city checks per pass")
+    parser.add_argument("--batch-sizes", default="1,100,1000,10000")
+    parser.add_argument("--emails", default="1000,10000", help="bulk email sizes")
+    parser.add_argument("--sms", type=int, default=1000, help="bulk SMS size")
+    parser.add_argument("--history", default="10000,1000000", help="history sizes")
+    parser.add_argument("--only", help="comma-separated scenarios to run "
+                        "(single_city,batch_prediction,bulk_email,bulk_sms,translation,history)")
+    parser.add_argument("--output", help="JSON result path (default benchmarks/results/benchmark-<time>.json)")
+    parser.add_argument("--compare", help="earlier JSON result to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="flood-bench-") as workdir:
+        results, model = run_scenarios(args, workdir)
+
+    report = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'model': model,
+        },
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'results': results,
+    }
+    print(json.dumps(results, indent=2))
+
+    output = args.output or os.path.join(
+        "benchmarks", "results", f"benchmark-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)['results'])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Persistent city name -> OpenWeatherMap city ID (and coordinates) cache.
+
+OWM's bulk endpoints take numeric city IDs, so each free-text city name is
+resolved once (from an ordinary current-weather response) and remembered in
+SQLite. Unknown names are remembered too, for ``unknown_ttl`` seconds.
+Coordinates come from those responses or, for cities never fetched, from
+the OWM geocoding API (``remember_place``).
+"""
+import os
+import threading
+import time
+
+import storage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cities (
+    name_key TEXT PRIMARY KEY,
+    city_id INTEGER,
+    name TEXT,
+    country TEXT,
+    lat REAL,
+    lon REAL,
+    resolved_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cities_id ON cities (city_id);
+CREATE TABLE IF NOT EXISTS places (
+    name_key TEXT PRIMARY KEY,
+    name TEXT,
+    country TEXT,
+    lat REAL,
+    lon REAL,
+    resolved_at REAL NOT NULL
+);
+"""
+
+
+def name_key(city):
+    return (city or '').strip().lower()
+
+
+class CityIndex:
+    """Name -> ID/coordinate resolver backed by SQLite"""
+
+    def __init__(self, path, unknown_ttl=86400):
+        self.path = path
+        self.unknown_ttl = unknown_ttl
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        return storage.connect(self.path)
+
+    def lookup_many(self, cities):
+        """Map resolved cities to their OWM ID (None for known-unknown names).
+
+        Cities that were never resolved, or whose unknown marker expired, are
+        left out of the result.
+        """
+        keys = {}
+        for city in cities:
+            keys.setdefault(name_key(city), []).append(city)
+        found = {}
+        db = self._connect()
+        keys_list = list(keys)
+        expired = time.time() - self.unknown_ttl
+        for start in range(0, len(keys_list), 500):
+            chunk = keys_list[start:start + 500]
+            rows = db.execute(
+                f"SELECT name_key, city_id, resolved_at FROM cities "
+                f"WHERE name_key IN ({', '.join('?' * len(chunk))})",
+                chunk
+            )
+            for row in rows:
+                if row['city_id'] is None and row['resolved_at'] < expired:
+                    continue
+                for city in keys[row['name_key']]:
+                    found[city] = row['city_id']
+        return found
+
+    def coordinates_many(self, cities):
+        """Map cities to cached ``(lat, lon)``, or None for names the geocoder didn't know.
+
+        Cities never located, or whose unknown marker expired, are left out.
+        """
+        keys = {}
+        for city in cities:
+            keys.setdefault(name_key(city), []).append(city)
+        found = {}
+        db = self._connect()
+        keys_list = list(keys)
+        expired = time.time() - self.unknown_ttl
+        for start in range(0, len(keys_list), 500):
+            chunk = keys_list[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            # Weather-resolved coordinates win over geocoded ones
+            rows = db.execute(
+                f"SELECT name_key, lat, lon, resolved_at, 0 AS source FROM places WHERE name_key IN ({placeholders}) "
+                f"UNION ALL SELECT name_key, lat, lon, resolved_at, 1 FROM cities "
+                f"WHERE name_key IN ({placeholders}) AND lat IS NOT NULL ORDER BY source",
+                chunk + chunk
+            )
+            for row in rows:
+                if row['lat'] is None and row['resolved_at'] < expired:
+                    continue
+                point = (row['lat'], row['lon']) if row['lat'] is not None else None
+                for city in keys[row['name_key']]:
+                    found[city] = point
+        return found
+
+    def remember_place(self, city, place):
+        """Record a geocoding result (``{'name', 'country', 'lat', 'lon'}``, or None if unknown)"""
+        place = place or {}
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO places VALUES (?, ?, ?, ?, ?, ?)",
+                (name_key(city), place.get('name'), place.get('country'),
+                 place.get('lat'), place.get('lon'), time.time())
+            )
+
+    def get(self, city):
+        """Full cached record for a city, or None"""
+        row = self._connect().execute(
+            "SELECT * FROM cities WHERE name_key = ?", (name_key(city),)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def remember(self, city, data):
+        """Record the ID and coordinates from an OWM current-weather payload"""
+        coord = data.get('coord', {})
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO cities VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name_key(city), data.get('id'), data.get('name'),
+                 data.get('sys', {}).get('country'), coord.get('lat'), coord.get('lon'),
+                 time.time())
+            )
+
+    def remember_unknown(self, city):
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO cities (name_key, city_id, resolved_at) VALUES (?, NULL, ?)",
+                (name_key(city), time.time())
+            )
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(path):
+    """Return the process-wide city index for a database path"""
+    key = os.path.abspath(path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = CityIndex(key)
+        return index
@@ -0,0 +1,16 @@
+"""Model feature columns, shared by the app (fll.py) and the training CLI (train.py)."""
+import os
+
+import rainfall_store
+
+FEATURE_COLUMNS = ['temperature', 'humidity', 'pressure', 'rainfall', 'wind_speed']
+
+
+def rainfall_thresholds():
+    """Rolling rainfall windows and the accumulation (mm) in each that counts as flood risk"""
+    return rainfall_store.parse_thresholds(os.getenv('RAINFALL_THRESHOLDS_MM', '3h=65,24h=115'))
+
+
+def rolling_feature_columns(windows):
+    """Extra model features derived from the rainfall history of ``windows``"""
+    return [f'rain_{window}' for window in windows] + [f'rain_max_{window}' for window in windows]
@@ -1,19 +1,31 @@
-import pickle
-import requests
-import json
 import os
 from datetime import datetime
-from twilio.rest import Client
 import streamlit as st
-import smtplib
-from deep_translator import GoogleTranslator
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
 import hashlib
+import io
 import re
+import time
 from streamlit import session_state as state
-import pandas as pd
+import model_registry
+import weather_cache
+import weather_client
+import city_index
+import smtp_pool
+import translation
+import alert_store
+import user_store
+import alert_queue
+import alert_state
+import rainfall_store
+import forecast
+import geo_index
+import alert_templates
+import features
+import sms
+import metrics
 
 # Load environment variables
 load_dotenv()
@@ -35,6 +47,10 @@ language_dict = {
     'Assamese (অসমীয়া)': 'as'
 }
 
+# Values accepted in a recipient CSV's optional language column: codes or English names
+language_lookup = {code: code for code in language_dict.values()}
+language_lookup.update((name.split(' (')[0].lower(), code) for name, code in language_dict.items())
+
 # --- UTILITY FUNCTIONS ---
 def hash_password(password):
     """Hash a password using SHA-256 with salt"""
@@ -43,8 +59,7 @@ def hash_password(password):
 
 def validate_email(email):
     """Basic email validation"""
-    pattern = r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$"
-    return re.match(pattern, email)
+    return re.match(EMAIL_PATTERN, email)
 
 def get_weather_icon(icon_code):
     """Get weather icon from OpenWeatherMap code"""
@@ -63,61 +78,36 @@ def get_weather_icon(icon_code):
     }
     return icon_map.get(icon_code, '🌤️')
 
+@metrics.timed()
 def translate_message(text, dest_lang):
-    """Translate message to selected language using Google Translator"""
-    if dest_lang == 'en' or not text:
-        return text
-    
+    """Translate message to selected language (memoized per text and language)"""
     try:
-        # Split long text into chunks if needed (Google Translator has character limits)
-        max_chunk_size = 5000  # Google's limit is 5000 characters per request
-        if len(text) <= max_chunk_size:
-            return GoogleTranslator(source='auto', target=dest_lang).translate(text)
-        else:
-            # Split into sentences and translate chunks
-            sentences = text.split('. ')
-            translated_chunks = []
-            current_chunk = ""
-            
-            for sentence in sentences:
-                if len(current_chunk) + len(sentence) < max_chunk_size:
-                    current_chunk += sentence + ". "
-                else:
-                    if current_chunk:
-                        translated = GoogleTranslator(source='auto', target=dest_lang).translate(current_chunk)
-                        translated_chunks.append(translated)
-                    current_chunk = sentence + ". "
-            
-            if current_chunk:
-                translated = GoogleTranslator(source='auto', target=dest_lang).translate(current_chunk)
-                translated_chunks.append(translated)
-            
-            return " ".join(translated_chunks)
+        return translation.translate_text(text, dest_lang, get_translation_cache())
     except Exception as e:
+        metrics.record_error('translate_message', e)
         st.error(f"Translation failed: {str(e)}")
         return f"[Translation Failed] {text}"
 
+def translate_message_all(text, dest_langs):
+    """Translate a message into several languages at once, returning {lang: text}"""
+    translations, errors = translation.translate_many(
+        text, dest_langs, get_translation_cache(), TRANSLATION_WORKERS
+    )
+    for lang, error in errors.items():
+        st.error(f"Translation to {lang} failed: {str(error)}")
+        translations[lang] = f"[Translation Failed] {text}"
+    return translations
+
+def get_translation_cache():
+    """Process-wide translation cache backed by TRANSLATION_CACHE_FILE"""
+    return translation.get_cache(TRANSLATION_CACHE_FILE, TRANSLATION_CACHE_SIZE)
+
 # --- DATA MANAGEMENT FUNCTIONS ---
-def load_users():
-    """Load user data from JSON file with proper city field handling"""
-    try:
-        if os.path.exists(USERS_FILE):
-            with open(USERS_FILE, 'r') as f:
-                users = json.load(f)
-                # Ensure all users have 'city' field
-                for email, user_data in users.items():
-                    if 'city' not in user_data:
-                        user_data['city'] = 'Unknown City'
-                # Ensure admin account exists
-                if ADMIN_EMAIL not in users:
-                    users[ADMIN_EMAIL] = create_admin_user()
-                    save_users(users)
-                return users
-    except (json.JSONDecodeError, FileNotFoundError):
-        users = {ADMIN_EMAIL: create_admin_user()}
-        save_users(users)
-        return users
-    return {}
+def get_user_store():
+    """Shared user repository, importing a legacy USERS_FILE and seeding the admin on first use"""
+    return user_store.get_store(
+        USERS_DB, legacy_json=USERS_FILE, seed={ADMIN_EMAIL: create_admin_user()}
+    )
 
 def create_admin_user():
     """Create admin user with all required fields"""
@@ -128,11 +118,7 @@ def create_admin_user():
         'is_admin': True
     }
 
-def save_users(users):
-    """Save user data to JSON file"""
-    with open(USERS_FILE, 'w') as f:
-        json.dump(users, f, indent=2)
-
+@metrics.timed()
 def save_status(status, city_name, alert_type, language='en'):
     """Save alert history with all required fields"""
     entry = {
@@ -142,18 +128,11 @@ def save_status(status, city_name, alert_type, language='en'):
         'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
         'language': language
     }
+    get_alert_store().append(entry)
 
-    history = []
-    if os.path.exists(STATUS_FILE):
-        try:
-            with open(STATUS_FILE, 'r') as f:
-                history = json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            history = []
-
-    history.append(entry)
-    with open(STATUS_FILE, 'w') as f:
-        json.dump(history, f, indent=2)
+def get_alert_store():
+    """Process-wide alert history, migrating a legacy STATUS_FILE on first open"""
+    return alert_store.get_store(STATUS_DB, legacy_json=STATUS_FILE)
 
 # --- EMAIL FUNCTIONS ---
 def send_welcome_email(to_email, city):
@@ -188,9 +167,7 @@ def send_welcome_email(to_email, city):
         message["Subject"] = subject
         message.attach(MIMEText(html_content, "html"))
 
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
+        with open_smtp_connection(sender_email, sender_password) as server:
             server.sendmail(sender_email, to_email, message.as_string())
             st.toast("Welcome email sent successfully!", icon="✉️")
         return True
@@ -198,177 +175,1048 @@ def send_welcome_email(to_email, city):
         st.error(f"Failed to send welcome email: {str(e)}")
         return False
 
-def send_alert_email(to_email, city, alert_message):
-    """Send flood alert email"""
-    try:
-        sender_email = os.getenv("SENDER_EMAIL")
-        sender_password = os.getenv("SENDER_PASSWORD")
-        
-        subject = f"🚨 Flood Alert for {city}"
-        html_content = f"""
-<html><body>
-    <h2 style="color:#e74c3c;">Flood Alert Notification</h2>
-    <p><strong>Location:</strong> {city}</p>
-    <div style="background-color:#fdebd0; padding:15px; border-radius:5px;">
-        <h3 style="color:#e67e22;">Alert Message:</h3>
-        <p>{alert_message}</p>
-    </div>
-    <p>Please take necessary precautions.</p>
-    <p style="color:#5d6d7e;"><em>This is an automated alert - do not reply</em></p>
-</body></html>"""
+def open_smtp_connection(sender_email, sender_password):
+    """Open an authenticated SMTP session using the configured server"""
+    return smtp_pool.open_connection(
+        SMTP_HOST, SMTP_PORT, sender_email, sender_password, starttls=SMTP_STARTTLS
+    )
 
-        message = MIMEMultipart()
-        message["From"] = sender_email
-        message["To"] = to_email
-        message["Subject"] = subject
-        message.attach(MIMEText(html_content, "html"))
+def get_alert_templates():
+    """Process-wide cache of alert emails encoded once per city, language and text"""
+    return alert_templates.get_cache(TEMPLATE_CACHE_SIZE)
 
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, to_email, message.as_string())
-        return True
-    except Exception as e:
-        st.error(f"Failed to send alert email: {str(e)}")
-        return False
+def send_bulk_emails(recipients, city, alert_message, progress=None, on_result=None):
+    """Send emails to multiple recipients from CSV over pooled SMTP connections.
 
-def send_bulk_emails(recipients, city, alert_message):
-    """Send emails to multiple recipients from CSV"""
-    success_count = 0
-    failure_count = 0
-    
-    for recipient in recipients:
-        email = recipient.get('email', '').strip()
-        if not email or '@' not in email:
-            failure_count += 1
-            continue
-            
-        try:
-            if send_alert_email(email, city, alert_message):
-                success_count += 1
-            else:
-                failure_count += 1
-        except Exception as e:
-            st.error(f"Error sending to {email}: {str(e)}")
-            failure_count += 1
-    
-    return success_count, failure_count
+    ``recipients`` may be a generator, e.g. the chained batches of
+    ``iter_recipient_batches``, and is consumed as the sender goes.
+    ``on_result(email, error)`` is called from the sending threads.
+    """
+    sender_email = os.getenv("SENDER_EMAIL")
+    sender_password = os.getenv("SENDER_PASSWORD")
+    invalid_count = 0
+    encoded = get_alert_templates().render('alert', sender_email, city, None, None, alert_message)
 
-def read_recipients_from_csv(file):
-    """Read recipients from CSV file (name and email only)"""
-    try:
-        df = pd.read_csv(file)
-        df.columns = df.columns.str.lower()
-        
-        required_columns = ['name', 'email']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            st.error(f"CSV file must contain these columns: {', '.join(required_columns)}")
-            return None
-        
-        recipients = []
-        for _, row in df.iterrows():
-            recipient = {
-                'name': str(row['name']).strip(),
-                'email': str(row['email']).strip().lower()
-            }
-            recipients.append(recipient)
-        
-        return recipients
-        
-    except Exception as e:
-        st.error(f"Error reading CSV file: {str(e)}")
-        return None
+    def messages():
+        nonlocal invalid_count
+        for recipient in recipients:
+            email = recipient.get('email', '').strip()
+            if not email or '@' not in email:
+                invalid_count += 1
+                continue
+            yield sender_email, email, alert_templates.for_recipient(encoded, email)
+
+    result = get_bulk_mailer(sender_email, sender_password).send(
+        messages(),
+        progress=(lambda sent, failed: progress(sent, failed + invalid_count)) if progress else None,
+        on_result=on_result
+    )
+
+    for email, error in result['errors'][:5]:
+        st.error(f"Error sending to {email}: {error}")
+    if len(result['errors']) > 5:
+        st.error(f"...and {len(result['errors']) - 5} more delivery errors")
+
+    return result['sent'], result['failed'] + invalid_count
+
+def get_bulk_mailer(sender_email, sender_password):
+    """Pooled SMTP sender configured from the SMTP_* settings"""
+    return smtp_pool.BulkMailer(
+        SMTP_HOST, SMTP_PORT, sender_email, sender_password,
+        starttls=SMTP_STARTTLS,
+        concurrency=SMTP_CONCURRENCY,
+        batch_size=SMTP_BATCH_SIZE,
+        max_retries=SMTP_MAX_RETRIES
+    )
+
+def weather_update_email_body(message, weather_data):
+    """Plain alert body with the current conditions, used when there is no flood risk"""
+    return f"""
+Dear Resident,
+
+{message}
+
+Current Weather Conditions:
+- Temperature: {weather_data['temperature']}°C
+- Humidity: {weather_data['humidity']}%
+- Rainfall: {weather_data['rainfall']:.1f}mm
+- Conditions: {weather_data['weather_desc']}
+
+Stay safe,
+Flood Alert System
+"""
+
+def iter_csv_chunks(file, chunk_size=None):
+    """Read a recipient CSV in chunks of string columns with lower-case names"""
+    import pandas as pd
+    for chunk in pd.read_csv(file, dtype=str, chunksize=chunk_size or CSV_CHUNK_SIZE):
+        chunk.columns = chunk.columns.str.strip().str.lower()
+        if 'name' not in chunk.columns or 'email' not in chunk.columns:
+            raise ValueError("CSV file must contain these columns: name, email")
+        yield chunk
+
+def iter_recipient_batches(file, chunk_size=None, stats=None):
+    """Stream valid, de-duplicated recipients from a CSV as one list of dicts per chunk.
+
+    Records carry 'phone' and 'language' (a code from language_dict, when the
+    CSV's language column names a known language) if the CSV has those columns.
+    Emails are trimmed, lower-cased and checked against EMAIL_PATTERN column-wise;
+    only the set of addresses already seen is kept across chunks. ``stats``, if
+    given, collects the row, invalid and duplicate counts.
+    """
+    import pandas as pd
+    stats = stats if stats is not None else {}
+    for key in ('rows', 'invalid', 'duplicates'):
+        stats.setdefault(key, 0)
+    seen = set()
+    for chunk in iter_csv_chunks(file, chunk_size):
+        emails = chunk['email'].fillna('').str.strip().str.lower()
+        valid = emails.str.match(EMAIL_PATTERN)
+        fresh = valid & ~emails.duplicated() & ~emails.map(seen.__contains__).astype(bool)
+        stats['rows'] += len(chunk)
+        stats['invalid'] += int((~valid).sum())
+        stats['duplicates'] += int((valid & ~fresh).sum())
+
+        batch = pd.DataFrame({
+            'name': chunk['name'].fillna('').str.strip()[fresh],
+            'email': emails[fresh],
+        })
+        if 'phone' in chunk.columns:
+            batch['phone'] = chunk['phone'].str.strip()[fresh]
+        if 'language' in chunk.columns:
+            batch['language'] = chunk['language'].str.strip().str.lower().map(language_lookup)[fresh]
+        seen.update(batch['email'])
+        if len(batch):
+            records = batch.to_dict('records')
+            optional = [column for column in ('phone', 'language') if column in batch.columns]
+            if optional:
+                for record in records:
+                    for column in optional:
+                        if not isinstance(record[column], str) or not record[column]:
+                            del record[column]
+            yield records
+
+def iter_csv_phones(file, chunk_size=None):
+    """Stream the distinct, non-empty numbers of a CSV's optional phone column"""
+    seen = set()
+    for chunk in iter_csv_chunks(file, chunk_size):
+        if 'phone' not in chunk.columns:
+            return
+        phones = chunk['phone'].dropna().str.strip()
+        phones = phones[(phones != '') & ~phones.duplicated() & ~phones.map(seen.__contains__).astype(bool)]
+        seen.update(phones)
+        yield from phones
 
 # --- FLOOD ALERT FUNCTIONS ---
+@metrics.timed()
 def load_model():
-    """Load the trained flood prediction model"""
+    """Load the trained flood prediction model (shared and cached per process)"""
     try:
-        with open(MODEL_FILE, "rb") as file:
-            return pickle.load(file)
+        return model_registry.get_model(model_path())
     except Exception as e:
+        metrics.record_error('load_model', e)
         st.error(f"❌ Error loading model: {e}")
         return None
 
+def model_path():
+    """MODEL_VERSION's artifact under MODEL_DIR, or MODEL_FILE when no version is set"""
+    if MODEL_VERSION:
+        return model_registry.resolve_version(MODEL_DIR, MODEL_VERSION)
+    return MODEL_FILE
+
+def model_features(model):
+    """Feature order the model was trained with"""
+    names = getattr(model, 'feature_names_in_', None)
+    return list(names) if names is not None else FEATURE_COLUMNS
+
+def fetch_weather_data(city_name):
+    """Fetch and normalize current weather from OpenWeatherMap (None if the city is unknown)"""
+    return get_weather_client().fetch(city_name)
+
+def get_weather_client():
+    """Process-wide pooled, rate-limited OpenWeatherMap client"""
+    return weather_client.get_client(API_KEY, OWM_BASE_URL, OWM_REQUESTS_PER_MINUTE)
+
+def get_city_index():
+    """Process-wide persistent city name -> OWM city ID cache"""
+    return city_index.get_index(CITY_INDEX_DB)
+
+def geocode_many(cities, concurrency=None):
+    """``{city: (lat, lon)}`` from the city index, geocoding uncached names through OWM.
+
+    Cities OWM doesn't know map to None; failed lookups are left out.
+    """
+    index = get_city_index()
+    coordinates = index.coordinates_many(cities)
+    missing = [city for city in dict.fromkeys(cities) if city not in coordinates]
+    if missing:
+        places, errors = get_weather_client().geocode_many(missing, concurrency)
+        for city, place in places.items():
+            index.remember_place(city, place)
+            coordinates[city] = (place['lat'], place['lon']) if place else None
+        for city, error in errors.items():
+            metrics.record_error('geocode_many', error)
+    return coordinates
+
+def build_subscriber_index():
+    """Spatial index of every subscribed user's city"""
+    groups = get_user_store().subscribed_by_city()
+    coordinates = geocode_many([name for name, _ in groups.values()])
+    return geo_index.SubscriberIndex(groups, coordinates, GEO_CELL_KM)
+
+def get_subscriber_index():
+    """Process-wide subscriber index, rebuilt every SUBSCRIBER_INDEX_TTL seconds"""
+    return geo_index.get_index(build_subscriber_index, SUBSCRIBER_INDEX_TTL)
+
+@metrics.timed()
+def subscribers_near(city_name, radius_km=None):
+    """Emails subscribed to a city or to any city within ``radius_km`` of it"""
+    radius_km = ALERT_RADIUS_KM if radius_km is None else radius_km
+    point = geocode_many([city_name]).get(city_name) if radius_km else None
+    return get_subscriber_index().recipients_near(city_name, point, radius_km)
+
+@metrics.timed()
 def get_weather_data_by_name(city_name):
-    """Fetch weather data from OpenWeatherMap API"""
+    """Fetch weather data from OpenWeatherMap API (through the shared weather cache)"""
     try:
-        url = f"http://api.openweathermap.org/data/2.5/weather?q={city_name}&appid={API_KEY}&units=metric"
-        response = requests.get(url, timeout=10)
-
-        if response.status_code != 200:
-            st.error(f"❌ API call failed: {response.status_code} - {response.text}")
-            return None
-
-        data = response.json()
-        return {
-            'temperature': data.get('main', {}).get('temp', 0),
-            'humidity': data.get('main', {}).get('humidity', 0),
-            'pressure': data.get('main', {}).get('pressure', 0),
-            'wind_speed': data.get('wind', {}).get('speed', 0),
-            'rainfall': data.get('rain', {}).get('1h', 0) if data.get('rain') else 0,
-            'weather_desc': data.get('weather', [{}])[0].get('description', ''),
-            'icon': data.get('weather', [{}])[0].get('icon', '')
-        }
+        weather_data = get_weather_cache().get(city_name, fetch_weather_data)
+        if weather_data is None:
+            st.error(f"❌ City not found: {city_name}")
+        return weather_data
 
     except Exception as e:
+        metrics.record_error('get_weather_data_by_name', e)
         st.error(f"❌ Error fetching weather data: {e}")
         return None
 
+def get_rainfall_store():
+    """Process-wide rolling rainfall history per city"""
+    return rainfall_store.get_store(RAINFALL_DB, list(RAINFALL_THRESHOLDS_MM), RAINFALL_STEP_SECONDS)
+
+def with_rainfall_many(weather):
+    """Record ``{city: weather_data}`` in the rainfall history and return copies
+    with each city's rolling totals (rain_3h, rain_max_3h, ...) added"""
+    observed = {city: data for city, data in weather.items() if data}
+    try:
+        totals = get_rainfall_store().observe_many(
+            {city: (data['rainfall'], data.get('observed_at')) for city, data in observed.items()}
+        )
+    except Exception as e:
+        metrics.record_error('rainfall_store', e)
+        return weather
+    return {city: {**data, **totals[city]} if city in totals else data for city, data in weather.items()}
+
+def with_rainfall(city_name, weather_data):
+    """Single-city form of ``with_rainfall_many``"""
+    return with_rainfall_many({city_name: weather_data})[city_name]
+
+def get_forecast_cache():
+    """Process-wide forecast cache (entries expire when OWM issues the next forecast)"""
+    return forecast.get_cache(FORECAST_CACHE_SIZE)
+
+@metrics.timed()
+def forecast_risk_many(cities, model, hours=None, concurrency=None):
+    """Score every upcoming forecast step of many cities with one model call.
+
+    Returns ``(scores, windows)``: a DataFrame with one row per city and step,
+    and each city's earliest at-risk window within ``hours`` (None when not
+    at risk). Cities whose forecast could not be fetched are left out.
+    """
+    client = get_weather_client()
+    forecasts, errors = get_forecast_cache().get_many(
+        cities, lambda missing: client.fetch_forecasts(missing, concurrency)
+    )
+    for city, error in errors.items():
+        metrics.record_error('forecast_risk_many', error)
+    frame = forecast.feature_frame(forecasts, list(RAINFALL_THRESHOLDS_MM), hours or FORECAST_HOURS)
+    if frame is None:
+        return None, {}
+    scores = predict_flood_batch(frame, model)
+    if scores is None:
+        return None, {}
+    scores['time'] = frame['time'].to_numpy()
+    scores['step_rain'] = frame['step_rain'].to_numpy()
+    return scores, forecast.earliest_windows(scores)
+
+def forecast_window(city_name, model, hours=None):
+    """Earliest forecast flood-risk window for one city: ``(available, window)``"""
+    try:
+        _, windows = forecast_risk_many([city_name], model, hours)
+    except Exception as e:
+        metrics.record_error('forecast_window', e)
+        return False, None
+    return city_name in windows, windows.get(city_name)
+
+def format_window(window):
+    """'Tue 14:00 - Tue 20:00' in server local time"""
+    start, end = (datetime.fromtimestamp(window[key]) for key in ('start', 'end'))
+    return f"{start:%a %H:%M} - {end:%a %H:%M}"
+
+def forecast_alert_message(city_name, window):
+    """Early warning text for a forecast flood-risk window"""
+    return (f"FLOOD WARNING: Flood risk forecast for {city_name} between {format_window(window)}. "
+            f"Prepare to move to safer location and avoid river areas.")
+
+def get_weather_cache():
+    """Process-wide weather cache configured from the environment"""
+    return weather_cache.get_cache(
+        ttl=WEATHER_CACHE_TTL,
+        stale_ttl=WEATHER_CACHE_STALE_TTL,
+        max_entries=WEATHER_CACHE_SIZE,
+        negative_ttl=WEATHER_NEGATIVE_TTL
+    )
+
+@metrics.timed()
 def predict_flood(weather_data, model):
     """Predict flood risk using ML model"""
     if not model or not weather_data:
         return False
     
     try:
-        features = [[
-            weather_data['temperature'],
-            weather_data['humidity'],
-            weather_data['pressure'],
-            weather_data['rainfall'],
-            weather_data['wind_speed']
-        ]]
+        features = [[weather_data[column] for column in model_features(model)]]
         prediction = model.predict(features)
         return prediction[0] == 1
     except Exception as e:
+        metrics.record_error('predict_flood', e)
         st.error(f"❌ Error during prediction: {e}")
         return False
 
-def check_flood_risk_by_rain(rainfall):
-    """Simple threshold-based flood check"""
-    THRESHOLD = 50  # mm rainfall in last 1 hour
-    return rainfall > THRESHOLD
+@metrics.timed()
+def predict_flood_batch(observations, model, cities=None):
+    """Score many weather observations with a single vectorized model call.
+
+    ``observations`` is a DataFrame with the FEATURE_COLUMNS (and optionally a
+    'city' column) or a 2-D array in FEATURE_COLUMNS order. Returns a DataFrame
+    with per-city flood probability, ML risk, rain-threshold risk and overall risk.
+    """
+    if model is None or observations is None or len(observations) == 0:
+        return None
 
-def send_sms(to_phone, message):
-    """Send SMS alert via Twilio"""
+    import numpy as np
+    import pandas as pd
     try:
-        client.messages.create(
-            body=message,
-            from_=twilio_number,
-            to=to_phone
+        if isinstance(observations, pd.DataFrame):
+            features = observations[model_features(model)].astype(float)
+            if cities is None and 'city' in observations.columns:
+                cities = observations['city'].to_numpy()
+        else:
+            features = pd.DataFrame(np.asarray(observations, dtype=float), columns=FEATURE_COLUMNS)
+        if cities is None:
+            cities = features.index.to_numpy()
+
+        probabilities = model.predict_proba(features)
+        classes = np.asarray(model.classes_)
+        ml_risk = classes[probabilities.argmax(axis=1)] == 1
+        flood_probability = (
+            probabilities[:, np.flatnonzero(classes == 1)[0]]
+            if (classes == 1).any() else np.zeros(len(features))
         )
-        st.success(f"✅ SMS sent to {to_phone}")
-        return True
+        totals = {}
+        if isinstance(observations, pd.DataFrame):
+            totals = {column: observations[column].to_numpy(dtype=float)
+                      for column in observations.columns if column.startswith('rain_')}
+        rain_risk = check_flood_risk_by_rain(features['rainfall'].to_numpy(), totals)
+
+        return pd.DataFrame({
+            'city': cities,
+            'flood_probability': flood_probability,
+            'ml_risk': ml_risk,
+            'rain_risk': rain_risk,
+            'flood_risk': ml_risk | rain_risk
+        })
     except Exception as e:
-        st.error(f"❌ Failed to send SMS to {to_phone}: {e}")
-        return False
+        metrics.record_error('predict_flood_batch', e)
+        st.error(f"❌ Error during batch prediction: {e}")
+        return None
+
+def check_flood_risk_by_rain(rainfall, totals=None):
+    """Threshold-based flood check on the last hour's rain and, when ``totals``
+    holds them, the rolling accumulations (works on scalars and NumPy arrays)"""
+    risk = rainfall > RAIN_THRESHOLD_MM
+    for window, threshold in RAINFALL_THRESHOLDS_MM.items():
+        total = (totals or {}).get(f'rain_{window}')
+        if total is not None:
+            risk = risk | (total >= threshold)
+    return risk
+
+def flood_alert_message(city_name, weather_data, flood_risk):
+    """Standard alert text for a city's current risk"""
+    if flood_risk:
+        return f"URGENT: Flood alert for {city_name}. Heavy rainfall ({weather_data['rainfall']:.1f}mm) detected. Move to safer location immediately. Avoid river areas."
+    return f"Weather update for {city_name}: No flood risk currently. Rainfall: {weather_data['rainfall']:.1f}mm. Stay vigilant."
+
+def deliver_sms(to_phone, message):
+    """Send one SMS via Twilio, raising on failure"""
+    return sms.twilio_transport(get_twilio_client(), twilio_number)(to_phone, message)
+
+def get_twilio_client():
+    """Shared Twilio client, created on the first SMS"""
+    return sms.get_twilio_client(account_sid, auth_token)
+
+def get_bulk_sms_sender():
+    """Concurrent SMS sender sharing the Twilio client, limited to TWILIO_SEGMENTS_PER_SECOND"""
+    return sms.BulkSMSSender(
+        sms.twilio_transport(get_twilio_client(), twilio_number),
+        segments_per_second=TWILIO_SEGMENTS_PER_SECOND,
+        concurrency=SMS_CONCURRENCY,
+        max_retries=SMS_MAX_RETRIES
+    )
+
+def show_metrics():
+    """Admin view of call latency, counts and error rates from the metrics registry"""
+    snapshot = metrics.registry.snapshot()
+    if not snapshot:
+        st.info("No calls recorded yet")
+        return
+    rows = [
+        {
+            'Call': name,
+            'Count': summary['count'],
+            'Errors': summary['errors'],
+            'Error rate': f"{summary['error_rate']:.1%}",
+            'p50 ms': round(summary['p50_ms'], 2),
+            'p95 ms': round(summary['p95_ms'], 2),
+            'p99 ms': round(summary['p99_ms'], 2),
+            'Max ms': round(summary['max_ms'], 2),
+        }
+        for name, summary in snapshot.items() if summary['count']
+    ]
+    st.dataframe(rows, hide_index=True)
+    for name, summary in snapshot.items():
+        if summary['last_error']:
+            st.caption(f"Last {name} error: {summary['last_error']}")
+    col_a, col_b = st.columns(2)
+    col_a.download_button("Prometheus text", metrics.registry.to_prometheus(),
+                          file_name="metrics.txt", mime="text/plain")
+    col_b.download_button("JSON", metrics.registry.to_json(),
+                          file_name="metrics.json", mime="application/json")
+
+# --- DISPATCH QUEUE ---
+def get_alert_queue():
+    """Process-wide persistent alert job queue"""
+    return alert_queue.get_queue(JOBS_DB)
+
+def start_dispatch_workers():
+    """Register job handlers and start this process's dispatch workers (once per process)"""
+    queue = get_alert_queue()
+    alert_queue.register_handler('bulk_email', run_bulk_email_job)
+    alert_queue.register_handler('bulk_sms', run_bulk_sms_job)
+    alert_queue.register_handler('alert', run_alert_job)
+    alert_queue.start_workers(queue, DISPATCH_WORKERS)
+    return queue
+
+def get_alert_state():
+    """Process-wide per-(city, recipient) dedupe and cooldown state"""
+    return alert_state.get_store(ALERT_STATE_DB, {
+        'alert': ALERT_COOLDOWN_SECONDS,
+        'forecast': FORECAST_COOLDOWN_SECONDS,
+        'safe': SAFE_COOLDOWN_SECONDS,
+    })
+
+def job_ref(job):
+    """Alert-state reservation ref for a dispatch job"""
+    return f"job:{job['id']}"
+
+def dedupe_recipients(job, queue, channel, recipients, batch_size=500):
+    """Yield the job's recipients that are due an alert; the rest are marked skipped"""
+    payload = job['payload']
+    alert_state = get_alert_state()
+
+    def reserve(batch):
+        send, skipped = alert_state.reserve(
+            payload['city'], payload['status'], batch,
+            force=payload.get('force', False), ref=job_ref(job)
+        )
+        for recipient, reason in skipped.items():
+            queue.skip_recipient(job['id'], channel, recipient, reason)
+        return send
+
+    batch = []
+    for recipient in recipients:
+        batch.append(recipient)
+        if len(batch) >= batch_size:
+            yield from reserve(batch)
+            batch = []
+    if batch:
+        yield from reserve(batch)
+
+def delivery_recorder(job, queue, channel):
+    """Callback recording one delivery result; failed sends give back their cooldown slot"""
+    def record(recipient, error=None):
+        queue.mark_recipient(job['id'], channel, recipient, error)
+        if error is not None:
+            get_alert_state().release(job['payload']['city'], recipient, job_ref(job))
+    return record
+
+def submit_alert_job(kind, payload, recipients, key=None):
+    """Queue an alert job; returns (job_id, created)"""
+    return start_dispatch_workers().submit(kind, payload, recipients, key=key)
+
+@metrics.timed()
+def run_bulk_email_job(job, queue):
+    """Worker handler: translate and render once per language group, then email every
+    pending recipient over pooled SMTP"""
+    payload = job['payload']
+    sender_email = os.getenv("SENDER_EMAIL")
+    sender_password = os.getenv("SENDER_PASSWORD")
+    groups = queue.pending_languages(job['id'], 'email')
+    translations = translate_message_all(
+        payload['message'], [language or payload['language'] for language in groups]
+    )
+    templates = get_alert_templates()
+
+    def messages():
+        for group in groups:
+            language = group or payload['language']
+            encoded = templates.render('alert', sender_email, payload['city'], language,
+                                       payload['status'], translations[language])
+            pending = queue.pending_recipients(job['id'], 'email', language=group)
+            for email in dedupe_recipients(job, queue, 'email', pending):
+                yield sender_email, email, alert_templates.for_recipient(encoded, email)
+
+    get_bulk_mailer(sender_email, sender_password).send(
+        messages(),
+        on_result=delivery_recorder(job, queue, 'email')
+    )
+    sent = queue.job(job['id'])['sent']
+    if sent > 0:
+        save_status(payload['status'], payload['city'], f"BulkEmail({sent})", payload['language'])
+
+@metrics.timed()
+def run_alert_job(job, queue):
+    """Worker handler: send an individual SMS and/or email alert"""
+    payload = job['payload']
+    message = translation.translate_text(payload['message'], payload['language'], get_translation_cache())
+
+    record_sms = delivery_recorder(job, queue, 'sms')
+    for phone in list(dedupe_recipients(job, queue, 'sms', queue.pending_recipients(job['id'], 'sms'))):
+        try:
+            deliver_sms(phone, message)
+            record_sms(phone)
+        except Exception as e:
+            record_sms(phone, e)
+
+    record_delivery = delivery_recorder(job, queue, 'email')
+    recorded = set()
+    def record_email(email, error=None):
+        recorded.add(email)
+        record_delivery(email, error)
+
+    emails = list(dedupe_recipients(job, queue, 'email', queue.pending_recipients(job['id'], 'email')))
+    if emails:
+        sender_email = os.getenv("SENDER_EMAIL")
+        sender_password = os.getenv("SENDER_PASSWORD")
+        body = message if payload['flood_risk'] else weather_update_email_body(message, payload['weather'])
+        try:
+            encoded = get_alert_templates().render('alert', sender_email, payload['city'],
+                                                   payload['language'], payload['status'], body)
+            with open_smtp_connection(sender_email, sender_password) as server:
+                for email in emails:
+                    try:
+                        with metrics.timer('smtp_send'):
+                            server.sendmail(sender_email, email, alert_templates.for_recipient(encoded, email))
+                        record_email(email)
+                    except Exception as e:
+                        record_email(email, e)
+        except Exception as e:
+            # e.g. the connection failed, or quit() did after some emails were delivered
+            for email in emails:
+                if email not in recorded:
+                    record_email(email, e)
+
+    counts = queue.channel_counts(job['id'])
+    alert_type = [label for channel, label in (('sms', 'SMS'), ('email', 'Email'))
+                  if counts.get(channel, {}).get('sent')]
+    if alert_type:
+        save_status(payload['status'], payload['city'], '+'.join(alert_type), payload['language'])
+
+@metrics.timed()
+def run_bulk_sms_job(job, queue):
+    """Worker handler: translate once, then text every pending number"""
+    payload = job['payload']
+    message = translation.translate_text(payload['message'], payload['language'], get_translation_cache())
+    get_bulk_sms_sender().send(
+        dedupe_recipients(job, queue, 'sms', queue.pending_recipients(job['id'], 'sms')),
+        message,
+        on_result=delivery_recorder(job, queue, 'sms')
+    )
+    sent = queue.job(job['id'])['sent']
+    if sent > 0:
+        save_status(payload['status'], payload['city'], f"BulkSMS({sent})", payload['language'])
+
+def show_dispatch_jobs(limit=5):
+    """Render progress of the most recent alert jobs"""
+    queue = get_alert_queue()
+    jobs = queue.recent(limit)
+    if not jobs:
+        st.info("No alert jobs yet")
+        return
+    for job in jobs:
+        done = job['sent'] + job['failed'] + job['skipped']
+        fraction = done / job['total'] if job['total'] else 1.0
+        skipped = f", {job['skipped']} skipped (already alerted)" if job['skipped'] else ""
+        st.progress(
+            min(fraction, 1.0),
+            text=f"#{job['id']} {job['kind']} - {job['status']}: "
+                 f"{job['sent']} sent, {job['failed']} failed{skipped} of {job['total']}"
+        )
+        if job['error']:
+            st.error(f"Job #{job['id']} failed: {job['error']}")
+        if job['failed']:
+            with st.expander(f"Failures for job #{job['id']}"):
+                for failure in queue.failures(job['id']):
+                    st.write(f"{failure['channel']} {failure['recipient']}: {failure['error']}")
 
 # --- CONFIGURATION ---
-MODEL_FILE = "flood_model.pkl"
+MODEL_FILE = os.getenv('MODEL_FILE', 'flood_model')  # compact export (model_export.py) or a pickled model
+MODEL_DIR = os.getenv('MODEL_DIR', 'models')  # versioned artifacts written by train.py
+MODEL_VERSION = os.getenv('MODEL_VERSION')  # e.g. 20250601-120000 or 'latest'; overrides MODEL_FILE
+FEATURE_COLUMNS = features.FEATURE_COLUMNS
+RAIN_THRESHOLD_MM = 50  # mm rainfall in last 1 hour
+# Radius fan-out: alerts also reach subscribers of cities within ALERT_RADIUS_KM (0 = same city only)
+ALERT_RADIUS_KM = float(os.getenv('ALERT_RADIUS_KM', '25'))
+GEO_CELL_KM = float(os.getenv('GEO_CELL_KM', '50'))  # grid cell size of the subscriber index
+SUBSCRIBER_INDEX_TTL = int(os.getenv('SUBSCRIBER_INDEX_TTL', '300'))
+
+# Forecast look-ahead (hours of the OWM 3-hourly forecast to score; 0 disables it)
+FORECAST_HOURS = int(os.getenv('FORECAST_HOURS', '48'))
+FORECAST_CACHE_SIZE = int(os.getenv('FORECAST_CACHE_SIZE', '256'))
+# Rolling rainfall windows and the accumulation (mm) in each that counts as flood risk
+RAINFALL_THRESHOLDS_MM = features.rainfall_thresholds()
+RAINFALL_STEP_SECONDS = int(os.getenv('RAINFALL_STEP_SECONDS', '600'))
+RAINFALL_DB = os.getenv('RAINFALL_DB', 'rainfall.db')
+# Extra model features derived from the rainfall history; train.py --features can use them
+ROLLING_FEATURE_COLUMNS = features.rolling_feature_columns(RAINFALL_THRESHOLDS_MM)
 API_KEY = os.getenv('WEATHER_API_KEY', 'a6f81aff8e354cf14db2c448cbb27e5c')
-USERS_FILE = "users_data.json"
-STATUS_FILE = 'status_history.json'
+USERS_FILE = "users_data.json"  # legacy users, imported into USERS_DB
+USERS_DB = os.getenv('USERS_DB', 'users_data.db')
+STATUS_FILE = 'status_history.json'  # legacy history, migrated into STATUS_DB
+STATUS_DB = os.getenv('STATUS_DB', 'status_history.db')
 ADMIN_EMAIL = os.getenv('ADMIN_EMAIL', 'admin@floodalert.com')
+EMAIL_PATTERN = r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$"
+CSV_CHUNK_SIZE = int(os.getenv('CSV_CHUNK_SIZE', '10000'))  # rows read per chunk of an uploaded CSV
+OWM_BASE_URL = os.getenv('OWM_BASE_URL', 'http://api.openweathermap.org')
+OWM_REQUESTS_PER_MINUTE = int(os.getenv('OWM_REQUESTS_PER_MINUTE', '60'))
+CITY_INDEX_DB = os.getenv('CITY_INDEX_DB', 'city_index.db')
+
+# Weather cache (seconds / entries)
+WEATHER_CACHE_TTL = int(os.getenv('WEATHER_CACHE_TTL', '600'))
+WEATHER_CACHE_STALE_TTL = int(os.getenv('WEATHER_CACHE_STALE_TTL', '1800'))
+WEATHER_CACHE_SIZE = int(os.getenv('WEATHER_CACHE_SIZE', '256'))
+WEATHER_NEGATIVE_TTL = int(os.getenv('WEATHER_NEGATIVE_TTL', '300'))
+# Rerun the weather/risk card on a timer (0 = only when the city changes or the cache TTL passes)
+WEATHER_REFRESH_SECONDS = int(os.getenv('WEATHER_REFRESH_SECONDS', '0'))
+
+# Translation cache
+TRANSLATION_CACHE_FILE = os.getenv('TRANSLATION_CACHE_FILE', 'translations.db')
+TRANSLATION_CACHE_SIZE = int(os.getenv('TRANSLATION_CACHE_SIZE', '1024'))
+TRANSLATION_WORKERS = int(os.getenv('TRANSLATION_WORKERS', '8'))
+PREWARM_TRANSLATIONS = os.getenv('PREWARM_TRANSLATIONS', '1') != '0'
+TRANSLATION_PREVIEW_TEXT = "Flood alert! Heavy rainfall detected. Please move to safer location."
+# Fixed alert texts translated into every language at startup
+STANDARD_ALERT_TEXTS = [TRANSLATION_PREVIEW_TEXT]
+
+# Encoded alert emails kept for reuse across recipients
+TEMPLATE_CACHE_SIZE = int(os.getenv('TEMPLATE_CACHE_SIZE', '256'))
+
+# Alert dispatch queue
+JOBS_DB = os.getenv('JOBS_DB', 'alert_jobs.db')
+DISPATCH_WORKERS = int(os.getenv('DISPATCH_WORKERS', '2'))
+
+# Alert dedupe: the same status is re-sent to a recipient only after its cooldown
+ALERT_STATE_DB = os.getenv('ALERT_STATE_DB', STATUS_DB)
+ALERT_COOLDOWN_SECONDS = int(os.getenv('ALERT_COOLDOWN_SECONDS', str(6 * 3600)))
+SAFE_COOLDOWN_SECONDS = int(os.getenv('SAFE_COOLDOWN_SECONDS', str(24 * 3600)))
+FORECAST_COOLDOWN_SECONDS = int(os.getenv('FORECAST_COOLDOWN_SECONDS', str(ALERT_COOLDOWN_SECONDS)))
+
+# Metrics (/metrics and /metrics.json are served only when a port is set)
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+# SMTP Configuration
+SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', '1') != '0'
+SMTP_CONCURRENCY = int(os.getenv('SMTP_CONCURRENCY', '4'))
+SMTP_BATCH_SIZE = int(os.getenv('SMTP_BATCH_SIZE', '50'))
+SMTP_MAX_RETRIES = int(os.getenv('SMTP_MAX_RETRIES', '3'))
 
 # Twilio Configuration
 account_sid = os.getenv('TWILIO_ACCOUNT_SID', 'ACa87356bcc92f8c0c5b484c4d07847b89')
 auth_token = os.getenv('TWILIO_AUTH_TOKEN', '76ee8346337a83745229caecdee69a65')
 twilio_number = os.getenv('TWILIO_NUMBER', '+13305835246')
 
-client = Client(account_sid, auth_token)
+TWILIO_SEGMENTS_PER_SECOND = float(os.getenv('TWILIO_SEGMENTS_PER_SECOND', '1'))
+SMS_CONCURRENCY = int(os.getenv('SMS_CONCURRENCY', '4'))
+SMS_MAX_RETRIES = int(os.getenv('SMS_MAX_RETRIES', '3'))
 
 # --- STREAMLIT UI ---
+def empty_risk(city_name):
+    return {
+        'city': city_name,
+        'weather_data': None,
+        'base_msg': None,
+        'flood_risk': False,
+        'alert_status': 'safe',
+        'forecast_available': False,
+        'forecast': None,
+        'checked_at': time.time()
+    }
+
+
+def assess_city(city_name):
+    """Fetch the weather for a city and score its flood risk"""
+    risk = empty_risk(city_name)
+    weather_data = with_rainfall(city_name, get_weather_data_by_name(city_name))
+    if weather_data:
+        # Loaded on first prediction so visitors without a city skip sklearn
+        model = load_model()
+        flood_risk = bool(predict_flood(weather_data, model)
+                          or check_flood_risk_by_rain(weather_data['rainfall'], weather_data))
+        risk.update(
+            weather_data=weather_data,
+            flood_risk=flood_risk,
+            alert_status='alert' if flood_risk else 'safe',
+            base_msg=flood_alert_message(city_name, weather_data, flood_risk)
+        )
+        if FORECAST_HOURS:
+            available, window = forecast_window(city_name, model)
+            risk.update(forecast_available=available, forecast=window)
+            if window and not flood_risk:
+                risk['base_msg'] += f" Forecast: flood risk expected between {format_window(window)}."
+    return risk
+
+
+def current_risk(city_name):
+    """This session's assessment of ``city_name``, shared with the admin panel.
+
+    Reruns triggered elsewhere on the page reuse it; it is recomputed only
+    when the city changes, the last fetch failed, or it is older than the
+    refresh interval.
+    """
+    risk = state.get('risk')
+    max_age = WEATHER_REFRESH_SECONDS or WEATHER_CACHE_TTL
+    if (risk is None or risk['city'] != city_name or risk['weather_data'] is None
+            or time.time() - risk['checked_at'] >= max_age):
+        risk = state.risk = assess_city(city_name) if city_name else empty_risk(city_name)
+    return risk
+
+
+def rolling_rainfall_html(weather_data):
+    """Weather card lines for the rolling rainfall totals"""
+    return ''.join(
+        f"<p>🌧️ Rainfall (last {window}): {weather_data[f'rain_{window}']:.1f} mm "
+        f"(peak {weather_data[f'rain_max_{window}']:.1f} mm/h)</p>"
+        for window in RAINFALL_THRESHOLDS_MM if f'rain_{window}' in weather_data
+    )
+
+
+@st.fragment(run_every=WEATHER_REFRESH_SECONDS or None)
+def weather_panel():
+    """Weather and flood risk card for the monitored city"""
+    st.subheader("📍 City Monitoring")
+
+    city_name = st.text_input(
+        "Enter city name",
+        value=state.auth.get('user_city', ''),
+        key="city_input"
+    )
+    risk = current_risk(city_name)
+    shown = state.get('admin_risk_at')
+    if state.auth['is_admin'] and shown is not None and shown != risk['checked_at']:
+        # A new assessment from this fragment's own rerun; rerun the page so the
+        # admin panel targets the city and status shown here
+        st.rerun(scope="app")
+    weather_data = risk['weather_data']
+    if not weather_data:
+        return
+
+    st.success(f"Weather data retrieved for {city_name}")
+
+    st.markdown(f"""
+    <div class="weather-card">
+        <h3>{get_weather_icon(weather_data['icon'])} Current Weather</h3>
+        <p>🌡️ Temperature: {weather_data['temperature']}°C</p>
+        <p>💧 Humidity: {weather_data['humidity']}%</p>
+        <p>⬇️ Pressure: {weather_data['pressure']} hPa</p>
+        <p>💨 Wind Speed: {weather_data['wind_speed']} m/s</p>
+        <p>🌧️ Rainfall (last 1h): {weather_data['rainfall']:.2f} mm</p>
+        {rolling_rainfall_html(weather_data)}
+        <p>🔹 Conditions: {weather_data['weather_desc'].title()}</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    if risk['flood_risk']:
+        st.markdown("<div class='flood-alert'>⚠️ FLOOD RISK DETECTED! Immediate action recommended</div>", unsafe_allow_html=True)
+    else:
+        st.markdown("<div class='safe-alert'>✅ No flood risk detected. Conditions are safe</div>", unsafe_allow_html=True)
+
+    if risk['forecast']:
+        window = risk['forecast']
+        st.warning(f"🕒 Forecast: flood risk expected {format_window(window)} "
+                   f"(up to {window['peak_rain_3h']:.0f} mm of rain per 3h)")
+    elif risk['forecast_available']:
+        st.caption(f"🕒 No flood risk forecast in the next {FORECAST_HOURS} hours")
+
+
+@st.fragment
+def history_panel():
+    """Recent alerts in the sidebar"""
+    st.subheader("🔔 Alert History")
+    if st.button("View History"):
+        history = get_alert_store().latest(5)
+        if history:
+            st.subheader("Recent Alerts")
+            for record in history:
+                city = record.get('city', 'Unknown location')
+                status = record.get('status', 'unknown')
+                alert_type = record.get('type', 'unknown')
+                timestamp = record.get('timestamp', 'unknown time')
+                lang = record.get('language', 'en')
+
+                status_color = {'alert': "🔴", 'forecast': "🟠"}.get(status, "🟢")
+                with st.container():
+                    st.markdown(f"""
+                    <div class="history-item">
+                        <strong>{status_color} {city}</strong><br>
+                        Type: {alert_type}<br>
+                        Status: {status}<br>
+                        Language: {lang}<br>
+                        <small>{timestamp}</small>
+                    </div>
+                    """, unsafe_allow_html=True)
+        else:
+            st.info("No alert history found")
+
+
+def alert_target_caption(city_name, alert_status):
+    """Caption naming the city and status the next send button will alert"""
+    if city_name:
+        st.caption(f"🎯 Target: {city_name} · status: {alert_status}")
+    else:
+        st.caption("🎯 Enter a city to choose what to alert")
+
+
+@st.fragment
+def admin_panel():
+    """Admin alert dashboard; reruns on its own so uploads and sends don't refetch weather"""
+    risk = state.get('risk') or empty_risk('')
+    state.admin_risk_at = risk['checked_at']
+    city_name, weather_data, base_msg = risk['city'], risk['weather_data'], risk['base_msg']
+    flood_risk, alert_status = risk['flood_risk'], risk['alert_status']
+
+    with st.container():
+        st.markdown('<div class="admin-panel">', unsafe_allow_html=True)
+        st.subheader("👑 Admin Alert Dashboard")
+
+        # Display current language selection
+        current_lang = [k for k, v in language_dict.items() if v == state.auth['language']][0]
+        st.info(f"Alerts will be sent in: {current_lang}")
+
+        with st.expander("Model Status"):
+            try:
+                path = model_path()
+                st.json(model_registry.get_registry(path).stats())
+                metadata = model_registry.read_metadata(path)
+                if metadata:
+                    st.caption(f"Version {metadata['version']} · accuracy {metadata['metrics']['accuracy']:.3f}")
+                    st.json({key: metadata[key] for key in ('params', 'metrics', 'content_sha256', 'dataset')})
+            except FileNotFoundError as e:
+                st.error(str(e))
+
+        with st.expander("Weather Cache"):
+            st.json(get_weather_cache().stats())
+
+        with st.expander("Forecast Cache"):
+            st.json(get_forecast_cache().stats())
+
+        with st.expander("Rainfall History"):
+            st.json(get_rainfall_store().stats())
+
+        with st.expander("Translation Cache"):
+            st.json(get_translation_cache().stats())
+
+        with st.expander("Alert Templates"):
+            st.json(get_alert_templates().stats())
+
+        with st.expander("📈 Metrics"):
+            show_metrics()
+
+        # Bulk Email Section
+        st.subheader("Bulk Email Alerts")
+        uploaded_file = st.file_uploader("Upload CSV with recipients (name, email, optional phone and language)", type="csv")
+
+        if uploaded_file is not None:
+            import pandas as pd
+            upload = uploaded_file.getvalue()
+            try:
+                preview_df = pd.read_csv(io.BytesIO(upload), dtype=str, nrows=5)
+                preview_df.columns = preview_df.columns.str.strip().str.lower()
+            except Exception as e:
+                st.error(f"Error reading CSV file: {str(e)}")
+                preview_df = None
+
+            if preview_df is not None and not {'name', 'email'} <= set(preview_df.columns):
+                st.error("CSV file must contain these columns: name, email")
+            elif preview_df is not None:
+                with st.expander("View Recipients"):
+                    st.dataframe(preview_df.rename(columns={'name': 'Name', 'email': 'Email'})[['Name', 'Email']])
+
+                send_bulk_sms_too = 'phone' in preview_df.columns and st.checkbox(
+                    "Also send SMS to the numbers in the phone column",
+                    key="bulk_sms_checkbox"
+                )
+                force_bulk = st.checkbox(
+                    "Resend to recipients already alerted (ignore cooldown)",
+                    key="bulk_force_checkbox"
+                )
+
+                alert_target_caption(city_name, alert_status)
+                if st.button("📧 Send Bulk Emails", type="primary"):
+                    if base_msg is None:
+                        st.warning("Weather data for the city is needed before sending alerts")
+                    else:
+                        payload = {
+                            'city': city_name,
+                            'message': base_msg,
+                            'language': state.auth['language'],
+                            'status': alert_status,
+                            'force': force_bulk
+                        }
+                        upload_digest = hashlib.sha256(upload).hexdigest()
+                        stats = {}
+                        try:
+                            job_id, created = submit_alert_job(
+                                'bulk_email', payload,
+                                (('email', r['email'], r.get('language'))
+                                 for batch in iter_recipient_batches(io.BytesIO(upload), stats=stats)
+                                 for r in batch),
+                                key=alert_queue.idempotency_key('bulk_email', payload, [upload_digest])
+                            )
+                        except Exception as e:
+                            st.error(f"Error reading CSV file: {str(e)}")
+                        else:
+                            total = get_alert_queue().job(job_id)['total']
+                            if created:
+                                st.success(f"Bulk email job #{job_id} queued for {total} recipients")
+                            else:
+                                st.info(f"This bulk email was already queued as job #{job_id}")
+                            if stats.get('invalid'):
+                                st.warning(f"Skipped {stats['invalid']} invalid email addresses")
+                            if stats.get('duplicates'):
+                                st.info(f"Skipped {stats['duplicates']} duplicate email addresses")
+                            if send_bulk_sms_too:
+                                job_id, created = submit_alert_job(
+                                    'bulk_sms', payload,
+                                    (('sms', phone) for phone in iter_csv_phones(io.BytesIO(upload))),
+                                    key=alert_queue.idempotency_key('bulk_sms', payload, [upload_digest])
+                                )
+                                total = get_alert_queue().job(job_id)['total']
+                                if created:
+                                    st.success(f"Bulk SMS job #{job_id} queued for {total} numbers")
+                                else:
+                                    st.info(f"This bulk SMS was already queued as job #{job_id}")
+
+        # Nearby Subscribers Section
+        st.subheader("Nearby Subscribers")
+        radius_km = st.slider("Alert radius (km)", 0, 200, int(ALERT_RADIUS_KM), step=5, key="radius_km")
+        if city_name and st.button("🔍 Find Nearby Subscribers"):
+            # Building the index geocodes every subscribed city, so only on request
+            try:
+                state.nearby = {
+                    'city': city_name,
+                    'radius_km': radius_km,
+                    'emails': subscribers_near(city_name, radius_km),
+                    'index': get_subscriber_index().stats(),
+                }
+            except Exception as e:
+                st.error(f"Error finding nearby subscribers: {str(e)}")
+        lookup = state.get('nearby')
+        if lookup and (lookup['city'], lookup['radius_km']) == (city_name, radius_km):
+            nearby = lookup['emails']
+            st.caption(f"{len(nearby)} subscribers in or within {radius_km} km of {city_name}")
+            if nearby:
+                alert_target_caption(city_name, alert_status)
+            if nearby and st.button("📧 Alert Nearby Subscribers"):
+                if base_msg is None:
+                    st.warning("Weather data for the city is needed before sending alerts")
+                else:
+                    payload = {
+                        'city': city_name,
+                        'message': base_msg,
+                        'language': state.auth['language'],
+                        'status': alert_status,
+                        'force': False
+                    }
+                    job_id, created = submit_alert_job(
+                        'bulk_email', payload, (('email', email) for email in nearby),
+                        key=alert_queue.idempotency_key('bulk_email', payload, nearby)
+                    )
+                    if created:
+                        st.success(f"Bulk email job #{job_id} queued for {len(nearby)} nearby subscribers")
+                    else:
+                        st.info(f"This alert was already queued as job #{job_id}")
+
+        with st.expander("Subscriber Index"):
+            if lookup:
+                st.json(lookup['index'])
+            else:
+                st.caption("Built on the first nearby-subscriber lookup")
+
+        # Individual Alert Section (Admin-only)
+        st.subheader("Individual Alerts")
+        if st.checkbox("Include SMS alert", key="sms_checkbox"):
+            phone_number = st.text_input("Mobile number (with country code)", 
+                                       placeholder="e.g., +919876543210")
+        else:
+            phone_number = None
+
+        email_address = st.text_input("Email address (for alerts)", 
+                                    placeholder="user@example.com")
+        force_alert = st.checkbox("Resend even if already alerted (ignore cooldown)",
+                                  key="alert_force_checkbox")
+
+        alert_target_caption(city_name, alert_status)
+        if st.button("Send Alert", type="primary"):
+            if not city_name:
+                st.warning("Please enter a city name first")
+            elif not phone_number and not email_address:
+                st.warning("Please enter at least one contact method")
+            elif email_address and "@" not in email_address:
+                st.error("Invalid email address format")
+            elif base_msg is None:
+                st.warning("Weather data for the city is needed before sending alerts")
+            else:
+                contacts = []
+                if phone_number:
+                    contacts.append(('sms', phone_number))
+                if email_address:
+                    contacts.append(('email', email_address))
+                job_id, created = submit_alert_job(
+                    'alert',
+                    {
+                        'city': city_name,
+                        'message': base_msg,
+                        'language': state.auth['language'],
+                        'status': alert_status,
+                        'flood_risk': bool(flood_risk),
+                        'weather': weather_data,
+                        'force': force_alert
+                    },
+                    contacts
+                )
+                if created:
+                    st.success(f"Alert job #{job_id} queued")
+                else:
+                    st.info(f"This alert was already queued as job #{job_id}")
+
+        # Dispatch job status
+        st.subheader("📋 Dispatch Jobs")
+        st.button("Refresh job status")
+        show_dispatch_jobs()
+
+        st.markdown('</div>', unsafe_allow_html=True)
+
+
 def main():
     st.set_page_config(page_title="Smart Flood Alert", page_icon="🌊", layout="wide")
 
@@ -384,9 +1232,18 @@ def main():
     </style>
     """, unsafe_allow_html=True)
 
-    # Initialize session state with proper city handling
-    if 'users' not in state:
-        state.users = load_users()
+    if PREWARM_TRANSLATIONS:
+        translation.prewarm_in_background(
+            STANDARD_ALERT_TEXTS, list(language_dict.values()), get_translation_cache()
+        )
+
+    # Resume any queued alert jobs in this server process
+    start_dispatch_workers()
+    if METRICS_PORT:
+        metrics.start_http_server(METRICS_PORT)
+
+    # Initialize session state
+    users = get_user_store()
 
     if 'auth' not in state:
         state.auth = {
@@ -417,7 +1274,7 @@ def main():
                     login_submitted = st.form_submit_button("Sign In")
                     
                     if login_submitted:
-                        user = state.users.get(login_email.strip().lower())
+                        user = users.get(login_email)
                         if user and user['password'] == hash_password(login_password) and not user.get('is_admin', False):
                             # Safely get city with default value
                             user_city = user.get('city', 'Unknown City')
@@ -453,17 +1310,15 @@ def main():
                             st.error("Password must be at least 6 characters")
                         elif reg_password != reg_confirm:
                             st.error("Passwords do not match")
-                        elif reg_email.lower() in state.users:
+                        elif not users.add(reg_email, {
+                            'city': reg_city,
+                            'password': hash_password(reg_password),
+                            'alerts': True,
+                            'is_admin': False
+                        }):
                             st.error("Email already registered")
                         else:
-                            state.users[reg_email.lower()] = {
-                                'city': reg_city,
-                                'password': hash_password(reg_password),
-                                'alerts': True,
-                                'is_admin': False
-                            }
-                            save_users(state.users)
-                            
+                            geo_index.invalidate()
                             if send_welcome_email(reg_email, reg_city):
                                 st.success("Account created successfully! Please sign in.")
                             else:
@@ -476,7 +1331,7 @@ def main():
                     admin_submitted = st.form_submit_button("Admin Login")
                     
                     if admin_submitted:
-                        user = state.users.get(admin_email.strip().lower())
+                        user = users.get(admin_email)
                         if user and user['password'] == hash_password(admin_password) and user.get('is_admin', False):
                             state.auth = {
                                 'authenticated': True,
@@ -506,7 +1361,7 @@ def main():
                 
                 # Show translation preview
                 if st.checkbox("Preview translation", key="preview_translation"):
-                    test_text = "Flood alert! Heavy rainfall detected. Please move to safer location."
+                    test_text = TRANSLATION_PREVIEW_TEXT
                     translated = translate_message(test_text, state.auth['language'])
                     st.info(f"Translation preview ({selected_language}):")
                     st.write(f"Original: {test_text}")
@@ -519,7 +1374,7 @@ def main():
                 st.rerun()
             
             with st.expander("Account Settings"):
-                user_data = state.users[state.auth['user_email']]
+                user_data = users.get(state.auth['user_email']) or {}
                 st.write(f"**Registered City:** {user_data.get('city', 'Unknown City')}")
                 
                 if not state.auth['is_admin']:
@@ -529,8 +1384,8 @@ def main():
                         key="alert_toggle"
                     )
                     if receive_alerts != user_data.get('alerts', True):
-                        user_data['alerts'] = receive_alerts
-                        save_users(state.users)
+                        users.update(state.auth['user_email'], alerts=receive_alerts)
+                        geo_index.invalidate()
                         st.toast("Notification preferences updated!")
             
             if not state.auth['is_admin']:
@@ -542,7 +1397,7 @@ def main():
                         change_submitted = st.form_submit_button("Update Password")
                         
                         if change_submitted:
-                            user = state.users[state.auth['user_email']]
+                            user = users.get(state.auth['user_email'])
                             if user['password'] != hash_password(old_pass):
                                 st.error("Incorrect current password")
                             elif new_pass != confirm_pass:
@@ -550,215 +1405,21 @@ def main():
                             elif len(new_pass) < 6:
                                 st.error("Password must be at least 6 characters")
                             else:
-                                user['password'] = hash_password(new_pass)
-                                save_users(state.users)
+                                users.update(state.auth['user_email'], password=hash_password(new_pass))
                                 st.success("Password updated successfully!")
         
-            st.subheader("🔔 Alert History")
-            if st.button("View History"):
-                if os.path.exists(STATUS_FILE):
-                    with open(STATUS_FILE) as f:
-                        try:
-                            history = json.load(f)
-                            st.subheader("Recent Alerts")
-                            for record in history[-5:][::-1]:
-                                city = record.get('city', 'Unknown location')
-                                status = record.get('status', 'unknown')
-                                alert_type = record.get('type', 'unknown')
-                                timestamp = record.get('timestamp', 'unknown time')
-                                lang = record.get('language', 'en')
-                                
-                                status_color = "🔴" if status == 'alert' else "🟢"
-                                with st.container():
-                                    st.markdown(f"""
-                                    <div class="history-item">
-                                        <strong>{status_color} {city}</strong><br>
-                                        Type: {alert_type}<br>
-                                        Status: {status}<br>
-                                        Language: {lang}<br>
-                                        <small>{timestamp}</small>
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                        except json.JSONDecodeError:
-                            st.error("Error reading history file")
-                else:
-                    st.info("No alert history found")
-
-    # Load ML Model
-    model = load_model()
+            history_panel()
 
     # Main Content
+    state.admin_risk_at = None  # the admin panel renders after the weather panel in this run
     col1, col2 = st.columns(2)
-
     with col1:
-        st.subheader("📍 City Monitoring")
-        
-        city_name = st.text_input(
-            "Enter city name", 
-            value=state.auth.get('user_city', ''),
-            key="city_input"
-        )
-        
-        if city_name:
-            weather_data = get_weather_data_by_name(city_name)
-            
-            if weather_data:
-                st.success(f"Weather data retrieved for {city_name}")
-                
-                st.markdown(f"""
-                <div class="weather-card">
-                    <h3>{get_weather_icon(weather_data['icon'])} Current Weather</h3>
-                    <p>🌡️ Temperature: {weather_data['temperature']}°C</p>
-                    <p>💧 Humidity: {weather_data['humidity']}%</p>
-                    <p>⬇️ Pressure: {weather_data['pressure']} hPa</p>
-                    <p>💨 Wind Speed: {weather_data['wind_speed']} m/s</p>
-                    <p>🌧️ Rainfall (last 1h): {weather_data['rainfall']:.2f} mm</p>
-                    <p>🔹 Conditions: {weather_data['weather_desc'].title()}</p>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                ml_prediction = predict_flood(weather_data, model)
-                rain_prediction = check_flood_risk_by_rain(weather_data['rainfall'])
-                flood_risk = ml_prediction or rain_prediction
-                
-                if flood_risk:
-                    st.markdown("<div class='flood-alert'>⚠️ FLOOD RISK DETECTED! Immediate action recommended</div>", unsafe_allow_html=True)
-                    alert_status = 'alert'
-                    base_msg = f"URGENT: Flood alert for {city_name}. Heavy rainfall ({weather_data['rainfall']:.1f}mm) detected. Move to safer location immediately. Avoid river areas."
-                else:
-                    st.markdown("<div class='safe-alert'>✅ No flood risk detected. Conditions are safe</div>", unsafe_allow_html=True)
-                    alert_status = 'safe'
-                    base_msg = f"Weather update for {city_name}: No flood risk currently. Rainfall: {weather_data['rainfall']:.1f}mm. Stay vigilant."
+        weather_panel()
 
     with col2:
         if state.auth['authenticated']:
             if state.auth['is_admin']:
-                # ADMIN ALERT PANEL
-                with st.container():
-                    st.markdown('<div class="admin-panel">', unsafe_allow_html=True)
-                    st.subheader("👑 Admin Alert Dashboard")
-                    
-                    # Display current language selection
-                    current_lang = [k for k, v in language_dict.items() if v == state.auth['language']][0]
-                    st.info(f"Alerts will be sent in: {current_lang}")
-                    
-                    # Bulk Email Section
-                    st.subheader("Bulk Email Alerts")
-                    uploaded_file = st.file_uploader("Upload CSV with recipients (name, email)", type="csv")
-                    
-                    if uploaded_file is not None:
-                        recipients = read_recipients_from_csv(uploaded_file)
-                        if recipients:
-                            st.success(f"Loaded {len(recipients)} recipients")
-                            
-                            with st.expander("View Recipients"):
-                                preview_df = pd.DataFrame({
-                                    'Name': [r['name'] for r in recipients[:5]],
-                                    'Email': [r['email'] for r in recipients[:5]]
-                                })
-                                st.dataframe(preview_df)
-                            
-                            if st.button("📧 Send Bulk Emails", type="primary"):
-                                with st.spinner(f"Sending emails to {len(recipients)} recipients..."):
-                                    # Translate the message to selected language
-                                    alert_msg = translate_message(base_msg, state.auth['language'])
-                                    email_success, email_failures = send_bulk_emails(
-                                        recipients,
-                                        city_name,
-                                        alert_msg
-                                    )
-                                    
-                                    st.success(f"""
-                                    Bulk emails sent:
-                                    - Successful: {email_success}
-                                    - Failed: {email_failures}
-                                    """)
-                                    
-                                    if email_success > 0:
-                                        save_status(
-                                            alert_status,
-                                            city_name,
-                                            f"BulkEmail({email_success})",
-                                            state.auth['language']
-                                        )
-                    
-                    # Individual Alert Section (Admin-only)
-                    st.subheader("Individual Alerts")
-                    if st.checkbox("Include SMS alert", key="sms_checkbox"):
-                        phone_number = st.text_input("Mobile number (with country code)", 
-                                                   placeholder="e.g., +919876543210")
-                    else:
-                        phone_number = None
-                        
-                    email_address = st.text_input("Email address (for alerts)", 
-                                                placeholder="user@example.com")
-                    
-                    if st.button("Send Alert", type="primary"):
-                        if not city_name:
-                            st.warning("Please enter a city name first")
-                        elif not phone_number and not email_address:
-                            st.warning("Please enter at least one contact method")
-                        else:
-                            with st.spinner("Sending alerts..."):
-                                sms_success = not bool(phone_number)
-                                email_success = not bool(email_address)
-                                
-                                # Translate the message to selected language
-                                translated_msg = translate_message(base_msg, state.auth['language'])
-                                
-                                if phone_number:
-                                    sms_success = send_sms(phone_number, translated_msg)
-                                
-                                if email_address and "@" in email_address:
-                                    if flood_risk:
-                                        email_success = send_alert_email(
-                                            email_address, 
-                                            city_name, 
-                                            translated_msg
-                                        )
-                                    else:
-                                        email_body = f"""
-Dear Resident,
-
-{translated_msg}
-
-Current Weather Conditions:
-- Temperature: {weather_data['temperature']}°C
-- Humidity: {weather_data['humidity']}%
-- Rainfall: {weather_data['rainfall']:.1f}mm
-- Conditions: {weather_data['weather_desc']}
-
-Stay safe,
-Flood Alert System
-"""
-                                        email_success = send_alert_email(
-                                            email_address,
-                                            city_name,
-                                            email_body
-                                        )
-                                elif email_address:
-                                    email_success = False
-                                    st.error("Invalid email address format")
-                                
-                                if sms_success or email_success:
-                                    alert_type = []
-                                    if sms_success and phone_number:
-                                        alert_type.append("SMS")
-                                    if email_success and email_address:
-                                        alert_type.append("Email")
-                                    
-                                    save_status(
-                                        alert_status,
-                                        city_name,
-                                        '+'.join(alert_type) if alert_type else 'None',
-                                        state.auth['language']
-                                    )
-                                    
-                                    st.success("Alerts sent successfully!")
-                                else:
-                                    st.error("Failed to send all alerts")
-                    
-                    st.markdown('</div>', unsafe_allow_html=True)
+                admin_panel()
             else:
                 # Regular user view - monitoring only
                 st.subheader("Flood Monitoring")
@@ -0,0 +1,168 @@
+"""Look-ahead flood scoring from the OpenWeatherMap 5 day / 3 hour forecast.
+
+OWM issues a new forecast every three hours, so a fetched forecast is cached
+until the next issuance is published (``next_issue``) rather than for a fixed
+TTL. ``feature_frame`` turns the forecasts of any number of cities into one
+DataFrame with a row per future step, carrying the model features and the
+same rolling rain totals as rainfall_store (``rain_3h``, ``rain_max_24h``,
+...), so every step of every city is scored in one model call.
+``earliest_windows`` then finds each city's first run of at-risk steps.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from rainfall_store import window_seconds
+
+STEP = 3 * 3600  # seconds between forecast steps
+ISSUE_PERIOD = 3 * 3600
+ISSUE_DELAY = 15 * 60  # how long after the hour a new issuance is available
+
+
+def next_issue(now, period=ISSUE_PERIOD, delay=ISSUE_DELAY):
+    """When the forecast after the one available at ``now`` is published"""
+    return (math.floor((now - delay) / period) + 1) * period + delay
+
+
+class ForecastCache:
+    """LRU cache of forecast step lists keyed by city, each valid until the next issuance.
+
+    An unknown city (a fetch result of None) is cached the same way.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(city):
+        return city.strip().lower()
+
+    def _lookup(self, key, now):
+        """(found, steps) for a cached forecast still current at ``now`` (lock held)"""
+        entry = self._entries.get(key)
+        if entry is None or now >= entry[1]:
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[0]
+
+    def put(self, city, steps, now=None):
+        key = self.key(city)
+        now = now if now is not None else time.time()
+        with self._lock:
+            self._entries[key] = (steps, next_issue(now))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, city, fetch):
+        """Return the forecast for ``city``, calling ``fetch(city)`` on a miss"""
+        with self._lock:
+            found, steps = self._lookup(self.key(city), time.time())
+        if found:
+            return steps
+        steps = fetch(city)
+        self.put(city, steps)
+        return steps
+
+    def get_many(self, cities, fetch_many):
+        """Return ``({city: steps}, errors)``, fetching all misses with one ``fetch_many(cities)``"""
+        results, missing = {}, []
+        now = time.time()
+        with self._lock:
+            for city in dict.fromkeys(cities):
+                found, steps = self._lookup(self.key(city), now)
+                if found:
+                    results[city] = steps
+                else:
+                    missing.append(city)
+        errors = {}
+        if missing:
+            fetched, errors = fetch_many(missing)
+            for city, steps in fetched.items():
+                self.put(city, steps)
+                results[city] = steps
+        return results, errors
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'next_issue': next_issue(time.time()),
+            }
+
+
+def feature_frame(forecasts, windows, hours=None, now=None):
+    """One row per upcoming forecast step of every city in ``{city: steps}``.
+
+    Rolling totals are computed over each city's whole forecast and then
+    limited to steps ending after ``now`` and, if ``hours`` is set, no more
+    than that many hours ahead. Returns None when there is nothing to score.
+    """
+    import pandas as pd
+    rows = [dict(step, city=city) for city, steps in forecasts.items() if steps for step in steps]
+    if not rows:
+        return None
+    frame = pd.DataFrame(rows).sort_values(['city', 'time'], kind='stable').reset_index(drop=True)
+    by_city = frame.groupby('city', sort=False)
+    for label in windows:
+        span = max(1, round(window_seconds(label) / STEP))
+        frame[f'rain_{label}'] = by_city['step_rain'].rolling(span, min_periods=1).sum().to_numpy()
+        frame[f'rain_max_{label}'] = by_city['rainfall'].rolling(span, min_periods=1).max().to_numpy()
+    now = now if now is not None else time.time()
+    upcoming = frame['time'] > now
+    if hours:
+        upcoming &= frame['time'] <= now + hours * 3600
+    frame = frame[upcoming].reset_index(drop=True)
+    return frame if len(frame) else None
+
+
+def earliest_windows(scores):
+    """First run of consecutive at-risk steps per city.
+
+    ``scores`` has one row per step with 'city', 'time', 'flood_risk' and
+    'flood_probability'. Returns ``{city: window}`` with None for cities
+    never at risk; a window's ``start`` is the beginning of its first 3h
+    step and ``end`` the end of its last.
+    """
+    windows = {city: None for city in scores['city'].unique()}
+    for city, steps in scores.groupby('city', sort=False):
+        at_risk = steps['flood_risk'].to_numpy()
+        if not at_risk.any():
+            continue
+        first = int(at_risk.argmax())
+        run = at_risk[first:]
+        length = int(run.argmin()) if not run.all() else len(run)
+        window = steps.iloc[first:first + length]
+        windows[city] = {
+            'start': int(window['time'].iloc[0]) - STEP,
+            'end': int(window['time'].iloc[-1]),
+            'steps': length,
+            'peak_probability': float(window['flood_probability'].max()),
+            'peak_rain_3h': float(window['step_rain'].max()) if 'step_rain' in window else None,
+        }
+    return windows
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache(max_entries=256):
+    """Return the process-wide forecast cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ForecastCache(max_entries)
+        return _cache
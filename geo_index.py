@@ -0,0 +1,160 @@
+"""Radius search over subscribers, for fanning a city's alert out to nearby towns.
+
+Subscribers are grouped by the city they registered with, each city is
+geocoded once (see city_index), and the cities are bucketed into a grid of
+lat/lon cells about ``cell_km`` across. A radius query only visits the cells
+overlapping the circle's bounding box and checks great-circle distance for
+the cities in them, so its cost depends on how many cities are nearby, not
+on how many are registered.
+"""
+import math
+import threading
+import time
+from collections import defaultdict
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    """Points bucketed into lat/lon cells for radius queries"""
+
+    def __init__(self, cell_km=50):
+        # Shrink cells slightly so a whole number of them spans 360 degrees of
+        # longitude, otherwise the last column is narrower and wrapping misses cells
+        self.lon_cells = math.ceil(360 / (cell_km / KM_PER_DEGREE))
+        self.cell_deg = 360 / self.lon_cells
+        self._cells = defaultdict(list)
+        self.size = 0
+
+    def _cell(self, lat, lon):
+        return (math.floor((lat + 90) / self.cell_deg),
+                math.floor((lon + 180) / self.cell_deg) % self.lon_cells)
+
+    def add(self, lat, lon, item):
+        self._cells[self._cell(lat, lon)].append((lat, lon, item))
+        self.size += 1
+
+    def within(self, lat, lon, radius_km):
+        """``[(distance_km, item)]`` for every point within ``radius_km``, nearest first"""
+        dlat = radius_km / KM_PER_DEGREE
+        # Cells must span the circle's widest longitude range, at its poleward edge
+        edge = math.radians(min(90.0, abs(lat) + dlat))
+        dlon = 180.0 if math.cos(edge) < 1e-9 else min(180.0, dlat / math.cos(edge))
+        lat_low = math.floor((max(-90.0, lat - dlat) + 90) / self.cell_deg)
+        lat_high = math.floor((min(90.0, lat + dlat) + 90) / self.cell_deg)
+        lon_low = math.floor((lon - dlon + 180) / self.cell_deg)
+        lon_high = math.floor((lon + dlon + 180) / self.cell_deg)
+        # Wraps across the antimeridian
+        lon_range = {j % self.lon_cells for j in range(lon_low, min(lon_high, lon_low + self.lon_cells - 1) + 1)}
+        found = []
+        for i in range(lat_low, lat_high + 1):
+            for j in lon_range:
+                for point_lat, point_lon, item in self._cells.get((i, j), ()):
+                    distance = haversine_km(lat, lon, point_lat, point_lon)
+                    if distance <= radius_km:
+                        found.append((distance, item))
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+
+class SubscriberIndex:
+    """Subscribed emails grouped by city, with the located cities in a GridIndex.
+
+    ``groups`` maps city keys to ``(display name, [emails])`` and
+    ``coordinates`` maps display names to ``(lat, lon)`` (or None).
+    """
+
+    def __init__(self, groups, coordinates, cell_km=50):
+        self.groups = groups
+        self.grid = GridIndex(cell_km)
+        self.unlocated = []
+        for key, (name, _) in groups.items():
+            point = coordinates.get(name)
+            if point:
+                self.grid.add(point[0], point[1], key)
+            else:
+                self.unlocated.append(name)
+
+    def emails(self, city):
+        return list(self.groups.get((city or '').strip().lower(), (None, []))[1])
+
+    def near(self, lat, lon, radius_km):
+        """``[(distance_km, city, emails)]`` for subscribed cities within the radius, nearest first"""
+        return [(distance, *self.groups[key]) for distance, key in self.grid.within(lat, lon, radius_km)]
+
+    def recipients_near(self, city, point, radius_km):
+        """Emails subscribed to ``city`` or to any city within ``radius_km`` of ``point``, nearest first"""
+        recipients = dict.fromkeys(self.emails(city))
+        if point and radius_km:
+            for _, _, emails in self.near(point[0], point[1], radius_km):
+                recipients.update(dict.fromkeys(emails))
+        return list(recipients)
+
+    def stats(self):
+        return {
+            'cities': len(self.groups),
+            'located': self.grid.size,
+            'unlocated': len(self.unlocated),
+            'subscribers': sum(len(emails) for _, emails in self.groups.values()),
+        }
+
+
+_index = None
+_built_at = 0.0
+_building = False
+_generation = 0  # bumped by invalidate() so a build that raced a change is not kept fresh
+_index_changed = threading.Condition()
+
+
+def get_index(build, ttl=300):
+    """Process-wide subscriber index, rebuilt with ``build()`` once it is ``ttl`` seconds old.
+
+    ``build()`` runs outside the lock and only one caller runs it at a
+    time; meanwhile other callers get the previous index, and wait only
+    when there is none yet.
+    """
+    global _index, _built_at, _building
+    with _index_changed:
+        while True:
+            if _index is not None and time.time() - _built_at < ttl:
+                return _index
+            if not _building:
+                break
+            if _index is not None:
+                return _index
+            _index_changed.wait()
+        _building = True
+        generation = _generation
+
+    try:
+        index = build()
+    except BaseException:
+        with _index_changed:
+            _building = False
+            _index_changed.notify_all()
+        raise
+
+    with _index_changed:
+        _index = index
+        # Invalidated mid-build: serve it, but rebuild on the next call
+        _built_at = time.time() if generation == _generation else 0.0
+        _building = False
+        _index_changed.notify_all()
+    return index
+
+
+def invalidate():
+    """Rebuild the index on next use (after a registration or subscription change)"""
+    global _built_at, _generation
+    with _index_changed:
+        _built_at = 0.0
+        _generation += 1
@@ -0,0 +1,130 @@
+"""Measure the cold-start import cost of the app module.
+
+Each run imports the module in a fresh interpreter with ``-X importtime``,
+so nothing is shared between runs. The result records the wall time, the
+module's cumulative import time, the heaviest top-level imports and which
+heavy optional dependencies were loaded eagerly:
+
+    python import_benchmark.py --runs 7 --output benchmarks/import_time.json
+    python import_benchmark.py --baseline benchmarks/import_time.json
+
+With ``--baseline`` the exit status is 1 when the median import time grew by
+more than ``--max-regression`` (a fraction) or a heavy dependency that the
+baseline loaded lazily is now imported at startup.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ("twilio", "deep_translator", "pandas", "numpy", "sklearn")
+
+
+def parse_importtime(stderr):
+    """Map module name to (self_us, cumulative_us, depth) from -X importtime output"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.setdefault(name.strip(), (int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def measure(module, cwd):
+    """Import ``module`` once in a fresh interpreter; returns a run record"""
+    probe = (
+        f"import {module}, sys, json; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=cwd, capture_output=True, text=True, check=True
+    )
+    wall = time.perf_counter() - started
+    modules = parse_importtime(proc.stderr)
+    top_level = {name: cumulative for name, (_, cumulative, depth) in modules.items() if depth == 1}
+    return {
+        'wall_seconds': wall,
+        'import_us': modules[module][1],
+        'top_level_us': top_level,
+        'loaded': json.loads(proc.stdout.strip().splitlines()[-1]),
+    }
+
+
+def run(module, runs, cwd, top=10):
+    """Benchmark ``runs`` cold imports and summarize them"""
+    records = [measure(module, cwd) for _ in range(runs)]
+    top_level = {}
+    for record in records:
+        for name, cumulative in record['top_level_us'].items():
+            top_level.setdefault(name, []).append(cumulative)
+    heaviest = sorted(
+        ((name, statistics.median(values)) for name, values in top_level.items()),
+        key=lambda item: item[1], reverse=True
+    )[:top]
+    return {
+        'module': module,
+        'python': platform.python_version(),
+        'runs': runs,
+        'measured_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'wall_seconds_median': statistics.median(r['wall_seconds'] for r in records),
+        'wall_seconds_min': min(r['wall_seconds'] for r in records),
+        'import_ms_median': statistics.median(r['import_us'] for r in records) / 1000,
+        'import_ms_min': min(r['import_us'] for r in records) / 1000,
+        'heaviest_imports_ms': {name: value / 1000 for name, value in heaviest},
+        'eager_heavy_modules': records[-1]['loaded'],
+    }
+
+
+def regressions(result, baseline, max_regression):
+    """Reasons the result is worse than the baseline (empty if it is not)"""
+    problems = []
+    limit = baseline['import_ms_median'] * (1 + max_regression)
+    if result['import_ms_median'] > limit:
+        problems.append(
+            f"median import time {result['import_ms_median']:.1f} ms exceeds "
+            f"{limit:.1f} ms (baseline {baseline['import_ms_median']:.1f} ms + {max_regression:.0%})"
+        )
+    newly_eager = sorted(set(result['eager_heavy_modules']) - set(baseline['eager_heavy_modules']))
+    if newly_eager:
+        problems.append(f"now imported at startup: {', '.join(newly_eager)}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the app's cold-start import time")
+    parser.add_argument("--module", default="fll", help="module to import")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to measure")
+    parser.add_argument("--output", help="write the JSON result to this file")
+    parser.add_argument("--baseline", help="JSON result to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="allowed growth of the median import time over the baseline")
+    args = parser.parse_args()
+
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    result = run(args.module, args.runs, cwd)
+    print(json.dumps(result, indent=2))
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = regressions(result, json.load(f), args.max_regression)
+        for problem in problems:
+            print(f"REGRESSION: {problem}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
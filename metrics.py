@@ -0,0 +1,205 @@
+"""In-process latency histograms, call counts and error counts for the hot path.
+
+Functions are wrapped with ``@timed(name)`` (or blocks with ``timer(name)``);
+failures that the app swallows to show an ``st.error`` are recorded with
+``record_error``. Like the other shared modules this state lives in
+sys.modules, so it accumulates across Streamlit reruns and sessions. The
+registry can be exported as Prometheus text or JSON, and served over HTTP
+with ``start_http_server`` for scraping:
+
+    METRICS_PORT=9108 streamlit run fll.py
+    curl localhost:9108/metrics
+"""
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds, from a cached lookup to a slow SMTP login
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with call and error counts"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.last_error = None
+
+    def observe(self, seconds):
+        index = next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside its bucket"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'error_rate': self.errors / self.count if self.count else 0.0,
+            'mean_ms': self.sum / self.count * 1000 if self.count else None,
+            'p50_ms': _ms(self.quantile(0.5)),
+            'p95_ms': _ms(self.quantile(0.95)),
+            'p99_ms': _ms(self.quantile(0.99)),
+            'max_ms': self.max * 1000,
+            'last_error': self.last_error,
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+class Registry:
+    """Named histograms guarded by one lock"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self.started_at = time.time()
+
+    def _get(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = Histogram()
+        return histogram
+
+    def observe(self, name, seconds, error=None):
+        """Record one call of ``name`` that took ``seconds`` (and failed if ``error``)"""
+        with self._lock:
+            histogram = self._get(name)
+            histogram.observe(seconds)
+            if error is not None:
+                histogram.errors += 1
+                histogram.last_error = f"{type(error).__name__}: {error}"[:200]
+
+    def record_error(self, name, error):
+        """Count a failure that was handled inside an already-timed call"""
+        with self._lock:
+            histogram = self._get(name)
+            histogram.errors += 1
+            histogram.last_error = f"{type(error).__name__}: {error}"[:200]
+
+    def snapshot(self):
+        """Per-name summaries (counts, error rate, latency quantiles)"""
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in sorted(self._histograms.items())}
+
+    def to_json(self):
+        return json.dumps({'started_at': self.started_at, 'metrics': self.snapshot()}, indent=2)
+
+    def to_prometheus(self, prefix="flood_alert"):
+        """Prometheus text exposition format"""
+        lines = [
+            f"# HELP {prefix}_call_duration_seconds Latency of instrumented calls",
+            f"# TYPE {prefix}_call_duration_seconds histogram",
+        ]
+        with self._lock:
+            items = sorted(self._histograms.items())
+            for name, histogram in items:
+                cumulative = 0
+                for bound, n in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float('inf') else repr(bound)
+                    lines.append(f'{prefix}_call_duration_seconds_bucket{{name="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'{prefix}_call_duration_seconds_sum{{name="{name}"}} {histogram.sum}')
+                lines.append(f'{prefix}_call_duration_seconds_count{{name="{name}"}} {histogram.count}')
+            lines.append(f"# HELP {prefix}_call_errors_total Failed instrumented calls")
+            lines.append(f"# TYPE {prefix}_call_errors_total counter")
+            for name, histogram in items:
+                lines.append(f'{prefix}_call_errors_total{{name="{name}"}} {histogram.errors}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self.started_at = time.time()
+
+
+registry = Registry()
+
+
+@contextmanager
+def timer(name):
+    """Time a block; an exception escaping it is recorded as an error and re-raised"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        registry.observe(name, time.perf_counter() - start, e)
+        raise
+    registry.observe(name, time.perf_counter() - start)
+
+
+def timed(name=None):
+    """Decorator form of ``timer``; the metric defaults to the function's name"""
+    def decorate(fn):
+        metric = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(metric):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_error(name, error):
+    registry.record_error(name, error)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] == '/metrics':
+            body, content_type = registry.to_prometheus(), "text/plain; version=0.0.4"
+        elif self.path.split('?')[0] == '/metrics.json':
+            body, content_type = registry.to_json(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """Serve /metrics and /metrics.json on a daemon thread, once per process"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _server
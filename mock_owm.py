@@ -0,0 +1,188 @@
+"""Local stand-in for the OpenWeatherMap API, for offline runs and benchmarks.
+
+Serves deterministic weather for any city name from /data/2.5/weather,
+/data/2.5/group and /data/2.5/forecast, and geocodes
+them from /geo/1.0/direct. Names starting with "Nowhere" are
+unknown (HTTP 404). Run it and point the app at it:
+
+    python mock_owm.py --port 8085 --latency 0.05
+    OWM_BASE_URL=http://localhost:8085 streamlit run fll.py
+
+or start it in-process with ``start()``.
+"""
+import argparse
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def city_id(name):
+    return zlib.crc32(name.strip().lower().encode("utf-8")) % 10_000_000
+
+
+def city_payload(name, overrides=None):
+    """A current-weather payload shaped like OWM's, derived from the city name"""
+    seed = city_id(name)
+    lat = round(-60 + (seed % 12000) / 100, 4)
+    lon = round(-180 + (seed // 12000 % 36000) / 100, 4)
+    payload = {
+        'id': seed,
+        'dt': int(time.time()),
+        'name': name.strip().title(),
+        'coord': {'lat': lat, 'lon': lon},
+        'sys': {'country': 'IN'},
+        'main': {
+            'temp': 20 + seed % 15,
+            'humidity': 40 + seed % 60,
+            'pressure': 990 + seed % 30,
+        },
+        'wind': {'speed': seed % 12},
+        'rain': {'1h': round((seed % 700) / 10, 1)} if seed % 3 == 0 else None,
+        'weather': [{'description': 'moderate rain' if seed % 3 == 0 else 'clear sky',
+                     'icon': '10d' if seed % 3 == 0 else '01d'}],
+    }
+    payload.update((overrides or {}).get(name.strip().lower(), {}))
+    return payload
+
+
+FORECAST_STEP = 3 * 3600
+FORECAST_STEPS = 40
+
+
+def forecast_payload(name, overrides=None, now=None):
+    """A 5 day / 3 hour forecast payload shaped like OWM's.
+
+    An override's ``forecast_rain`` list replaces the rain of the first steps
+    (mm per 3h), e.g. ``{'pune': {'forecast_rain': [0, 0, 90]}}``.
+    """
+    current = city_payload(name, overrides)
+    seed = current['id']
+    first = (int(now if now is not None else time.time()) // FORECAST_STEP + 1) * FORECAST_STEP
+    rain = list((overrides or {}).get(name.strip().lower(), {}).get('forecast_rain', []))
+    items = []
+    for i in range(FORECAST_STEPS):
+        rain_3h = rain[i] if i < len(rain) else (round((seed + 37 * i) % 90 / 10, 1) if seed % 3 == 0 else 0)
+        items.append({
+            'dt': first + i * FORECAST_STEP,
+            'main': {
+                'temp': current['main']['temp'] + (i % 8) - 4,
+                'humidity': current['main']['humidity'],
+                'pressure': current['main']['pressure'],
+            },
+            'wind': dict(current['wind']),
+            'rain': {'3h': rain_3h} if rain_3h else None,
+            'weather': [{'description': 'moderate rain' if rain_3h else 'clear sky',
+                         'icon': '10d' if rain_3h else '01d'}],
+        })
+    return {
+        'cod': '200',
+        'cnt': len(items),
+        'list': items,
+        'city': {'id': seed, 'name': current['name'], 'coord': current['coord'], 'country': 'IN'},
+    }
+
+
+class MockOWMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, Nagle's algorithm
+    # and delayed ACKs add ~40 ms to every keep-alive response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        if server.latency:
+            time.sleep(server.latency)
+
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        handler = {
+            '/data/2.5/weather': self._weather,
+            '/data/2.5/group': self._group,
+            '/data/2.5/forecast': self._forecast,
+            '/geo/1.0/direct': self._geocode,
+        }.get(url.path)
+        if handler is None:
+            return self._send(404, {'cod': '404', 'message': 'Not found'})
+        return handler(query)
+
+    def _weather(self, query):
+        if 'id' in query:
+            name = self.server.names_by_id.get(int(query['id']))
+        else:
+            name = query.get('q', '')
+        if not name or name.lower().startswith('nowhere'):
+            return self._send(404, {'cod': '404', 'message': 'city not found'})
+        self.server.names_by_id[city_id(name)] = name
+        self._send(200, city_payload(name, self.server.overrides))
+
+    def _group(self, query):
+        ids = [int(value) for value in query.get('id', '').split(',') if value]
+        if len(ids) > 20:
+            return self._send(400, {'cod': '400', 'message': 'Too many IDs'})
+        items = [city_payload(self.server.names_by_id[i], self.server.overrides)
+                 for i in ids if i in self.server.names_by_id]
+        self._send(200, {'cnt': len(items), 'list': items})
+
+    def _forecast(self, query):
+        name = query.get('q', '')
+        if not name or name.lower().startswith('nowhere'):
+            return self._send(404, {'cod': '404', 'message': 'city not found'})
+        self._send(200, forecast_payload(name, self.server.overrides))
+
+    def _geocode(self, query):
+        name = query.get('q', '')
+        if not name or name.lower().startswith('nowhere'):
+            return self._send(200, [])
+        payload = city_payload(name, self.server.overrides)
+        self._send(200, [{'name': payload['name'], 'country': payload['sys']['country'],
+                          'lat': payload['coord']['lat'], 'lon': payload['coord']['lon']}])
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start(port=0, latency=0.0, overrides=None):
+    """Start the mock server on a background thread; returns (server, base_url).
+
+    ``overrides`` maps lower-case city names to payload fields to replace,
+    e.g. ``{'pune': {'rain': {'1h': 80}}}``. Call ``server.shutdown()`` to stop.
+    """
+    server = ThreadingHTTPServer(("localhost", port), MockOWMHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.overrides = overrides or {}
+    server.names_by_id = {}
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://localhost:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local mock of the OpenWeatherMap API")
+    parser.add_argument("--port", type=int, default=8085)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    args = parser.parse_args()
+
+    server, base_url = start(args.port, args.latency)
+    print(f"Mock OpenWeatherMap listening on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
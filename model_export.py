@@ -0,0 +1,250 @@
+"""Compact, pickle-free inference format for the RandomForest flood model.
+
+``export`` flattens every tree of a fitted sklearn forest into shared NumPy
+arrays (split feature, threshold, left/right child and per-node class
+probabilities) and writes them as .npy files plus a ``meta.json`` describing
+the model. ``load`` memory-maps those arrays into a ``CompactForest``, which
+walks all trees for all rows at once with NumPy and needs neither sklearn
+nor pickle at serving time:
+
+    python model_export.py flood_model.pkl flood_model --verify-samples 20000
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+FORMAT_VERSION = 1
+ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+META_FILE = "meta.json"  # kept in sync with model_registry.META_FILE
+
+
+class CompactForest:
+    """Vectorized predict/predict_proba over flattened tree arrays.
+
+    Mirrors the parts of the sklearn classifier API the app uses:
+    ``classes_``, ``feature_names_in_``, ``n_features_in_``, ``predict`` and
+    ``predict_proba``.
+    """
+
+    def __init__(self, arrays, meta):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.max_depth = meta['max_depth']
+        self.classes_ = np.asarray(meta['classes'])
+        self.feature_names_in_ = np.asarray(meta['feature_names'], dtype=object)
+        self.n_features_in_ = len(meta['feature_names'])
+        self.meta = meta
+
+    def _features(self, X):
+        """2-D float32 feature matrix in training column order (like sklearn's input cast)"""
+        if hasattr(X, 'columns'):
+            X = X[list(self.feature_names_in_)].to_numpy()
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, but the model expects {self.n_features_in_}")
+        return X
+
+    def apply(self, X):
+        """Leaf node index reached in every tree, shape (n_samples, n_trees)"""
+        X = self._features(X)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            left = self.left[nodes]
+            internal = left >= 0
+            if not internal.any():
+                break
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(internal, np.where(go_left, left, self.right[nodes]), nodes)
+        return nodes
+
+    def predict_proba(self, X):
+        """Mean of the per-tree leaf class probabilities, as sklearn computes it"""
+        return self.value[self.apply(X)].mean(axis=1)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def flatten(model):
+    """Concatenate the trees of a fitted forest into flat arrays with global node indices"""
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left < 0
+        roots.append(offset)
+        # Leaves get feature 0 so the vectorized walk can index X safely
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(tree.threshold)
+        lefts.append(np.where(is_leaf, -1, tree.children_left + offset))
+        rights.append(np.where(is_leaf, -1, tree.children_right + offset))
+        value = tree.value[:, 0, :]
+        values.append(value / value.sum(axis=1, keepdims=True))
+        offset += tree.node_count
+    return {
+        'feature': np.concatenate(features).astype(np.int32),
+        'threshold': np.concatenate(thresholds).astype(np.float64),
+        'left': np.concatenate(lefts).astype(np.int32),
+        'right': np.concatenate(rights).astype(np.int32),
+        'value': np.concatenate(values).astype(np.float64),
+        'roots': np.asarray(roots, dtype=np.int32),
+    }
+
+
+def export(model, directory, source_sha256=None):
+    """Write ``model`` to ``directory`` in the compact format; returns the metadata.
+
+    ``meta.json`` is written last (atomically), so a reader never sees the
+    metadata of a half-written export.
+    """
+    os.makedirs(directory, exist_ok=True)
+    arrays = flatten(model)
+    checksums = {}
+    for name in ARRAYS:
+        path = os.path.join(directory, f"{name}.npy")
+        np.save(path, arrays[name])
+        checksums[name] = file_sha256(path)
+
+    feature_names = getattr(model, 'feature_names_in_', None)
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'model_type': type(model).__name__,
+        'classes': np.asarray(model.classes_).tolist(),
+        'feature_names': (list(feature_names) if feature_names is not None
+                          else [f"x{i}" for i in range(model.n_features_in_)]),
+        'n_trees': len(model.estimators_),
+        'n_nodes': int(len(arrays['feature'])),
+        'max_depth': max(estimator.tree_.max_depth for estimator in model.estimators_),
+        'source_sha256': source_sha256,
+        'arrays_sha256': checksums,
+        'exported_at': time.time(),
+    }
+    tmp_path = os.path.join(directory, META_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, META_FILE))
+    return meta
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load(directory, mmap=True):
+    """Load a compact export; arrays are memory-mapped read-only by default.
+
+    Every array file is checked against ``arrays_sha256`` in the metadata
+    first, so a partial copy or an array from another export is refused
+    instead of silently producing wrong predictions.
+    """
+    with open(os.path.join(directory, META_FILE)) as f:
+        meta = json.load(f)
+    if meta.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model format version: {meta.get('format_version')}")
+    checksums = meta.get('arrays_sha256') or {}
+    for name in ARRAYS:
+        if name not in checksums:
+            raise ValueError(f"Model metadata has no checksum for {name}.npy")
+        if file_sha256(os.path.join(directory, f"{name}.npy")) != checksums[name]:
+            raise ValueError(f"{name}.npy in {directory} does not match its checksum in {META_FILE}")
+    arrays = {
+        name: np.load(os.path.join(directory, f"{name}.npy"),
+                      mmap_mode='r' if mmap else None, allow_pickle=False)
+        for name in ARRAYS
+    }
+    return CompactForest(arrays, meta)
+
+
+def sample_inputs(model, n, seed=0):
+    """Random rows spanning the model's split thresholds, plus rows exactly on them"""
+    rng = np.random.default_rng(seed)
+    columns = []
+    for i in range(model.n_features_in_):
+        thresholds = np.concatenate([
+            estimator.tree_.threshold[estimator.tree_.feature == i] for estimator in model.estimators_
+        ])
+        if len(thresholds) == 0:
+            thresholds = np.zeros(1)
+        low, high = thresholds.min(), thresholds.max()
+        margin = max(high - low, 1.0) * 0.1
+        column = rng.uniform(low - margin, high + margin, n)
+        on_split = rng.random(n) < 0.1
+        column[on_split] = rng.choice(thresholds, on_split.sum())
+        columns.append(column)
+    return np.column_stack(columns)
+
+
+def verify(model, compact, X):
+    """Compare compact predictions with sklearn's; returns a summary dict"""
+    import pandas as pd
+    frame = pd.DataFrame(X, columns=list(compact.feature_names_in_))
+    expected = model.predict_proba(frame)
+    actual = compact.predict_proba(X)
+    return {
+        'rows': len(X),
+        'max_abs_proba_diff': float(np.abs(expected - actual).max()),
+        'label_mismatches': int((model.classes_[expected.argmax(axis=1)]
+                                 != compact.classes_[actual.argmax(axis=1)]).sum()),
+    }
+
+
+def single_row_latency(predict, row, repeats=2000):
+    """Median seconds for one single-row predict_proba call"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a pickled RandomForest to the compact inference format")
+    parser.add_argument("model", help="pickled sklearn forest, e.g. flood_model.pkl")
+    parser.add_argument("output", help="directory to write the compact model to")
+    parser.add_argument("--verify-samples", type=int, default=10000,
+                        help="random rows to compare against sklearn (0 to skip)")
+    parser.add_argument("--benchmark", action="store_true", help="compare single-row latency with sklearn")
+    args = parser.parse_args()
+
+    import pickle
+    with open(args.model, "rb") as f:
+        data = f.read()
+    model = pickle.loads(data)
+    meta = export(model, args.output, hashlib.sha256(data).hexdigest())
+    print(f"Exported {meta['n_trees']} trees ({meta['n_nodes']} nodes, depth {meta['max_depth']}) to {args.output}")
+
+    compact = load(args.output)
+    if args.verify_samples:
+        report = verify(model, compact, sample_inputs(model, args.verify_samples))
+        print(json.dumps(report))
+        if report['label_mismatches'] or report['max_abs_proba_diff'] > 1e-9:
+            raise SystemExit("Compact model does not match the sklearn model")
+
+    if args.benchmark:
+        import pandas as pd
+        row = sample_inputs(model, 1, seed=1)
+        frame = pd.DataFrame(row, columns=list(compact.feature_names_in_))
+        print(json.dumps({
+            'sklearn_ms': single_row_latency(model.predict_proba, frame, 200) * 1000,
+            'compact_ms': single_row_latency(compact.predict_proba, row) * 1000,
+        }))
+
+
+if __name__ == "__main__":
+    main()
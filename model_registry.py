@@ -0,0 +1,151 @@
+"""Process-wide registry for the flood prediction model.
+
+Streamlit re-executes fll.py on every rerun, but imported modules stay in
+sys.modules, so a registry kept here lives for the whole server process and
+every session and rerun reuses the same warm model.
+
+The path is either a pickled sklearn model or a directory written by
+model_export, which is loaded without pickle and memory-mapped.
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+
+# model_export (and NumPy) is imported only when a compact export is loaded
+META_FILE = "meta.json"
+
+
+class ModelRegistry:
+    """Load a model once and reload it only when the file on disk changes"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._model = None
+        self._mtime = None
+        self._size = None
+        self._sha256 = None
+        self.loads = 0
+        self.hits = 0
+        self.load_seconds = 0.0
+        self.memory_bytes = 0
+        self.loaded_at = None
+
+    def get(self):
+        """Return the cached model, reloading it if the file's mtime and hash changed"""
+        stat = os.stat(self._source())
+        with self._lock:
+            if self._model is not None and self._same_stat(stat):
+                self.hits += 1
+                return self._model
+
+            with open(self._source(), "rb") as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+
+            if self._model is not None and digest == self._sha256:
+                # File was touched or re-copied but the content is identical
+                self._mtime, self._size = stat.st_mtime_ns, stat.st_size
+                self.hits += 1
+                return self._model
+
+            self._model = self._load(data)
+            self._mtime, self._size = stat.st_mtime_ns, stat.st_size
+            self._sha256 = digest
+            return self._model
+
+    def _source(self):
+        """File whose stat and hash identify the model version (meta.json for an export)"""
+        if os.path.isdir(self.path):
+            return os.path.join(self.path, META_FILE)
+        return self.path
+
+    def _same_stat(self, stat):
+        return (stat.st_mtime_ns, stat.st_size) == (self._mtime, self._size)
+
+    def _load(self, data):
+        """Load the model, recording load time and resident memory growth"""
+        before = _rss_bytes()
+        start = time.perf_counter()
+        if os.path.isdir(self.path):
+            import model_export
+            model = model_export.load(self.path)
+        else:
+            model = pickle.loads(data)
+        self.load_seconds = time.perf_counter() - start
+        self.memory_bytes = max(_rss_bytes() - before, 0)
+        self.loads += 1
+        self.loaded_at = time.time()
+        return model
+
+    def stats(self):
+        """Load-time, memory and cache counters for the current model"""
+        return {
+            'path': self.path,
+            'format': type(self._model).__name__ if self._model is not None else None,
+            'sha256': self._sha256,
+            'loaded': self._model is not None,
+            'loads': self.loads,
+            'hits': self.hits,
+            'load_seconds': round(self.load_seconds, 4),
+            'memory_bytes': self.memory_bytes,
+            'file_bytes': self._size or 0,
+            'loaded_at': self.loaded_at,
+        }
+
+
+def _rss_bytes():
+    """Resident set size of this process (0 where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(path):
+    """Return the shared registry for a model path, creating it on first use"""
+    key = os.path.abspath(path)
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = _registries[key] = ModelRegistry(key)
+        return registry
+
+
+def resolve_version(model_dir, version):
+    """Path of a versioned artifact in ``model_dir``; 'latest' picks the newest one"""
+    if version != 'latest':
+        path = os.path.join(model_dir, version)
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"Model version {version} not found in {model_dir}")
+        return path
+    versions = []
+    for name in os.listdir(model_dir) if os.path.isdir(model_dir) else []:
+        metadata = read_metadata(os.path.join(model_dir, name))
+        if metadata:
+            versions.append((metadata.get('created', 0), name))
+    if not versions:
+        raise FileNotFoundError(f"No model versions found in {model_dir}")
+    return os.path.join(model_dir, max(versions)[1])
+
+
+def read_metadata(path):
+    """Training metadata of a versioned artifact (None for other model paths)"""
+    try:
+        with open(os.path.join(path, "metadata.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def get_model(path):
+    """Return the warm model for a path from the process-wide registry"""
+    return get_registry(path).get()
@@ -0,0 +1,182 @@
+"""Headless flood monitor for registered users.
+
+Every interval it groups subscribed users by city, fetches each city's
+weather once (with bounded concurrency), adds it to each city's rolling
+rainfall history, scores all cities in one batch with the flood model and
+the accumulated-rain thresholds, and emails the subscribers of cities at risk.
+Cities safe now are also scored over their cached 3-hourly forecast, and
+their subscribers get an early warning when risk is forecast within
+--forecast-hours. Each alert also reaches the subscribers of towns within
+--radius-km of the city (see geo_index). Subscribers already alerted for a
+city are skipped until ALERT_COOLDOWN_SECONDS pass or the city goes safe and
+back to alert; a forecast warning does not hold back a later alert (see
+alert_state).
+
+    python monitor.py --interval 900 --jitter 60 --concurrency 8
+    python monitor.py --once --dry-run
+"""
+import argparse
+import logging
+import random
+import time
+
+import pandas as pd
+
+import fll
+import geo_index
+
+log = logging.getLogger("flood_monitor")
+
+
+def group_subscribers(users):
+    """Map each city key to its display name and the emails subscribed to it"""
+    return users.subscribed_by_city()
+
+
+def fetch_weather(cities, concurrency, grouped=True):
+    """Fetch weather for each city once: cache first, then OWM group requests
+    (or one pooled request per city when ``grouped`` is False)"""
+    client = fll.get_weather_client()
+    if grouped:
+        index = fll.get_city_index()
+        fetch_many = lambda missing: client.fetch_many_grouped(missing, index, concurrency)
+    else:
+        fetch_many = lambda missing: client.fetch_many(missing, concurrency)
+    weather, errors = fll.get_weather_cache().get_many(cities, fetch_many)
+    for city, error in errors.items():
+        log.warning("Weather fetch failed for %s: %s", city, error)
+    # Adds each city's rolling rainfall totals, which the rain check and model can use
+    return fll.with_rainfall_many({city: data for city, data in weather.items() if data})
+
+
+def score_cities(weather, model):
+    """Score every fetched city with one batch model call"""
+    if not weather:
+        return None
+    frame = pd.DataFrame.from_dict(weather, orient='index')
+    frame['city'] = frame.index
+    return fll.predict_flood_batch(frame, model)
+
+
+def forecast_at_risk(cities, args):
+    """Earliest forecast flood-risk window of each city that has one, all scored in one model call"""
+    if not args.forecast_hours or not cities:
+        return {}
+    _, windows = fll.forecast_risk_many(cities, fll.load_model(), args.forecast_hours, args.concurrency)
+    for city, window in windows.items():
+        if window:
+            log.info("Forecast flood risk in %s between %s", city, fll.format_window(window))
+    return {city: window for city, window in windows.items() if window}
+
+
+def recipient_finder(groups, cities, args):
+    """Function giving the emails to alert for a city: its own subscribers plus,
+    with --radius-km, those of every subscribed city within that distance"""
+    if not args.radius_km:
+        return lambda city: list(groups[city.strip().lower()][1])
+    coordinates = fll.geocode_many([name for name, _ in groups.values()] + cities, args.concurrency)
+    index = geo_index.SubscriberIndex(groups, coordinates, fll.GEO_CELL_KM)
+    return lambda city: index.recipients_near(city, coordinates.get(city), args.radius_km)
+
+
+def run_cycle(args):
+    """Run one check of every subscribed city; returns the number of emails sent"""
+    groups = group_subscribers(fll.get_user_store())
+    if not groups:
+        log.info("No subscribed users")
+        return 0
+
+    cities = [city for city, _ in groups.values()]
+    weather = fetch_weather(cities, args.concurrency, grouped=args.fetch_mode == 'group')
+    scores = score_cities(weather, fll.load_model())
+    if scores is None:
+        log.warning("No cities could be scored (%d fetched of %d)", len(weather), len(cities))
+        return 0
+
+    at_risk = scores[scores['flood_risk']]
+    alerts = {
+        row.city: (fll.flood_alert_message(row.city, weather[row.city], True), 'alert', "AutoEmail")
+        for row in at_risk.itertuples()
+    }
+    forecast_windows = forecast_at_risk(scores.loc[~scores['flood_risk'], 'city'].tolist(), args)
+    for city, window in forecast_windows.items():
+        alerts[city] = (fll.forecast_alert_message(city, window), 'forecast', "AutoForecastEmail")
+
+    state = fll.get_alert_state()
+    if not args.dry_run:
+        for city in scores['city']:
+            if city not in alerts:
+                state.observe(city, 'safe')
+    log.info("Checked %d cities for %d subscribers: %d at risk, %d more forecast at risk",
+             len(scores), sum(len(emails) for _, emails in groups.values()), len(at_risk),
+             len(forecast_windows))
+
+    ref = f"monitor:{time.time():.6f}"
+    recipients = recipient_finder(groups, list(alerts), args)
+    covered = set()
+    total_sent = 0
+    for city, (text, status, alert_type) in alerts.items():
+        # Subscribers near several alerting cities get one alert per cycle
+        emails = [email for email in recipients(city) if email not in covered]
+        covered.update(emails)
+        if not emails:
+            continue
+        if args.dry_run:
+            log.info("[dry run] Would alert up to %d subscribers in %s (%s)", len(emails), city, alert_type)
+            continue
+
+        # Forecast warnings rank below alerts, so a later flood alert is an escalation
+        due, skipped = state.reserve(city, status, emails, ref=ref)
+        if skipped:
+            log.info("Skipping %d subscribers in %s already alerted", len(skipped), city)
+        if not due:
+            continue
+        message = fll.translate_message(text, args.language)
+
+        def release_failed(email, error, city=city):
+            if error is not None:
+                state.release(city, email, ref)
+
+        sent, failed = fll.send_bulk_emails(
+            [{'email': email} for email in due], city, message, on_result=release_failed
+        )
+        total_sent += sent
+        log.info("Alerted %s: %d sent, %d failed", city, sent, failed)
+        if sent > 0:
+            fll.save_status(status, city, f"{alert_type}({sent})", args.language)
+
+    return total_sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monitor subscribed users' cities and send flood alerts")
+    parser.add_argument("--interval", type=float, default=900, help="seconds between checks")
+    parser.add_argument("--jitter", type=float, default=60, help="random +/- seconds added to each interval")
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel weather requests")
+    parser.add_argument("--fetch-mode", choices=("group", "single"), default="group",
+                        help="bulk OWM group requests or one request per city")
+    parser.add_argument("--forecast-hours", type=int, default=fll.FORECAST_HOURS,
+                        help="also alert cities forecast to be at risk within this many hours (0 to disable)")
+    parser.add_argument("--radius-km", type=float, default=fll.ALERT_RADIUS_KM,
+                        help="also alert subscribers of cities within this distance (0 for the same city only)")
+    parser.add_argument("--language", default="en", help="alert language code")
+    parser.add_argument("--once", action="store_true", help="run a single check and exit")
+    parser.add_argument("--dry-run", action="store_true", help="log alerts instead of sending them")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    while True:
+        started = time.monotonic()
+        try:
+            run_cycle(args)
+        except Exception:
+            log.exception("Monitoring cycle failed")
+        if args.once:
+            break
+        delay = args.interval + random.uniform(-args.jitter, args.jitter)
+        time.sleep(max(0.0, delay - (time.monotonic() - started)))
+
+
+if __name__ == "__main__":
+    main()
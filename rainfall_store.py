@@ -0,0 +1,255 @@
+"""Per-city rolling rainfall history with incremental window totals.
+
+Each city keeps a ring buffer of fixed time steps (``step`` seconds, 10
+minutes by default) covering the longest window. An observation of OWM's
+``rain.1h`` adds ``rain_1h * dt`` millimetres to the current step, where
+``dt`` is the time since the city's previous observation (at most an hour,
+since that is all ``rain.1h`` covers). For every window (e.g. 3h and 24h)
+the store keeps a running sum, updated as steps enter and leave the window,
+and a monotonic deque giving the highest hourly intensity seen in it, so
+reading the totals costs O(1) however long the history is.
+
+An observation is identified by its OWM timestamp, so the same cached
+payload seen twice is only counted once. Buffers are written through to
+SQLite as packed float32 arrays (a couple of KB per city) and reloaded on
+first use. Like the other shared modules, the in-memory series live in
+sys.modules and are shared by every Streamlit session in the process.
+"""
+import math
+import os
+import re
+import threading
+import time
+from array import array
+from collections import deque
+
+import storage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rainfall (
+    city_key TEXT PRIMARY KEY,
+    step REAL NOT NULL,
+    capacity INTEGER NOT NULL,
+    head INTEGER NOT NULL,
+    last_observed REAL,
+    amount BLOB NOT NULL,
+    peak BLOB NOT NULL
+);
+"""
+
+MAX_GAP = 3600  # rain.1h covers the last hour only
+UNITS = {'m': 60, 'h': 3600, 'd': 86400}
+
+
+def window_seconds(label):
+    """'3h' -> 10800, '30m' -> 1800, '2d' -> 172800"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([mhd])\s*", label)
+    if not match:
+        raise ValueError(f"Invalid rainfall window '{label}', expected e.g. 3h or 30m")
+    return float(match.group(1)) * UNITS[match.group(2)]
+
+
+def parse_thresholds(spec):
+    """'3h=65,24h=115' -> {'3h': 65.0, '24h': 115.0}"""
+    thresholds = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        label, _, value = item.partition('=')
+        window_seconds(label)
+        thresholds[label.strip()] = float(value)
+    return thresholds
+
+
+def city_key(city):
+    return (city or '').strip().lower()
+
+
+class RainSeries:
+    """Ring buffer of per-step rainfall for one city with running window sums and maxima"""
+
+    def __init__(self, windows, step, head=None, last_observed=None, amount=None, peak=None):
+        self.windows = dict(windows)  # label -> seconds
+        self.step = step
+        self.spans = {label: max(1, round(seconds / step)) for label, seconds in self.windows.items()}
+        self.capacity = max(self.spans.values())
+        self.amount = amount if amount is not None else array('f', bytes(4 * self.capacity))
+        self.peak = peak if peak is not None else array('f', bytes(4 * self.capacity))
+        self.head = head  # absolute step number of the newest slot
+        self.last_observed = last_observed
+        self._rebuild()
+
+    def _rebuild(self):
+        """Recompute every window's sum and max deque from the buffer"""
+        self.sums = {label: 0.0 for label in self.spans}
+        self.maxima = {label: deque() for label in self.spans}
+        if self.head is None:
+            return
+        for label, span in self.spans.items():
+            steps = range(self.head - span + 1, self.head + 1)
+            self.sums[label] = math.fsum(self.amount[s % self.capacity] for s in steps)
+            for s in steps:
+                self._push_peak(self.maxima[label], s)
+
+    def _push_peak(self, maxima, step):
+        value = self.peak[step % self.capacity]
+        while maxima and (maxima[-1] == step or self.peak[maxima[-1] % self.capacity] <= value):
+            maxima.pop()
+        maxima.append(step)
+
+    def advance(self, step):
+        """Move the head forward to ``step``, dropping steps that leave each window"""
+        if self.head is None:
+            self.head = step
+            return
+        if step <= self.head:
+            return
+        if step - self.head >= self.capacity:
+            for i in range(self.capacity):
+                self.amount[i] = self.peak[i] = 0.0
+            self.head = step
+            self._rebuild()
+            return
+        for s in range(self.head + 1, step + 1):
+            for label, span in self.spans.items():
+                leaving = s - span
+                self.sums[label] -= self.amount[leaving % self.capacity]
+                maxima = self.maxima[label]
+                while maxima and maxima[0] <= leaving:
+                    maxima.popleft()
+            slot = s % self.capacity
+            self.amount[slot] = self.peak[slot] = 0.0
+            if slot == 0:
+                # Once per lap, re-add the sums exactly so float error can't accumulate
+                self.head = s
+                self._rebuild()
+        self.head = step
+
+    def observe(self, rain_1h, observed_at):
+        """Add one observation; returns False for one no newer than the last"""
+        if self.last_observed is not None and observed_at <= self.last_observed:
+            return False
+        dt = MAX_GAP if self.last_observed is None else min(observed_at - self.last_observed, MAX_GAP)
+        self.last_observed = observed_at
+        step = int(observed_at // self.step)
+        self.advance(step)
+        slot = step % self.capacity
+        increment = max(float(rain_1h or 0), 0.0) * dt / 3600
+        self.amount[slot] += increment
+        for label in self.sums:
+            self.sums[label] += increment
+        if rain_1h and rain_1h > self.peak[slot]:
+            self.peak[slot] = rain_1h
+        for maxima in self.maxima.values():
+            self._push_peak(maxima, step)
+        return True
+
+    def totals(self, now=None):
+        """{'rain_3h': mm, 'rain_max_3h': mm/h, ...} for every window as of ``now``.
+
+        Steps that have aged out since the last observation are left out
+        without moving the head, so a late observation still lands in place.
+        """
+        result = {}
+        now_step = self.head if now is None or self.head is None else max(int(now // self.step), self.head)
+        for label, span in self.spans.items():
+            total = peak = 0.0
+            if self.head is not None and now_step - self.head < span:
+                cutoff = now_step - span  # steps at or before this are outside the window
+                total = self.sums[label] - math.fsum(
+                    self.amount[s % self.capacity] for s in range(self.head - span + 1, cutoff + 1)
+                )
+                peak = next((float(self.peak[s % self.capacity]) for s in self.maxima[label] if s > cutoff), 0.0)
+            result[f'rain_{label}'] = max(total, 0.0)
+            result[f'rain_max_{label}'] = peak
+        return result
+
+
+class RainfallStore:
+    """Rolling rainfall series for many cities, persisted to SQLite"""
+
+    def __init__(self, path, windows, step=600):
+        self.path = path
+        self.windows = {label: window_seconds(label) for label in windows}
+        self.step = step
+        self._series = {}
+        self._lock = threading.Lock()
+        self.observations = 0
+        self.duplicates = 0
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        return storage.connect(self.path)
+
+    def _load(self, key):
+        """The city's series (lock held), read from disk on first use"""
+        series = self._series.get(key)
+        if series is not None:
+            return series
+        series = RainSeries(self.windows, self.step)
+        row = self._connect().execute("SELECT * FROM rainfall WHERE city_key = ?", (key,)).fetchone()
+        # A buffer written with another step or window length is dropped, not reinterpreted
+        if row is not None and row['step'] == self.step and row['capacity'] == series.capacity:
+            amount, peak = array('f'), array('f')
+            amount.frombytes(row['amount'])
+            peak.frombytes(row['peak'])
+            series = RainSeries(self.windows, self.step, row['head'], row['last_observed'], amount, peak)
+        self._series[key] = series
+        return series
+
+    def observe_many(self, observations, now=None):
+        """Record ``{city: (rain_1h, observed_at)}`` in one transaction; returns ``{city: totals}``.
+
+        ``observed_at`` may be None to mean now.
+        """
+        now = now if now is not None else time.time()
+        results, changed = {}, []
+        with self._lock:
+            for city, (rain_1h, observed_at) in observations.items():
+                key = city_key(city)
+                series = self._load(key)
+                if series.observe(rain_1h, observed_at if observed_at is not None else now):
+                    self.observations += 1
+                    changed.append((key, series))
+                else:
+                    self.duplicates += 1
+                results[city] = series.totals(now)
+            if changed:
+                with self._connect() as db:
+                    db.executemany(
+                        "INSERT OR REPLACE INTO rainfall "
+                        "(city_key, step, capacity, head, last_observed, amount, peak) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [(key, self.step, series.capacity, series.head, series.last_observed,
+                          series.amount.tobytes(), series.peak.tobytes()) for key, series in changed]
+                    )
+        return results
+
+    def observe(self, city, rain_1h, observed_at=None, now=None):
+        return self.observe_many({city: (rain_1h, observed_at)}, now)[city]
+
+    def totals(self, city, now=None):
+        with self._lock:
+            return self._load(city_key(city)).totals(now if now is not None else time.time())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'cities': len(self._series),
+                'windows': list(self.windows),
+                'step_seconds': self.step,
+                'observations': self.observations,
+                'duplicates': self.duplicates,
+            }
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path, windows, step=600):
+    """Return the process-wide rainfall store for a database path"""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None or list(store.windows) != list(windows) or store.step != step:
+            store = _stores[key] = RainfallStore(key, windows, step)
+        return store
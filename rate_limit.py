@@ -0,0 +1,46 @@
+"""Thread-safe token bucket rate limiter for upstream APIs."""
+import threading
+import time
+
+
+class TokenBucket:
+    """Allow ``rate`` operations per second with bursts of up to ``capacity``"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, limit, burst=None):
+        return cls(limit / 60.0, burst if burst is not None else max(1, limit // 6))
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1, timeout=None):
+        """Block until ``tokens`` are available; False if ``timeout`` expires first.
+
+        A request larger than the bucket waits for a full bucket and leaves it
+        in debt, so later callers wait and the long-run rate still holds.
+        """
+        tokens = float(tokens)
+        needed = min(tokens, self.capacity)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= needed:
+                    self._tokens -= tokens
+                    return True
+                wait = (needed - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
@@ -0,0 +1,140 @@
+"""Concurrent, rate-limited SMS fan-out.
+
+Twilio limits throughput per sender in message *segments* per second, and a
+long or non-Latin alert (Hindi, Tamil, ...) is split into several segments.
+The sender counts segments for the message body, groups recipients into
+batches that fit the per-second budget and sends each batch from a worker
+pool behind a shared token bucket. The transport is any callable
+``transport(to, body)``, so it can be a stub in tests and benchmarks.
+"""
+import random
+import threading
+import time
+
+import requests
+
+import metrics
+import worker_pool
+from rate_limit import TokenBucket
+
+GSM7_BASIC = set(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM7_EXTENDED = set("^{}\\[~]|€\f")
+
+
+def segment_count(body):
+    """Number of SMS segments needed for ``body`` (GSM-7 or UCS-2 encoding)"""
+    if all(ch in GSM7_BASIC or ch in GSM7_EXTENDED for ch in body):
+        length = sum(2 if ch in GSM7_EXTENDED else 1 for ch in body)
+        single, multi = 160, 153
+    else:
+        length = len(body.encode("utf-16-le")) // 2
+        single, multi = 70, 67
+    if length <= single:
+        return 1
+    return -(-length // multi)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_twilio_client(account_sid, auth_token):
+    """Return the process-wide Twilio REST client, importing twilio on first use"""
+    with _clients_lock:
+        client = _clients.get(account_sid)
+        if client is None:
+            from twilio.rest import Client
+            client = _clients[account_sid] = Client(account_sid, auth_token)
+        return client
+
+
+def twilio_transport(client, from_number):
+    """Transport that sends through a shared Twilio REST client"""
+    def send(to, body):
+        with metrics.timer('twilio_send'):
+            return client.messages.create(body=body, from_=from_number, to=to).sid
+    return send
+
+
+def is_transient(error):
+    """Retry rate limiting, server errors and dropped connections"""
+    status = getattr(error, 'status', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    # Twilio's HTTP client raises requests' own exceptions, which don't subclass the built-ins
+    return isinstance(error, (ConnectionError, TimeoutError, requests.ConnectionError, requests.Timeout))
+
+
+class BulkSMSSender:
+    """Send one message body to many numbers within a segments-per-second limit"""
+
+    def __init__(self, transport, segments_per_second=1.0, concurrency=4,
+                 max_retries=3, backoff=1.0):
+        self.transport = transport
+        self.limiter = TokenBucket(segments_per_second, capacity=max(1.0, segments_per_second))
+        self.segments_per_second = segments_per_second
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def batch_size(self, segments):
+        """Messages per batch so that a batch uses about one second of budget"""
+        return max(1, int(self.segments_per_second // segments))
+
+    def send(self, phone_numbers, body, progress=None, on_result=None, progress_interval=0.25):
+        """Send ``body`` to every number.
+
+        ``progress(sent, failed)`` runs on the calling thread; ``on_result(phone,
+        error)`` runs on worker threads after each message. Returns a dict with
+        ``sent``, ``failed``, ``segments`` (per message) and ``errors``. If
+        ``phone_numbers`` or ``on_result`` raises, sending stops and the first
+        such error is re-raised once the workers have finished.
+        """
+        segments = segment_count(body)
+        result = {'sent': 0, 'failed': 0, 'segments': segments, 'errors': []}
+        lock = threading.Lock()
+
+        def record(phone, error=None):
+            with lock:
+                if error is None:
+                    result['sent'] += 1
+                else:
+                    result['failed'] += 1
+                    result['errors'].append((phone, str(error)))
+            if on_result:
+                on_result(phone, error)
+
+        def work(batches):
+            for batch in batches:
+                self.limiter.acquire(segments * len(batch))
+                for phone in batch:
+                    record(phone, self._deliver(phone, body, segments))
+
+        def report():
+            with lock:
+                sent, failed = result['sent'], result['failed']
+            progress(sent, failed)
+
+        worker_pool.run_batches(
+            phone_numbers, self.batch_size(segments), self.concurrency, work,
+            progress=report if progress else None, progress_interval=progress_interval
+        )
+        return result
+
+    def _deliver(self, phone, body, segments):
+        """Send one message with retries; returns the final error or None"""
+        attempt = 0
+        while True:
+            try:
+                self.transport(phone, body)
+                return None
+            except Exception as e:
+                if attempt >= self.max_retries or not is_transient(e):
+                    return e
+                time.sleep(self.backoff * (2 ** attempt) * (1 + random.random() / 2))
+                attempt += 1
+                # A retried message spends its segments again
+                self.limiter.acquire(segments)
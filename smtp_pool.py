@@ -0,0 +1,166 @@
+"""Bulk email delivery over a pool of persistent, authenticated SMTP connections.
+
+Each worker thread keeps its own SMTP session open and sends batches of
+messages over it, so a bulk send pays for the STARTTLS handshake and login
+once per worker instead of once per recipient. Point it at a local sink
+(``python -m aiosmtpd -n -l localhost:8025`` with ``starttls=False``) to
+exercise it without a real mail server.
+"""
+import random
+import smtplib
+import threading
+import time
+
+import metrics
+import worker_pool
+
+
+def open_connection(host, port, username=None, password=None, starttls=True, timeout=30):
+    """Open an SMTP session, upgrading to TLS and logging in when configured"""
+    with metrics.timer('smtp_connect'):
+        server = smtplib.SMTP(host, port, timeout=timeout)
+    try:
+        with metrics.timer('smtp_starttls'):
+            server.ehlo()
+            if starttls:
+                server.starttls()
+                server.ehlo()
+        if username and password and server.has_extn("auth"):
+            with metrics.timer('smtp_login'):
+                server.login(username, password)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+def is_transient(error):
+    """True for SMTP errors worth retrying (4xx replies and dropped connections)"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return bool(codes) and all(400 <= code < 500 for code in codes)
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError))
+
+
+def is_connection_usable(error):
+    """True if the session survives ``error`` (a rejected transaction, not a dropped link)"""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code != 421
+    return isinstance(error, smtplib.SMTPRecipientsRefused)
+
+
+class BulkMailer:
+    """Deliver many messages concurrently over reused SMTP connections.
+
+    ``concurrency`` workers each hold one connection, take up to
+    ``batch_size`` messages at a time from a bounded queue and recycle the
+    connection after ``messages_per_connection`` sends. Transient failures are
+    retried up to ``max_retries`` times with exponential backoff.
+    """
+
+    def __init__(self, host, port, username=None, password=None, starttls=True,
+                 concurrency=4, batch_size=50, messages_per_connection=500,
+                 max_retries=3, backoff=1.0, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.messages_per_connection = max(1, messages_per_connection)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+    def connect(self):
+        return open_connection(self.host, self.port, self.username, self.password,
+                               self.starttls, self.timeout)
+
+    def send(self, messages, progress=None, progress_interval=0.25, on_result=None):
+        """Send ``(sender, recipient, payload)`` tuples from any iterable.
+
+        ``progress(sent, failed)`` is called from the calling thread while the
+        workers run, so it is safe to update Streamlit widgets from it.
+        ``on_result(recipient, error)`` is called from the worker threads after
+        every message (error is None on success).
+        Returns a dict with ``sent``, ``failed`` and ``errors`` (recipient, error).
+        If ``messages`` or ``on_result`` raises, sending stops and the first
+        such error is re-raised once the workers have finished.
+        """
+        result = {'sent': 0, 'failed': 0, 'errors': []}
+        lock = threading.Lock()
+
+        def record(recipient, error=None):
+            with lock:
+                if error is None:
+                    result['sent'] += 1
+                else:
+                    result['failed'] += 1
+                    result['errors'].append((recipient, str(error)))
+            if on_result:
+                on_result(recipient, error)
+
+        def report():
+            with lock:
+                sent, failed = result['sent'], result['failed']
+            progress(sent, failed)
+
+        worker_pool.run_batches(
+            messages, self.batch_size, self.concurrency,
+            lambda batches: self._work(batches, record),
+            progress=report if progress else None, progress_interval=progress_interval
+        )
+        return result
+
+    def _work(self, batches, record):
+        server = None
+        sent_on_connection = 0
+        try:
+            for batch in batches:
+                for sender, recipient, payload in batch:
+                    if server is not None and sent_on_connection >= self.messages_per_connection:
+                        server = self._close(server)
+                    previous = server
+                    server, error = self._deliver(server, sender, recipient, payload)
+                    if server is not previous:
+                        sent_on_connection = 0
+                    if server is not None:
+                        sent_on_connection += 1
+                    record(recipient, error)
+        finally:
+            self._close(server)
+
+    def _deliver(self, server, sender, recipient, payload):
+        """Send one message, reconnecting and backing off on transient errors.
+
+        Returns the (possibly new) connection and the final error, if any.
+        """
+        attempt = 0
+        while True:
+            try:
+                if server is None:
+                    server = self.connect()
+                with metrics.timer('smtp_send'):
+                    server.sendmail(sender, recipient, payload)
+                return server, None
+            except Exception as e:
+                if not is_connection_usable(e):
+                    server = self._close(server)
+                if attempt >= self.max_retries or not is_transient(e):
+                    return server, e
+                time.sleep(self.backoff * (2 ** attempt) * (1 + random.random() / 2))
+                attempt += 1
+
+    @staticmethod
+    def _close(server):
+        if server is not None:
+            try:
+                server.quit()
+            except Exception:
+                server.close()
+        return None
@@ -0,0 +1,48 @@
+"""Shared SQLite helpers for the on-disk stores."""
+import sqlite3
+import threading
+
+_local = threading.local()
+
+
+def connect(path):
+    """Per-thread SQLite connection in WAL mode (sqlite3 connections are not thread-safe)"""
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    db = connections.get(path)
+    if db is None:
+        db = sqlite3.connect(path, timeout=30)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        connections[path] = db
+    return db
+
+
+MIGRATIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS migrations (
+    name TEXT PRIMARY KEY,
+    applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+def run_once(db, name, migrate):
+    """Run ``migrate(db)`` inside one write transaction unless ``name`` already ran.
+
+    Returns the migration's result, or None if it had already been applied.
+    """
+    db.executescript(MIGRATIONS_SCHEMA)
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        if db.execute("SELECT 1 FROM migrations WHERE name = ?", (name,)).fetchone():
+            db.rollback()
+            return None
+        result = migrate(db)
+        db.execute("INSERT INTO migrations (name) VALUES (?)", (name,))
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
@@ -0,0 +1,136 @@
+import sqlite3
+import threading
+
+import pytest
+
+import alert_queue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return alert_queue.AlertQueue(str(tmp_path / "jobs.db"), lease_seconds=60)
+
+
+def write_from_other_thread(path):
+    """Try a short write on another connection; returns the error or None"""
+    outcome = []
+
+    def write():
+        db = sqlite3.connect(path, timeout=0.2)
+        try:
+            with db:
+                db.execute("UPDATE jobs SET updated = updated")
+            outcome.append(None)
+        except sqlite3.OperationalError as e:
+            outcome.append(e)
+        finally:
+            db.close()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    thread.join()
+    return outcome[0]
+
+
+def test_submit_does_not_hold_the_write_lock_while_reading_recipients(queue):
+    seen = {}
+
+    def recipients():
+        for i in range(2500):
+            if i == 1500:
+                seen['write_error'] = write_from_other_thread(queue.path)
+                seen['claimed'] = queue.claim()
+            yield 'email', f"user{i}@example.com"
+
+    job_id, created = queue.submit('bulk_email', {'city': 'Pune'}, recipients(), key='k', chunk_size=1000)
+    assert created
+    assert seen == {'write_error': None, 'claimed': None}  # a loading job is not claimable
+    job = queue.job(job_id)
+    assert (job['status'], job['total']) == ('queued', 2500)
+    assert queue.claim()['id'] == job_id
+
+
+def test_failed_submit_leaves_no_job(queue):
+    def recipients():
+        yield 'email', 'a@example.com'
+        raise ValueError("bad CSV row")
+
+    with pytest.raises(ValueError):
+        queue.submit('bulk_email', {}, recipients(), key='k', chunk_size=1)
+    assert queue.recent() == []
+    job_id, created = queue.submit('bulk_email', {}, [('email', 'a@example.com')], key='k')
+    assert created and queue.job(job_id)['total'] == 1
+
+
+def test_submit_dedupes_by_idempotency_key(queue):
+    recipients = [('email', 'a@example.com'), ('sms', '+911'), ('email', 'a@example.com')]
+    job_id, created = queue.submit('alert', {'city': 'Pune'}, recipients)
+    assert created and queue.job(job_id)['total'] == 2
+    assert queue.submit('alert', {'city': 'Pune'}, list(reversed(recipients))) == (job_id, False)
+    other, created = queue.submit('alert', {'city': 'Delhi'}, recipients)
+    assert created and other != job_id
+    assert queue.submit('bulk_email', {}, iter([]), key='upload')[1]
+    assert queue.submit('bulk_email', {}, iter([('email', 'b@example.com')]), key='upload')[1] is False
+
+
+def test_claim_leases_and_reclaims_expired_jobs(queue, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(alert_queue.time, 'time', lambda: clock[0])
+    first, _ = queue.submit('alert', {'n': 1}, [('email', 'a@example.com')])
+    second, _ = queue.submit('alert', {'n': 2}, [('email', 'b@example.com')])
+
+    job = queue.claim()
+    assert (job['id'], job['status'], job['payload']) == (first, 'queued', {'n': 1})
+    assert queue.job(first)['lease_until'] == 1060.0
+    assert queue.claim()['id'] == second
+    assert queue.claim() is None
+
+    clock[0] = 1050.0
+    queue.mark_recipient(first, 'email', 'a@example.com')  # progress renews the lease
+    clock[0] = 1070.0
+    assert queue.claim()['id'] == second  # its lease expired at 1060
+    assert queue.claim() is None
+    clock[0] = 1111.0
+    assert queue.claim()['id'] == first
+
+    queue.finish(first)
+    queue.finish(second, "boom")
+    clock[0] = 5000.0
+    assert queue.claim() is None
+    assert [(job['id'], job['status'], job['error']) for job in queue.recent()] == \
+        [(second, 'failed', 'boom'), (first, 'done', None)]
+
+
+def test_mark_and_skip_recipient_counters(queue):
+    job_id, _ = queue.submit('alert', {}, [('email', 'a'), ('email', 'b'), ('email', 'c'), ('sms', '+1')])
+    queue.mark_recipient(job_id, 'email', 'a')
+    queue.mark_recipient(job_id, 'email', 'b', RuntimeError("refused"))
+    queue.skip_recipient(job_id, 'email', 'c', 'cooldown')
+    # Only a pending recipient is counted, so repeats change nothing
+    queue.mark_recipient(job_id, 'email', 'a')
+    queue.mark_recipient(job_id, 'email', 'c')
+    queue.skip_recipient(job_id, 'email', 'b', 'cooldown')
+    queue.mark_recipient(job_id, 'sms', 'a')
+
+    job = queue.job(job_id)
+    assert (job['total'], job['sent'], job['failed'], job['skipped']) == (4, 1, 1, 1)
+    assert queue.channel_counts(job_id) == {'email': {'sent': 1, 'failed': 1, 'skipped': 1}, 'sms': {'pending': 1}}
+    assert queue.failures(job_id) == [{'channel': 'email', 'recipient': 'b', 'error': 'refused'}]
+    assert list(queue.pending_recipients(job_id)) == ['+1']
+
+
+def test_pending_recipients_pages_by_language(queue):
+    languages = [None, 'hi', 'ta']
+    recipients = [('email', f"user{i:04d}@example.com", languages[i % 3]) for i in range(250)]
+    job_id, _ = queue.submit('bulk_email', {}, recipients + [('sms', '+1')], key='k')
+    queue.mark_recipient(job_id, 'email', 'user0001@example.com')
+
+    everyone = list(queue.pending_recipients(job_id, 'email', page_size=7))
+    assert everyone == sorted(email for _, email, _ in recipients if email != 'user0001@example.com')
+    hindi = list(queue.pending_recipients(job_id, 'email', page_size=7, language='hi'))
+    assert hindi == [email for _, email, language in recipients
+                     if language == 'hi' and email != 'user0001@example.com']
+    default = list(queue.pending_recipients(job_id, 'email', page_size=7, language=None))
+    assert len(default) == 84
+    assert sorted(queue.pending_languages(job_id, 'email'), key=str) == sorted(languages, key=str)
+    assert list(queue.pending_recipients(job_id, 'sms')) == ['+1']
@@ -0,0 +1,43 @@
+import alert_state
+
+
+def make_store(tmp_path):
+    return alert_state.AlertStateStore(str(tmp_path / "state.db"), {'alert': 3600, 'forecast': 3600})
+
+
+def test_cooldown_and_escalation(tmp_path):
+    store = make_store(tmp_path)
+    assert store.reserve('Pune', 'alert', ['a'], now=0) == (['a'], {})
+    assert store.reserve('Pune', 'alert', ['a'], now=10) == ([], {'a': 'cooldown'})
+    assert store.reserve('Pune', 'alert', ['a'], now=3600) == (['a'], {})
+    assert store.reserve('Pune', 'safe', ['a'], now=3700) == ([], {'a': 'de-escalation'})
+    assert store.reserve('Pune', 'alert', ['a'], now=3800) == (['a'], {})
+
+
+def test_alert_after_forecast_warning_is_sent(tmp_path):
+    store = make_store(tmp_path)
+    assert store.reserve('Pune', 'forecast', ['a'], now=0) == (['a'], {})
+    assert store.reserve('Pune', 'alert', ['a'], now=10) == (['a'], {})
+    assert store.reserve('Pune', 'forecast', ['a'], now=20) == ([], {'a': 'de-escalation'})
+
+
+def test_release_only_undoes_own_reservation_once(tmp_path):
+    store = make_store(tmp_path)
+    store.reserve('Pune', 'safe', ['a'], now=0, ref='job:1')
+    store.reserve('Pune', 'alert', ['a'], now=10, ref='job:2')
+    store.release('Pune', 'a', 'job:1')
+    assert store.get('Pune', 'a')['status'] == 'alert'
+
+    store.release('Pune', 'a', 'job:2')
+    state = store.get('Pune', 'a')
+    assert (state['status'], state['sent_at'], state['ref']) == ('safe', 0, None)
+    store.release('Pune', 'a', 'job:2')
+    assert store.get('Pune', 'a')['status'] == 'safe'
+
+
+def test_release_of_first_reservation_forgets_recipient(tmp_path):
+    store = make_store(tmp_path)
+    store.reserve('Pune', 'alert', ['a'], now=0, ref='job:1')
+    store.release('Pune', 'a', 'job:1')
+    assert store.get('Pune', 'a') is None
+    assert store.reserve('Pune', 'alert', ['a'], now=1) == (['a'], {})
@@ -0,0 +1,101 @@
+import random
+import threading
+
+import pytest
+
+import geo_index
+
+
+def brute_force(points, lat, lon, radius_km):
+    return sorted(
+        item for point_lat, point_lon, item in points
+        if geo_index.haversine_km(lat, lon, point_lat, point_lon) <= radius_km
+    )
+
+
+def test_within_crosses_antimeridian():
+    grid = geo_index.GridIndex(50)
+    grid.add(0, -179.9, 'west')
+    grid.add(0, 179.95, 'east')
+    found = grid.within(0, 179.9, 25)
+    assert [item for _, item in found] == ['east', 'west']
+    assert 22 < found[1][0] < 23
+    assert [item for _, item in grid.within(0, -179.95, 25)] == ['west', 'east']
+
+
+def test_within_matches_brute_force():
+    rng = random.Random(7)
+    for cell_km in (10, 50, 137):
+        grid = geo_index.GridIndex(cell_km)
+        points = []
+        for i in range(2000):
+            # Bias points toward the antimeridian and the poles
+            lat = rng.choice([rng.uniform(-90, 90), rng.uniform(80, 90), rng.uniform(-90, -80)])
+            lon = rng.choice([rng.uniform(-180, 180), rng.uniform(175, 180), rng.uniform(-180, -175)])
+            points.append((lat, lon, i))
+            grid.add(lat, lon, i)
+        for _ in range(200):
+            lat, lon, _ = rng.choice(points)
+            radius = rng.choice([5, 25, 120, 600])
+            assert sorted(item for _, item in grid.within(lat, lon, radius)) == brute_force(points, lat, lon, radius)
+
+
+def test_recipients_near_includes_nearby_cities():
+    groups = {
+        'pune': ('Pune', ['a@x.com']),
+        'pimpri': ('Pimpri', ['b@x.com', 'a@x.com']),
+        'delhi': ('Delhi', ['c@x.com']),
+        'atlantis': ('Atlantis', ['d@x.com']),
+    }
+    coordinates = {'Pune': (18.52, 73.86), 'Pimpri': (18.63, 73.80), 'Delhi': (28.61, 77.21)}
+    index = geo_index.SubscriberIndex(groups, coordinates)
+    assert index.recipients_near('Pune', coordinates['Pune'], 25) == ['a@x.com', 'b@x.com']
+    assert index.recipients_near('Pune', coordinates['Pune'], 0) == ['a@x.com']
+    assert index.stats() == {'cities': 4, 'located': 3, 'unlocated': 1, 'subscribers': 5}
+
+
+@pytest.fixture
+def fresh_index(monkeypatch):
+    monkeypatch.setattr(geo_index, '_index', None)
+    monkeypatch.setattr(geo_index, '_built_at', 0.0)
+    monkeypatch.setattr(geo_index, '_building', False)
+
+
+def test_rebuild_serves_previous_index_until_ready(fresh_index):
+    assert geo_index.get_index(lambda: 'old') == 'old'
+    geo_index.invalidate()
+    started, release = threading.Event(), threading.Event()
+
+    def slow_build():
+        started.set()
+        release.wait(5)
+        return 'new'
+
+    rebuilt = []
+    builder = threading.Thread(target=lambda: rebuilt.append(geo_index.get_index(slow_build)))
+    builder.start()
+    assert started.wait(5)
+    # The lock is free during the build, and nobody starts a second one
+    assert geo_index.get_index(lambda: pytest.fail("built twice")) == 'old'
+    release.set()
+    builder.join(5)
+    assert rebuilt == ['new']
+    assert geo_index.get_index(lambda: pytest.fail("rebuilt while fresh")) == 'new'
+
+
+def test_invalidate_during_build_forces_another_rebuild(fresh_index):
+    def build_and_invalidate():
+        geo_index.invalidate()
+        return 'racing'
+
+    assert geo_index.get_index(build_and_invalidate) == 'racing'
+    assert geo_index.get_index(lambda: 'current') == 'current'
+
+
+def test_failed_build_lets_the_next_caller_retry(fresh_index):
+    def broken():
+        raise RuntimeError("users.db locked")
+
+    with pytest.raises(RuntimeError):
+        geo_index.get_index(broken)
+    assert geo_index.get_index(lambda: 'ok') == 'ok'
@@ -0,0 +1,35 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import model_export
+
+EXPORT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "flood_model")
+
+
+@pytest.fixture
+def export_dir(tmp_path):
+    return shutil.copytree(EXPORT, tmp_path / "flood_model")
+
+
+def test_load_accepts_intact_export(export_dir):
+    model = model_export.load(export_dir)
+    assert model.predict_proba(np.zeros((2, model.n_features_in_))).shape == (2, len(model.classes_))
+
+
+def test_load_rejects_changed_array(export_dir):
+    threshold = np.load(export_dir / "threshold.npy")
+    np.save(export_dir / "threshold.npy", threshold + 1)
+    with pytest.raises(ValueError, match="threshold.npy"):
+        model_export.load(export_dir)
+
+
+def test_load_rejects_metadata_without_checksums(export_dir):
+    meta = json.loads((export_dir / model_export.META_FILE).read_text())
+    del meta['arrays_sha256']
+    (export_dir / model_export.META_FILE).write_text(json.dumps(meta))
+    with pytest.raises(ValueError, match="no checksum"):
+        model_export.load(export_dir)
@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+import rainfall_store
+
+STEP = 600
+WINDOWS = {'30m': 1800, '2h': 7200}
+
+
+def brute_totals(accepted, now):
+    """Window totals recomputed from every accepted (step, increment, rain_1h)"""
+    now_step = max(int(now // STEP), max(step for step, _, _ in accepted))
+    result = {}
+    for label, seconds in WINDOWS.items():
+        inside = [(amount, rain) for step, amount, rain in accepted if now_step - seconds // STEP < step <= now_step]
+        result[f'rain_{label}'] = sum(amount for amount, _ in inside)
+        result[f'rain_max_{label}'] = max((rain for _, rain in inside), default=0.0)
+    return result
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_series_matches_brute_force(seed):
+    rng = random.Random(seed)
+    series = rainfall_store.RainSeries(WINDOWS, STEP)
+    accepted, last, t = [], None, 1_000_000.0
+    for _ in range(300):
+        # Mostly short steps, sometimes a repeat, an older timestamp or a long gap
+        t += rng.choice([0, -120, 60, 300, 600, 900, 1800, 5000, 20000])
+        rain = rng.choice([0, 0, round(rng.uniform(0, 40), 2)])
+        fresh = last is None or t > last
+        assert series.observe(rain, t) is fresh
+        if fresh:
+            dt = rainfall_store.MAX_GAP if last is None else min(t - last, rainfall_store.MAX_GAP)
+            accepted.append((int(t // STEP), rain * dt / 3600, rain))
+            last = t
+        now = last + rng.choice([0, 200, 1500, 4000, 9000])
+        expected = brute_totals(accepted, now)
+        totals = series.totals(now)
+        for name, value in expected.items():
+            assert totals[name] == pytest.approx(value, rel=1e-5, abs=1e-3), (name, now)
+
+
+def test_duplicate_observation_is_counted_once(tmp_path):
+    store = rainfall_store.RainfallStore(str(tmp_path / "rain.db"), ['3h'])
+    first = store.observe('Pune', 12.0, observed_at=36000, now=36000)
+    again = store.observe('pune ', 12.0, observed_at=36000, now=36000)
+    assert again == first == {'rain_3h': pytest.approx(12.0), 'rain_max_3h': 12.0}
+    assert (store.stats()['observations'], store.stats()['duplicates']) == (1, 1)
+
+
+def test_gap_longer_than_buffer_clears_history():
+    series = rainfall_store.RainSeries({'1h': 3600}, STEP)
+    for t in range(0, 3600, STEP):
+        series.observe(10.0, t)
+    assert series.totals(3000)['rain_1h'] > 0
+    series.observe(6.0, 100 * 3600)
+    assert sum(series.amount) == pytest.approx(6.0)
+    assert series.totals(100 * 3600) == {'rain_1h': pytest.approx(6.0), 'rain_max_1h': 6.0}
+
+
+def test_series_survive_reload(tmp_path):
+    path = str(tmp_path / "rain.db")
+    store = rainfall_store.RainfallStore(path, ['3h', '24h'])
+    for i, rain in enumerate([5.0, 0.0, 8.5, 2.25]):
+        store.observe('Mumbai', rain, observed_at=7200 + i * 1200, now=12000)
+    before = store.totals('Mumbai', now=12000)
+
+    reloaded = rainfall_store.RainfallStore(path, ['3h', '24h'])
+    assert reloaded.totals('Mumbai', now=12000) == pytest.approx(before)
+    # The last observation time is persisted too, so a repeat is still a duplicate
+    reloaded.observe('Mumbai', 2.25, observed_at=7200 + 3 * 1200, now=12000)
+    assert reloaded.stats()['duplicates'] == 1
+    # A store with another window length starts fresh instead of misreading the buffer
+    other = rainfall_store.RainfallStore(path, ['3h', '48h'])
+    assert other.totals('Mumbai', now=12000)['rain_3h'] == 0
@@ -0,0 +1,148 @@
+import sqlite3
+import threading
+
+import requests
+
+import sms
+
+
+class StubTransport:
+    """Records sends; numbers in ``failures`` raise their queued errors first"""
+
+    def __init__(self, failures=None):
+        self.failures = {number: list(errors) for number, errors in (failures or {}).items()}
+        self.sent = []
+        self.attempts = []
+        self._lock = threading.Lock()
+
+    def __call__(self, to, body):
+        with self._lock:
+            self.attempts.append(to)
+            errors = self.failures.get(to)
+            if errors:
+                raise errors.pop(0)
+            self.sent.append((to, body))
+            return f"SM{len(self.sent)}"
+
+
+class RecordingLimiter:
+    def __init__(self):
+        self.acquired = []
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1, timeout=None):
+        with self._lock:
+            self.acquired.append(tokens)
+        return True
+
+
+class HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+def sender(transport, **options):
+    bulk = sms.BulkSMSSender(transport, segments_per_second=10, backoff=0, **options)
+    bulk.limiter = RecordingLimiter()
+    return bulk
+
+
+def test_segment_count():
+    assert sms.segment_count("a" * 160) == 1
+    assert sms.segment_count("a" * 161) == 2
+    assert sms.segment_count("a" * 306) == 2
+    assert sms.segment_count("a" * 307) == 3
+    assert sms.segment_count("[" * 80) == 1  # GSM-7 extension characters take two septets
+    assert sms.segment_count("[" * 81) == 2
+    assert sms.segment_count("बाढ़" * 17) == 1  # UCS-2: 70 characters per single segment
+    assert sms.segment_count("बाढ़" * 18) == 2
+    assert sms.segment_count("बाढ़" * 34) == 3  # 136 characters, 67 per concatenated segment
+
+
+def test_sends_to_every_number_within_the_segment_budget():
+    transport = StubTransport()
+    bulk = sender(transport, concurrency=3)
+    body = "Flood alert! " * 20  # 260 GSM-7 characters: 2 segments
+    numbers = [f"+9198765{i:05d}" for i in range(23)]
+    results = []
+    result = bulk.send(iter(numbers), body, on_result=lambda phone, error: results.append((phone, error)))
+    assert (result['sent'], result['failed'], result['segments']) == (23, 0, 2)
+    assert sorted(to for to, _ in transport.sent) == numbers
+    assert sorted(results) == [(number, None) for number in numbers]
+    # Batches of 5 messages fill the 10 segments/s budget; every message is paid for once
+    assert sum(bulk.limiter.acquired) == 23 * 2
+    assert max(bulk.limiter.acquired) == 10
+
+
+def test_retries_transient_errors_and_spends_segments_again():
+    transport = StubTransport({
+        '+1': [requests.ConnectionError("reset"), requests.Timeout("slow")],
+        '+2': [HTTPError(429)],
+        '+3': [HTTPError(400)],
+        '+4': [HTTPError(503)] * 4,
+    })
+    bulk = sender(transport, concurrency=1, max_retries=3)
+    result = bulk.send(['+1', '+2', '+3', '+4', '+5'], "alert")
+    assert (result['sent'], result['failed']) == (2 + 1, 2)
+    assert sorted(phone for phone, _ in result['errors']) == ['+3', '+4']
+    assert transport.attempts.count('+1') == 3
+    assert transport.attempts.count('+3') == 1
+    assert transport.attempts.count('+4') == 4
+    # One segment per message in the batch, plus one per retry
+    assert sum(bulk.limiter.acquired) == 5 + 2 + 1 + 3
+
+
+def test_is_transient():
+    assert sms.is_transient(requests.ConnectionError("x"))
+    assert sms.is_transient(requests.ReadTimeout("x"))
+    assert sms.is_transient(ConnectionResetError())
+    assert sms.is_transient(HTTPError(429))
+    assert sms.is_transient(HTTPError(502))
+    assert not sms.is_transient(HTTPError(400))
+    assert not sms.is_transient(ValueError())
+
+
+def finishes(fn, timeout=10):
+    """Run ``fn`` on a thread; returns ``(finished, result, error)``"""
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = fn()
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive(), outcome.get('result'), outcome.get('error')
+
+
+def test_failing_result_callback_stops_and_raises():
+    transport = StubTransport()
+    recorded = []
+
+    def on_result(phone, error):
+        recorded.append(phone)
+        if len(recorded) == 2:
+            raise sqlite3.OperationalError("database is locked")
+
+    bulk = sms.BulkSMSSender(transport, segments_per_second=1000, concurrency=1, backoff=0)
+    bulk.batch_size = lambda segments: 1
+    finished, _, error = finishes(lambda: bulk.send((f"+1{i}" for i in range(50)), "alert", on_result=on_result))
+    assert finished
+    assert isinstance(error, sqlite3.OperationalError)
+    assert len(transport.sent) < 50
+
+
+def test_failing_number_source_raises():
+    transport = StubTransport()
+
+    def numbers():
+        yield from ['+1', '+2', '+3', '+4']
+        raise RuntimeError("reserve failed")
+
+    finished, _, error = finishes(lambda: sender(transport, concurrency=2).send(numbers(), "alert"))
+    assert finished
+    assert isinstance(error, RuntimeError)
@@ -0,0 +1,155 @@
+import email
+import email.header
+import socket
+import sqlite3
+import threading
+
+import pytest
+
+import alert_templates
+import smtp_pool
+
+controller_module = pytest.importorskip("aiosmtpd.controller")
+
+
+class RecordingHandler:
+    """Accepts mail, except that reject@ is refused and flaky@ fails once with a 4xx"""
+
+    def __init__(self):
+        self.sessions = 0
+        self.messages = {}
+        self.flaky_attempts = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        session.host_name = hostname
+        self.sessions += 1
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("reject@"):
+            return "550 No such user"
+        if address.startswith("flaky@"):
+            self.flaky_attempts += 1
+            if self.flaky_attempts == 1:
+                return "451 Try again later"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        for recipient in envelope.rcpt_tos:
+            self.messages[recipient] = envelope.content
+        return "250 Message accepted"
+
+
+@pytest.fixture
+def sink():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    handler = RecordingHandler()
+    controller = controller_module.Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+
+def mailer(controller, **options):
+    return smtp_pool.BulkMailer(controller.hostname, controller.port, starttls=False, backoff=0.01, **options)
+
+
+def test_sends_over_reused_connections(sink):
+    controller, handler = sink
+    encoded = alert_templates.build_message('alert', 'alerts@example.com', 'Pune', 'Heavy rain') \
+        .as_bytes(policy=alert_templates.SMTP_POLICY)
+    recipients = [f"user{i}@example.com" for i in range(40)]
+    results = []
+    result = mailer(controller, concurrency=2, batch_size=5).send(
+        (('alerts@example.com', to, alert_templates.for_recipient(encoded, to)) for to in recipients),
+        on_result=lambda recipient, error: results.append((recipient, error))
+    )
+    assert (result['sent'], result['failed']) == (40, 0)
+    assert sorted(results) == sorted((to, None) for to in recipients)
+    assert set(handler.messages) == set(recipients)
+    assert handler.sessions <= 2
+    received = email.message_from_bytes(handler.messages['user7@example.com'])
+    assert received['To'] == 'user7@example.com'
+    assert str(email.header.make_header(email.header.decode_header(received['Subject']))) == "🚨 Flood Alert for Pune"
+    assert 'Heavy rain' in received.get_payload()[0].get_payload(decode=True).decode()
+
+
+def test_recycles_connections(sink):
+    controller, handler = sink
+    result = mailer(controller, concurrency=1, messages_per_connection=3).send(
+        ('a@example.com', f"user{i}@example.com", b"Subject: hi\r\n\r\nbody") for i in range(7)
+    )
+    assert result['sent'] == 7
+    assert handler.sessions == 3
+
+
+def test_retries_transient_and_reports_permanent_failures(sink):
+    controller, handler = sink
+    result = mailer(controller, concurrency=1).send([
+        ('a@example.com', 'flaky@example.com', b"Subject: hi\r\n\r\nbody"),
+        ('a@example.com', 'reject@example.com', b"Subject: hi\r\n\r\nbody"),
+        ('a@example.com', 'ok@example.com', b"Subject: hi\r\n\r\nbody"),
+    ])
+    assert (result['sent'], result['failed']) == (2, 1)
+    assert [recipient for recipient, _ in result['errors']] == ['reject@example.com']
+    assert handler.flaky_attempts == 2
+    assert set(handler.messages) == {'flaky@example.com', 'ok@example.com'}
+
+
+def test_is_transient():
+    import smtplib
+    assert smtp_pool.is_transient(smtplib.SMTPResponseException(451, b"later"))
+    assert not smtp_pool.is_transient(smtplib.SMTPResponseException(550, b"no"))
+    assert smtp_pool.is_transient(smtplib.SMTPServerDisconnected())
+    assert not smtp_pool.is_transient(ValueError())
+
+
+def finishes(fn, timeout=10):
+    """Run ``fn`` on a thread; returns ``(finished, result, error)``"""
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = fn()
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive(), outcome.get('result'), outcome.get('error')
+
+
+def test_failing_result_callback_stops_and_raises(sink):
+    controller, handler = sink
+    recorded = []
+
+    def on_result(recipient, error):
+        recorded.append(recipient)
+        if len(recorded) == 2:
+            raise sqlite3.OperationalError("database is locked")
+
+    finished, _, error = finishes(lambda: mailer(controller, concurrency=1, batch_size=1).send(
+        (('a@example.com', f"user{i}@example.com", b"Subject: hi\r\n\r\nbody") for i in range(50)),
+        on_result=on_result
+    ))
+    assert finished
+    assert isinstance(error, sqlite3.OperationalError)
+    assert len(handler.messages) < 50
+
+
+def test_failing_message_source_raises(sink):
+    controller, handler = sink
+
+    def messages():
+        for i in range(5):
+            if i == 4:
+                raise RuntimeError("reserve failed")
+            yield 'a@example.com', f"user{i}@example.com", b"Subject: hi\r\n\r\nbody"
+
+    finished, _, error = finishes(lambda: mailer(controller, concurrency=2, batch_size=1).send(messages()))
+    assert finished
+    assert isinstance(error, RuntimeError)
@@ -0,0 +1,85 @@
+import pytest
+import requests
+
+import city_index
+import mock_owm
+import weather_client
+
+
+@pytest.fixture
+def owm():
+    server, url = mock_owm.start(overrides={'pune': {'forecast_rain': [0, 12, 90]}})
+    yield server, weather_client.WeatherClient("test-key", url, requests_per_minute=100000)
+    server.shutdown()
+
+
+def expected(city):
+    return weather_client.normalize_weather(mock_owm.city_payload(city))
+
+
+def without_time(weather):
+    return {key: value for key, value in weather.items() if key != 'observed_at'}
+
+
+def test_fetch_many_grouped_resolves_once_then_uses_group_requests(owm, tmp_path):
+    server, client = owm
+    index = city_index.CityIndex(str(tmp_path / "cities.db"))
+    cities = [f"Town {i}" for i in range(45)] + ["Nowhere Town"]
+
+    weather, errors = client.fetch_many_grouped(cities, index, concurrency=4)
+    assert errors == {}
+    assert weather["Nowhere Town"] is None
+    assert without_time(weather["Town 3"]) == without_time(expected("Town 3"))
+    assert server.requests == 46
+
+    weather, errors = client.fetch_many_grouped(cities + ["town 3"], index, concurrency=4)
+    assert errors == {}
+    assert server.requests == 46 + 3  # 45 known IDs in groups of 20; the unknown city is not refetched
+    assert set(weather) == set(cities) | {"town 3"}
+    assert weather["Nowhere Town"] is None
+    assert without_time(weather["town 3"]) == without_time(weather["Town 3"])
+    assert all(without_time(weather[city]) == without_time(expected(city)) for city in cities[:45])
+
+
+def test_fetch_forecast(owm):
+    _, client = owm
+    steps = client.fetch_forecast("Pune")
+    assert len(steps) == mock_owm.FORECAST_STEPS
+    assert [step['step_rain'] for step in steps[:3]] == [0, 12, 90]
+    assert steps[2]['rainfall'] == 30
+    assert all(later['time'] - earlier['time'] == 3 * 3600 for earlier, later in zip(steps, steps[1:]))
+    assert client.fetch_forecast("Nowhere") is None
+
+    forecasts, errors = client.fetch_forecasts(["Pune", "Delhi", "Nowhere"])
+    assert errors == {}
+    assert forecasts["Nowhere"] is None
+    assert forecasts["Pune"][2]['step_rain'] == 90
+
+
+def response(status, headers=None):
+    result = requests.Response()
+    result.status_code = status
+    result.headers.update(headers or {})
+    result._content = b"{}"
+    return result
+
+
+def test_retry_after_is_capped_at_the_timeout(monkeypatch):
+    client = weather_client.WeatherClient("test-key", "http://owm.invalid", requests_per_minute=100000, timeout=2)
+    replies = iter([response(429, {'Retry-After': '86400'}),
+                    response(503, {'Retry-After': 'Wed, 21 Oct 2099 07:28:00 GMT'}),
+                    response(429, {'Retry-After': 'soon'}),
+                    response(200)])
+    monkeypatch.setattr(client.session, "get", lambda *args, **kwargs: next(replies))
+    sleeps = []
+    monkeypatch.setattr(weather_client.time, "sleep", sleeps.append)
+    assert client.get("/data/2.5/weather", {'q': 'Pune'}).status_code == 200
+    assert sleeps == [2, 2, client.backoff * 4]
+
+
+def test_retry_after_seconds():
+    assert weather_client.retry_after_seconds("30") == 30
+    assert weather_client.retry_after_seconds("Wed, 21 Oct 2015 07:28:30 GMT", now=1445412480) == 30
+    assert weather_client.retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT", now=1445412480 + 60) == 0
+    assert weather_client.retry_after_seconds("later") is None
+    assert weather_client.retry_after_seconds(None) is None
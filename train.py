@@ -0,0 +1,228 @@
+"""Train the flood model and publish it as a versioned artifact.
+
+Replaces the hand-run cells of Untitled.ipynb. The dataset is split the
+same way (80/20, random_state 42), each hyperparameter combination of the
+sweep is trained in turn (``--n-jobs`` parallelizes the trees within each
+fit) and scored for accuracy, single-row inference latency and artifact
+size, and the chosen model is written to
+``models/<version>/`` in the compact format of model_export together with
+a ``metadata.json`` recording how it was trained:
+
+    python train.py --data "flood_prediction_dataset (1) (1).csv"
+    python train.py --sweep n_estimators=25,50,100,200 --sweep max_depth=none,8,12 \\
+        --max-latency-ms 0.5 --version 2025-06-rf
+
+Serve a version with ``MODEL_VERSION=<version>`` (or ``latest``).
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import platform
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import train_test_split
+
+import model_export
+from features import FEATURE_COLUMNS, rainfall_thresholds, rolling_feature_columns
+
+DEFAULT_DATA = "flood_prediction_dataset (1) (1).csv"
+DEFAULT_PARAMS = {'n_estimators': 100}
+METADATA_FILE = "metadata.json"
+
+
+def parse_value(text):
+    """'none' -> None, then int, float or the string itself"""
+    if text.lower() == 'none':
+        return None
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_sweep(specs):
+    """Expand ``['n_estimators=50,100', 'max_depth=none,8']`` into parameter dicts"""
+    if not specs:
+        return [dict(DEFAULT_PARAMS)]
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        if not values:
+            raise SystemExit(f"Invalid --sweep '{spec}', expected name=value1,value2")
+        grid[name.strip()] = [parse_value(value.strip()) for value in values.split(',')]
+    return [dict(zip(grid, combination)) for combination in itertools.product(*grid.values())]
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def evaluate(params, data, n_jobs, random_state):
+    """Fit one configuration; returns (model, result dict)"""
+    X_train, X_test, y_train, y_test = data
+    model = RandomForestClassifier(random_state=random_state, n_jobs=n_jobs, **params)
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    train_seconds = time.perf_counter() - start
+    # Serving is single-threaded per request; don't let n_jobs skew latency
+    model.set_params(n_jobs=None)
+
+    predictions = model.predict(X_test)
+    with tempfile.TemporaryDirectory() as directory:
+        model_export.export(model, directory)
+        compact = model_export.load(directory)
+        size_bytes = directory_bytes(directory)
+        row = X_test.to_numpy()[:1]
+        latency = model_export.single_row_latency(compact.predict_proba, row)
+        start = time.perf_counter()
+        compact.predict_proba(X_test)
+        batch_seconds = time.perf_counter() - start
+
+    return model, {
+        'params': params,
+        'accuracy': float(accuracy_score(y_test, predictions)),
+        'f1': float(f1_score(y_test, predictions, zero_division=0)),
+        'train_seconds': round(train_seconds, 3),
+        'latency_ms': round(latency * 1000, 4),
+        'batch_rows_per_second': round(len(X_test) / batch_seconds),
+        'size_bytes': size_bytes,
+        'n_nodes': int(sum(estimator.tree_.node_count for estimator in model.estimators_)),
+    }
+
+
+def choose(results, max_latency_ms=None, max_size_bytes=None):
+    """Most accurate result within the latency and size budgets (ties go to the faster one)"""
+    eligible = [
+        result for result in results
+        if (max_latency_ms is None or result['latency_ms'] <= max_latency_ms)
+        and (max_size_bytes is None or result['size_bytes'] <= max_size_bytes)
+    ]
+    if not eligible:
+        raise SystemExit("No configuration meets the latency/size budget")
+    return max(eligible, key=lambda result: (result['accuracy'], -result['latency_ms']))
+
+
+def content_hash(meta):
+    """Hash of the exported arrays, independent of when they were written"""
+    digest = hashlib.sha256()
+    for name, checksum in sorted(meta['arrays_sha256'].items()):
+        digest.update(f"{name}:{checksum}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def publish(model, result, sweep, args, dataset):
+    """Write the model to models/<version>/ atomically; returns the artifact path"""
+    target = os.path.join(args.output_dir, args.version)
+    if os.path.exists(target):
+        raise SystemExit(f"Model version {args.version} already exists at {target}")
+    os.makedirs(args.output_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f".{args.version}-", dir=args.output_dir)
+    try:
+        pickled = pickle.dumps(model)
+        meta = model_export.export(model, staging, hashlib.sha256(pickled).hexdigest())
+        if args.save_pickle:
+            with open(os.path.join(staging, "model.pkl"), "wb") as f:
+                f.write(pickled)
+
+        metadata = {
+            'version': args.version,
+            'created': time.time(),
+            'features': list(model.feature_names_in_),
+            'target': args.target,
+            'params': result['params'],
+            'random_state': args.random_state,
+            'test_size': args.test_size,
+            'metrics': {key: result[key] for key in
+                        ('accuracy', 'f1', 'latency_ms', 'batch_rows_per_second', 'size_bytes', 'n_nodes')},
+            'content_sha256': content_hash(meta),
+            'dataset': dataset,
+            'sweep': sweep,
+            'environment': {
+                'python': platform.python_version(),
+                'sklearn': sklearn.__version__,
+                'numpy': np.__version__,
+            },
+        }
+        with open(os.path.join(staging, METADATA_FILE), "w") as f:
+            json.dump(metadata, f, indent=2)
+        os.rename(staging, target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return target
+
+
+def print_results(results, chosen):
+    print(f"{'params':<40} {'accuracy':>8} {'f1':>6} {'latency ms':>10} {'size KB':>8} {'train s':>8}")
+    for result in results:
+        marker = " *" if result is chosen else ""
+        print(f"{json.dumps(result['params']):<40} {result['accuracy']:>8.4f} {result['f1']:>6.3f} "
+              f"{result['latency_ms']:>10.4f} {result['size_bytes'] / 1024:>8.1f} "
+              f"{result['train_seconds']:>8.2f}{marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the flood model and save a versioned artifact")
+    parser.add_argument("--data", default=DEFAULT_DATA, help="training CSV")
+    parser.add_argument("--target", default="flood_risk", help="label column")
+    parser.add_argument("--features", default=",".join(FEATURE_COLUMNS),
+                        help="comma-separated feature columns; may include the rolling rainfall "
+                             f"totals ({', '.join(rolling_feature_columns(rainfall_thresholds()))})")
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--random-state", type=int, default=42)
+    parser.add_argument("--n-jobs", type=int, default=-1, help="parallel tree building (-1 = all cores)")
+    parser.add_argument("--sweep", action="append",
+                        help="hyperparameter values to try, e.g. n_estimators=50,100 (repeatable)")
+    parser.add_argument("--max-latency-ms", type=float, help="only pick models at most this slow per row")
+    parser.add_argument("--max-size-kb", type=float, help="only pick models at most this large")
+    parser.add_argument("--output-dir", default=os.getenv('MODEL_DIR', 'models'))
+    parser.add_argument("--version", default=time.strftime("%Y%m%d-%H%M%S"))
+    parser.add_argument("--save-pickle", action="store_true", help="also keep a pickled sklearn copy")
+    parser.add_argument("--dry-run", action="store_true", help="report the sweep without saving a model")
+    args = parser.parse_args()
+
+    features = [column.strip() for column in args.features.split(',') if column.strip()]
+    df = pd.read_csv(args.data)
+    missing = [column for column in features + [args.target] if column not in df.columns]
+    if missing:
+        raise SystemExit(f"Dataset is missing columns: {', '.join(missing)}")
+    df = df.dropna(subset=features + [args.target])
+    X, y = df[features].astype(float), df[args.target]
+    data = train_test_split(X, y, test_size=args.test_size, random_state=args.random_state)
+    dataset = {'path': os.path.basename(args.data), 'sha256': file_sha256(args.data), 'rows': len(df)}
+
+    trained = [evaluate(params, data, args.n_jobs, args.random_state) for params in parse_sweep(args.sweep)]
+    results = [result for _, result in trained]
+    chosen = choose(results, args.max_latency_ms,
+                    args.max_size_kb * 1024 if args.max_size_kb is not None else None)
+    print_results(results, chosen)
+
+    if args.dry_run:
+        return
+    model = next(model for model, result in trained if result is chosen)
+    path = publish(model, chosen, results, args, dataset)
+    print(f"Saved model version {args.version} to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Cached Google translation for alert messages.
+
+Translations are memoized by (sha256 of source text, target language) in an
+in-memory LRU backed by a SQLite file, so repeated alerts and previews are
+served without a network call, across reruns and server restarts.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import storage
+
+MAX_CHUNK_SIZE = 5000  # Google's limit is 5000 characters per request
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS translations (
+    text_hash TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    translation TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (text_hash, lang)
+);
+"""
+
+
+class TranslationCache:
+    """In-memory LRU in front of a persistent SQLite translation store"""
+
+    def __init__(self, path, max_entries=1024):
+        self.path = path
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._connect().executescript(SCHEMA)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        return storage.connect(self.path)
+
+    @staticmethod
+    def key(text, lang):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest(), lang
+
+    def get(self, text, lang):
+        """Cached translation or None"""
+        key = self.key(text, lang)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+        row = self._connect().execute(
+            "SELECT translation FROM translations WHERE text_hash = ? AND lang = ?", key
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, row['translation'])
+            return row['translation']
+
+    def put(self, text, lang, translation):
+        key = self.key(text, lang)
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)",
+                (*key, translation, time.time())
+            )
+        with self._lock:
+            self._remember(key, translation)
+
+    def _remember(self, key, translation):
+        self._memory[key] = translation
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        stored = self._connect().execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        with self._lock:
+            return {
+                'memory_entries': len(self._memory),
+                'stored_entries': stored,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+            }
+
+
+def split_chunks(text, max_chunk_size=MAX_CHUNK_SIZE):
+    """Split text into sentence-aligned chunks under the per-request size limit"""
+    if len(text) <= max_chunk_size:
+        return [text]
+
+    sentences = text.split('. ')
+    chunks = []
+    current_chunk = ""
+
+    for sentence in sentences:
+        if len(current_chunk) + len(sentence) < max_chunk_size:
+            current_chunk += sentence + ". "
+        else:
+            if current_chunk:
+                chunks.append(current_chunk)
+            current_chunk = sentence + ". "
+
+    if current_chunk:
+        chunks.append(current_chunk)
+    return chunks
+
+
+def translate_chunk(chunk, dest_lang):
+    """One Google Translate request"""
+    # Imported on first use: deep_translator is slow to import and most page
+    # loads are served from the cache
+    from deep_translator import GoogleTranslator
+    with metrics.timer('translate_request'):
+        return GoogleTranslator(source='auto', target=dest_lang).translate(chunk)
+
+
+def translate_uncached(text, dest_lang, max_workers=4):
+    """Translate via Google, sending the chunks of long text concurrently"""
+    chunks = split_chunks(text)
+    if len(chunks) == 1:
+        return translate_chunk(chunks[0], dest_lang)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+        translated_chunks = list(pool.map(lambda chunk: translate_chunk(chunk, dest_lang), chunks))
+    return " ".join(translated_chunks)
+
+
+def translate_many(text, languages, cache, max_workers=8):
+    """Translate one text into many languages in a single call.
+
+    Every (language, chunk) request missing from the cache runs on one bounded
+    worker pool; chunks are reassembled in order. Returns ``(translations,
+    errors)``, both dicts keyed by language code.
+    """
+    translations = {}
+    errors = {}
+    pending = []
+    for lang in dict.fromkeys(languages):
+        if lang == 'en' or not text:
+            translations[lang] = text
+            continue
+        cached = cache.get(text, lang)
+        if cached is not None:
+            translations[lang] = cached
+        else:
+            pending.append(lang)
+
+    if not pending:
+        return translations, errors
+
+    chunks = split_chunks(text)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(pending) * len(chunks))) as pool:
+        futures = {
+            lang: [pool.submit(translate_chunk, chunk, lang) for chunk in chunks]
+            for lang in pending
+        }
+        for lang, chunk_futures in futures.items():
+            try:
+                translated = " ".join(future.result() for future in chunk_futures)
+            except Exception as e:
+                errors[lang] = e
+                continue
+            cache.put(text, lang, translated)
+            translations[lang] = translated
+
+    return translations, errors
+
+
+def translate_text(text, dest_lang, cache):
+    """Translate through the cache, calling Google only on a miss"""
+    if dest_lang == 'en' or not text:
+        return text
+
+    translated = cache.get(text, dest_lang)
+    if translated is None:
+        translated = translate_uncached(text, dest_lang)
+        cache.put(text, dest_lang, translated)
+    return translated
+
+
+def prewarm(texts, languages, cache, max_workers=8):
+    """Fill the cache for every text/language pair; returns the number translated"""
+    translated = 0
+    for text in texts:
+        missing = [lang for lang in languages if lang != 'en' and cache.get(text, lang) is None]
+        # Best effort: a failed pair is translated on first real use
+        translations, _ = translate_many(text, missing, cache, max_workers)
+        translated += len(translations)
+    return translated
+
+
+_cache = None
+_prewarm_started = False
+_state_lock = threading.Lock()
+
+
+def get_cache(path, max_entries=1024):
+    """Return the process-wide translation cache, opening it on first use"""
+    global _cache
+    with _state_lock:
+        if _cache is None:
+            _cache = TranslationCache(path, max_entries)
+        return _cache
+
+
+def prewarm_in_background(texts, languages, cache):
+    """Start prewarming once per process without blocking the caller"""
+    global _prewarm_started
+    with _state_lock:
+        if _prewarm_started:
+            return False
+        _prewarm_started = True
+    threading.Thread(target=prewarm, args=(texts, languages, cache), daemon=True).start()
+    return True
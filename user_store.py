@@ -0,0 +1,175 @@
+"""SQLite-backed user repository shared by every Streamlit session.
+
+Users are read and updated one row at a time, so registrations, password
+changes and alert toggles from different sessions no longer overwrite each
+other, and no session has to hold a copy of every user in memory.
+"""
+import json
+import os
+import threading
+
+import storage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    city TEXT NOT NULL,
+    city_key TEXT NOT NULL,
+    password TEXT NOT NULL,
+    alerts INTEGER NOT NULL DEFAULT 1,
+    is_admin INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_users_city ON users (city_key, alerts);
+"""
+
+FIELDS = ('city', 'password', 'alerts', 'is_admin')
+
+
+def email_key(email):
+    return (email or '').strip().lower()
+
+
+def city_key(city):
+    return (city or '').strip().lower()
+
+
+def _to_user(row):
+    return {
+        'city': row['city'],
+        'password': row['password'],
+        'alerts': bool(row['alerts']),
+        'is_admin': bool(row['is_admin']),
+    }
+
+
+class UserStore:
+    """Row-level access to registered users"""
+
+    def __init__(self, path, legacy_json=None):
+        self.path = path
+        self._connect().executescript(SCHEMA)
+        if legacy_json:
+            self.import_json(legacy_json)
+
+    def _connect(self):
+        return storage.connect(self.path)
+
+    def get(self, email):
+        """User dict for an email, or None"""
+        row = self._connect().execute(
+            "SELECT * FROM users WHERE email = ?", (email_key(email),)
+        ).fetchone()
+        return _to_user(row) if row else None
+
+    def exists(self, email):
+        return self._connect().execute(
+            "SELECT 1 FROM users WHERE email = ?", (email_key(email),)
+        ).fetchone() is not None
+
+    def add(self, email, user):
+        """Insert a new user; returns False if the email is already registered"""
+        with self._connect() as db:
+            cursor = db.execute(
+                "INSERT OR IGNORE INTO users (email, city, city_key, password, alerts, is_admin) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (email_key(email), user.get('city', 'Unknown City'),
+                 city_key(user.get('city', 'Unknown City')), user['password'],
+                 int(user.get('alerts', True)), int(user.get('is_admin', False)))
+            )
+            return cursor.rowcount == 1
+
+    def update(self, email, **fields):
+        """Update only the given fields of one user"""
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown user fields: {', '.join(sorted(unknown))}")
+        if 'city' in fields:
+            fields['city_key'] = city_key(fields['city'])
+        for flag in ('alerts', 'is_admin'):
+            if flag in fields:
+                fields[flag] = int(fields[flag])
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._connect() as db:
+            cursor = db.execute(
+                f"UPDATE users SET {assignments} WHERE email = ?",
+                (*fields.values(), email_key(email))
+            )
+            return cursor.rowcount == 1
+
+    def by_city(self, city, subscribed_only=False):
+        """(email, user) pairs registered for a city, via the city index"""
+        query = "SELECT * FROM users WHERE city_key = ?"
+        if subscribed_only:
+            query += " AND alerts = 1"
+        rows = self._connect().execute(query, (city_key(city),))
+        return [(row['email'], _to_user(row)) for row in rows]
+
+    def subscribed(self):
+        """Iterate (email, user) for every non-admin user with alerts enabled"""
+        rows = self._connect().execute(
+            "SELECT * FROM users WHERE alerts = 1 AND is_admin = 0 ORDER BY city_key"
+        )
+        for row in rows:
+            yield row['email'], _to_user(row)
+
+    def subscribed_by_city(self):
+        """Map each city key to its display name and the emails subscribed to it"""
+        groups = {}
+        for email, user in self.subscribed():
+            key = city_key(user['city'])
+            if key in ('', 'unknown city'):
+                continue
+            city, emails = groups.setdefault(key, (user['city'].strip(), []))
+            emails.append(email)
+        return groups
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def import_json(self, json_path):
+        """One-time import of a legacy users_data.json, renamed to *.migrated afterwards"""
+        if not os.path.exists(json_path):
+            return 0
+
+        def migrate(db):
+            try:
+                with open(json_path) as f:
+                    users = json.load(f)
+            except json.JSONDecodeError:
+                users = {}
+            db.executemany(
+                "INSERT OR IGNORE INTO users (email, city, city_key, password, alerts, is_admin) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(email_key(email), user.get('city', 'Unknown City'),
+                  city_key(user.get('city', 'Unknown City')), user.get('password', ''),
+                  int(user.get('alerts', True)), int(user.get('is_admin', False)))
+                 for email, user in users.items()]
+            )
+            return len(users)
+
+        imported = storage.run_once(self._connect(), f"json:{os.path.abspath(json_path)}", migrate)
+        if imported is None:
+            return 0
+
+        os.replace(json_path, json_path + ".migrated")
+        return imported
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path, legacy_json=None, seed=None):
+    """Return the process-wide user store for a database path.
+
+    ``seed`` maps emails to users that are added if missing when the store is
+    first opened (e.g. the admin account).
+    """
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = UserStore(key, legacy_json)
+            for email, user in (seed or {}).items():
+                store.add(email, user)
+        return store
@@ -0,0 +1,175 @@
+"""Shared per-city weather cache with TTL, LRU eviction and stale-while-revalidate.
+
+Like model_registry, this module is imported rather than re-executed by
+Streamlit, so one cache serves every session in the server process.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class WeatherCache:
+    """LRU cache of normalized weather dicts keyed by city name.
+
+    Entries younger than ``ttl`` are served directly. Entries older than that
+    but within ``stale_ttl`` more seconds are served immediately while a
+    background thread refreshes them. A fetch result of ``None`` means the
+    city is unknown and is cached for ``negative_ttl`` seconds.
+    """
+
+    def __init__(self, ttl=600, stale_ttl=1800, max_entries=256, negative_ttl=300):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    @staticmethod
+    def key(city):
+        return city.strip().lower()
+
+    def _lookup(self, key, now):
+        """Classify an entry as 'fresh', 'negative', 'stale' or 'miss' (lock held)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return 'miss', None
+        value, fetched_at = entry
+        age = now - fetched_at
+        if value is None:
+            if age < self.negative_ttl:
+                self._entries.move_to_end(key)
+                self.negative_hits += 1
+                return 'negative', None
+        elif age < self.ttl:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return 'fresh', value
+        elif age < self.ttl + self.stale_ttl:
+            self._entries.move_to_end(key)
+            self.stale_hits += 1
+            return 'stale', value
+        return 'miss', None
+
+    def get(self, city, fetch):
+        """Return weather for ``city``, calling ``fetch(city)`` on a miss"""
+        key = self.key(city)
+        with self._lock:
+            state, value = self._lookup(key, time.time())
+            if state == 'negative':
+                return None
+            if state == 'stale' and key not in self._refreshing:
+                self._refreshing.add(key)
+                threading.Thread(
+                    target=self._refresh, args=(key, city, fetch), daemon=True
+                ).start()
+            if state in ('fresh', 'stale'):
+                return dict(value)
+            self.misses += 1
+
+        value = fetch(city)
+        self.put(city, value)
+        return dict(value) if value is not None else None
+
+    def get_many(self, cities, fetch_many):
+        """Return ``({city: weather}, errors)`` for many cities with one upstream call.
+
+        Fresh and negatively cached entries are served from the cache; misses
+        and stale entries are fetched together with ``fetch_many(cities)``,
+        which returns ``(weather, errors)`` like WeatherClient.fetch_many.
+        """
+        results, stale, missing = {}, {}, []
+        now = time.time()
+        with self._lock:
+            for city in dict.fromkeys(cities):
+                state, value = self._lookup(self.key(city), now)
+                if state == 'fresh':
+                    results[city] = dict(value)
+                elif state == 'negative':
+                    results[city] = None
+                else:
+                    if state == 'stale':
+                        stale[city] = value
+                    else:
+                        self.misses += 1
+                    missing.append(city)
+
+        errors = {}
+        if missing:
+            fetched, errors = fetch_many(missing)
+            for city, value in fetched.items():
+                self.put(city, value)
+                results[city] = dict(value) if value is not None else None
+            # Fall back to the stale copy when the refetch failed
+            for city in list(errors):
+                if city in stale:
+                    results[city] = dict(stale[city])
+                    del errors[city]
+        return results, errors
+
+    def put(self, city, value):
+        """Store a fetch result (``None`` for an unknown city)"""
+        key = self.key(city)
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _refresh(self, key, city, fetch):
+        try:
+            value = fetch(city)
+            self.put(city, value)
+            with self._lock:
+                self.refreshes += 1
+        except Exception:
+            # Keep serving the stale entry; the next stale hit retries
+            with self._lock:
+                self.refresh_errors += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def invalidate(self, city=None):
+        """Drop one city, or every entry when ``city`` is None"""
+        with self._lock:
+            if city is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self.key(city), None)
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'refreshes': self.refreshes,
+                'refresh_errors': self.refresh_errors,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache(ttl=600, stale_ttl=1800, max_entries=256, negative_ttl=300):
+    """Return the process-wide cache, creating it with these settings on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = WeatherCache(ttl, stale_ttl, max_entries, negative_ttl)
+        return _cache
@@ -0,0 +1,260 @@
+"""Pooled OpenWeatherMap client for polling many cities.
+
+A single keep-alive ``requests.Session`` is shared by every request, calls
+are spread over a bounded thread pool, and a token bucket keeps the process
+under the account's per-minute quota. Responses are normalized to the same
+dict shape the app has always used.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from rate_limit import TokenBucket
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+GROUP_SIZE = 20  # OWM accepts at most 20 city IDs per group request
+
+
+def retry_after_seconds(value, now=None):
+    """Seconds to wait for a Retry-After header (delta-seconds or HTTP date); None if unusable"""
+    value = (value or '').strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if when is None or when.tzinfo is None:
+        return None
+    return max(0.0, when.timestamp() - (now if now is not None else time.time()))
+
+
+def normalize_weather(data):
+    """Convert an OWM current-weather payload into the app's weather dict"""
+    return {
+        'temperature': data.get('main', {}).get('temp', 0),
+        'humidity': data.get('main', {}).get('humidity', 0),
+        'pressure': data.get('main', {}).get('pressure', 0),
+        'wind_speed': data.get('wind', {}).get('speed', 0),
+        'rainfall': data.get('rain', {}).get('1h', 0) if data.get('rain') else 0,
+        'weather_desc': data.get('weather', [{}])[0].get('description', ''),
+        'icon': data.get('weather', [{}])[0].get('icon', ''),
+        'observed_at': data.get('dt')
+    }
+
+
+def normalize_forecast(data):
+    """Convert an OWM 5 day / 3 hour forecast payload into a list of step dicts.
+
+    ``rain.3h`` is the rain in the three hours up to ``time``; ``rainfall``
+    is its hourly mean, matching the 1h rain feature of current weather.
+    """
+    steps = []
+    for item in data.get('list', []):
+        rain_3h = (item.get('rain') or {}).get('3h', 0)
+        steps.append({
+            'time': item['dt'],
+            'temperature': item.get('main', {}).get('temp', 0),
+            'humidity': item.get('main', {}).get('humidity', 0),
+            'pressure': item.get('main', {}).get('pressure', 0),
+            'wind_speed': item.get('wind', {}).get('speed', 0),
+            'rainfall': rain_3h / 3,
+            'step_rain': rain_3h,
+            'weather_desc': item.get('weather', [{}])[0].get('description', '')
+        })
+    return steps
+
+
+class WeatherClient:
+    """Rate-limited, retrying OWM client over pooled keep-alive connections"""
+
+    def __init__(self, api_key, base_url="http://api.openweathermap.org",
+                 requests_per_minute=60, timeout=10, max_retries=3, backoff=0.5,
+                 pool_size=16):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.limiter = TokenBucket.per_minute(requests_per_minute)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, path, params):
+        """GET an OWM endpoint, retrying rate-limit, server and connection errors"""
+        params = dict(params, appid=self.api_key)
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                with metrics.timer('owm_request'):
+                    response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS or attempt >= self.max_retries:
+                    return response
+                retry_after = retry_after_seconds(response.headers.get('Retry-After'))
+                if retry_after is not None:
+                    # Capped, so a bogus header can't stall a worker indefinitely
+                    time.sleep(min(retry_after, self.timeout))
+                    attempt += 1
+                    continue
+            time.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+
+    def fetch_raw(self, city_name):
+        """Raw current-weather payload for one city (None if OWM does not know the city)"""
+        response = self.get("/data/2.5/weather", {'q': city_name, 'units': 'metric'})
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise RuntimeError(f"API call failed: {response.status_code} - {response.text}")
+        return response.json()
+
+    def fetch(self, city_name):
+        """Current weather for one city (None if OWM does not know the city)"""
+        data = self.fetch_raw(city_name)
+        return normalize_weather(data) if data is not None else None
+
+    def geocode(self, city_name):
+        """``{'name', 'country', 'lat', 'lon'}`` for a city name (None if OWM does not know it)"""
+        response = self.get("/geo/1.0/direct", {'q': city_name, 'limit': 1})
+        if response.status_code != 200:
+            raise RuntimeError(f"API call failed: {response.status_code} - {response.text}")
+        matches = response.json()
+        if not matches:
+            return None
+        match = matches[0]
+        return {'name': match.get('name'), 'country': match.get('country'),
+                'lat': match['lat'], 'lon': match['lon']}
+
+    def geocode_many(self, cities, concurrency=None):
+        """Geocode many cities concurrently; returns ``(places, errors)``"""
+        return self._map(self.geocode, cities, concurrency)
+
+    def fetch_forecast(self, city_name):
+        """3-hourly forecast steps for one city (None if OWM does not know the city)"""
+        response = self.get("/data/2.5/forecast", {'q': city_name, 'units': 'metric'})
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise RuntimeError(f"API call failed: {response.status_code} - {response.text}")
+        return normalize_forecast(response.json())
+
+    def fetch_forecasts(self, cities, concurrency=None):
+        """Fetch many cities' forecasts concurrently; returns ``(forecasts, errors)``"""
+        return self._map(self.fetch_forecast, cities, concurrency)
+
+    def _map(self, fn, items, concurrency=None):
+        """Run ``fn`` over items on the pool; returns ``(results, errors)`` keyed by item"""
+        results, errors = {}, {}
+
+        def call(item):
+            try:
+                results[item] = fn(item)
+            except Exception as e:
+                errors[item] = e
+
+        items = list(dict.fromkeys(items))
+        if items:
+            workers = min(concurrency or self.pool_size, self.pool_size, len(items))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(call, items))
+        return results, errors
+
+    def fetch_many(self, cities, concurrency=None):
+        """Fetch many cities concurrently, one request each.
+
+        Returns ``(weather, errors)``: weather maps each city to its dict (None
+        for unknown cities), errors maps cities whose fetch failed to the error.
+        """
+        return self._map(self.fetch, cities, concurrency)
+
+    def fetch_group(self, city_ids, concurrency=None):
+        """Current weather for many OWM city IDs, 20 per request.
+
+        Returns ``(weather, errors)`` keyed by city ID.
+        """
+        city_ids = list(dict.fromkeys(city_ids))
+        chunks = [tuple(city_ids[i:i + GROUP_SIZE]) for i in range(0, len(city_ids), GROUP_SIZE)]
+
+        def fetch_chunk(chunk):
+            response = self.get("/data/2.5/group", {'id': ','.join(map(str, chunk)), 'units': 'metric'})
+            if response.status_code != 200:
+                raise RuntimeError(f"API call failed: {response.status_code} - {response.text}")
+            return {item['id']: normalize_weather(item) for item in response.json().get('list', [])}
+
+        results, chunk_errors = self._map(fetch_chunk, chunks, concurrency)
+        weather, errors = {}, {}
+        for chunk in chunks:
+            if chunk in chunk_errors:
+                errors.update((city_id, chunk_errors[chunk]) for city_id in chunk)
+                continue
+            for city_id in chunk:
+                if city_id in results[chunk]:
+                    weather[city_id] = results[chunk][city_id]
+                else:
+                    errors[city_id] = LookupError(f"City ID {city_id} missing from group response")
+        return weather, errors
+
+    def fetch_many_grouped(self, cities, index, concurrency=None):
+        """Fetch many cities with group requests, resolving names through a CityIndex.
+
+        Names the index has not seen are fetched individually once (which also
+        resolves their ID); every known ID then goes through ``fetch_group``.
+        Returns ``(weather, errors)`` keyed by the given city names.
+        """
+        cities = list(dict.fromkeys(cities))
+        ids = index.lookup_many(cities)
+        weather, errors = {}, {}
+
+        unresolved = [city for city in cities if city not in ids]
+        raw, errors_unresolved = self._map(self.fetch_raw, unresolved, concurrency)
+        errors.update(errors_unresolved)
+        for city, data in raw.items():
+            if data is None:
+                index.remember_unknown(city)
+                weather[city] = None
+            else:
+                index.remember(city, data)
+                weather[city] = normalize_weather(data)
+
+        by_id = {}
+        for city, city_id in ids.items():
+            if city_id is None:
+                weather[city] = None
+            else:
+                by_id.setdefault(city_id, []).append(city)
+
+        grouped, group_errors = self.fetch_group(by_id, concurrency)
+        for city_id, names in by_id.items():
+            for city in names:
+                if city_id in grouped:
+                    weather[city] = dict(grouped[city_id])
+                else:
+                    errors[city] = group_errors.get(city_id)
+        return weather, errors
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key, base_url="http://api.openweathermap.org", requests_per_minute=60):
+    """Return the process-wide client for an API key and endpoint"""
+    key = (api_key, base_url, requests_per_minute)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = WeatherClient(api_key, base_url, requests_per_minute)
+        return client
@@ -0,0 +1,87 @@
+"""Bounded feeder/worker pool shared by the bulk email and SMS senders.
+
+A feeder thread reads items from any iterable (often a generator that pages
+recipients out of SQLite) into batches on a bounded queue, and ``concurrency``
+worker threads take batches off it. The first exception anywhere, whether
+from the iterable, a worker or a result callback, stops the run: the
+feeder stops reading, every worker keeps draining the queue without
+processing so nothing blocks, and ``run_batches`` re-raises the error once
+all threads have finished.
+"""
+import queue
+import threading
+
+
+def run_batches(items, batch_size, concurrency, work, progress=None, progress_interval=0.25):
+    """Run ``work(batches)`` on ``concurrency`` threads over ``items`` split into batches.
+
+    ``work`` receives an iterator of batches (lists of items) and returns
+    when it is exhausted, so it can keep per-thread state such as a
+    connection across batches. ``progress()`` is called on the calling
+    thread every ``progress_interval`` seconds while the workers run.
+    """
+    concurrency = max(1, concurrency)
+    batches = queue.Queue(maxsize=concurrency * 2)
+    stop = threading.Event()
+    errors = []
+    errors_lock = threading.Lock()
+
+    def fail(error):
+        with errors_lock:
+            errors.append(error)
+        stop.set()
+
+    def feed():
+        batch = []
+        try:
+            for item in items:
+                if stop.is_set():
+                    return
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    batches.put(batch)
+                    batch = []
+            if batch and not stop.is_set():
+                batches.put(batch)
+        except Exception as e:
+            fail(e)
+        finally:
+            for _ in range(concurrency):
+                batches.put(None)
+
+    def take(finished):
+        """Batches until this worker's end marker; after a failure they are drained unprocessed"""
+        while not finished.is_set():
+            batch = batches.get()
+            if batch is None:
+                finished.set()
+            elif not stop.is_set():
+                yield batch
+
+    def run():
+        finished = threading.Event()
+        try:
+            work(take(finished))
+        except Exception as e:
+            fail(e)
+            # Consume up to this worker's end marker so the feeder never blocks
+            for _ in take(finished):
+                pass
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    workers = [threading.Thread(target=run, daemon=True) for _ in range(concurrency)]
+    feeder.start()
+    for worker in workers:
+        worker.start()
+
+    while any(worker.is_alive() for worker in workers):
+        if progress:
+            progress()
+        for worker in workers:
+            worker.join(timeout=progress_interval / len(workers))
+
+    feeder.join()
+    if progress:
+        progress()
+    if errors:
+        raise errors[0]